@@ -13,6 +13,9 @@ interface DashboardData {
 export default function DashboardPage() {
   const searchParams = useSearchParams()
   const resultRaw = searchParams.get("result")
+  // Optional ?session= keeps this dashboard's data apart from other users on the same server
+  const sessionId = searchParams.get("session")
+  const sessionQuery = sessionId ? `?session=${encodeURIComponent(sessionId)}` : ""
 
   const [dashboard, setDashboard] = useState<DashboardData | null>(null)
   const [countdown, setCountdown] = useState(0)
@@ -20,6 +23,8 @@ export default function DashboardPage() {
   const [isRunning, setIsRunning] = useState(false)
   const [isPaused, setIsPaused] = useState(false)
 
+  const [live, setLive] = useState<{ focusPct: number; focused: boolean; domain: string } | null>(null)
+
   const [sessionSummary, setSessionSummary] = useState<{ productive: number; unproductive: number } | null>(null)
 
   useEffect(() => {
@@ -65,24 +70,32 @@ export default function DashboardPage() {
   useEffect(() => {
     if (!isRunning || isPaused) return
   
-    const interval = setInterval(() => {
-      fetch("http://localhost:5001/vision/step", {
-        method: "POST",
-      }).catch((err) => {
-        console.error("Failed to step vision:", err)
-      })
-    }, 1000) // every 1 second
-  
-    return () => clearInterval(interval)
-  }, [isRunning, isPaused])
+    // The server pushes focus and current-site changes as they happen
+    const source = new EventSource(`http://localhost:5001/stream${sessionQuery}`)
+    const apply = (event: MessageEvent) => {
+      const data = JSON.parse(event.data)
+      setLive((prev) => ({
+        focusPct: data.focus?.focus_pct ?? prev?.focusPct ?? 0,
+        focused: data.focus?.focused ?? prev?.focused ?? false,
+        domain: data.current_domain ?? prev?.domain ?? "unknown",
+      }))
+    }
+    source.addEventListener("snapshot", apply)
+    source.addEventListener("delta", apply)
+    source.onerror = (err) => {
+      console.error("Live stream error:", err)
+    }
+
+    return () => source.close()
+  }, [isRunning, isPaused, sessionQuery])
 
   const handleStart = async () => {
     try {
-      const response = await fetch("http://localhost:5001/domains", {
+      const response = await fetch(`http://localhost:5001/domains${sessionQuery}`, {
         method: "DELETE",
       })
 
-      const response2 = await fetch("http://localhost:5001/vision/start", {
+      const response2 = await fetch(`http://localhost:5001/vision/start${sessionQuery}`, {
         method: "POST",
       })
   
@@ -129,11 +142,11 @@ export default function DashboardPage() {
 
   const handleEnd = async () => {
     try {
-      const response = await fetch("http://localhost:5001/domains/analyze", {
+      const response = await fetch(`http://localhost:5001/domains/analyze${sessionQuery}`, {
         method: "GET",
       })
 
-      const response2 = await fetch("http://localhost:5001/vision/stop", {
+      const response2 = await fetch(`http://localhost:5001/vision/stop${sessionQuery}`, {
         method: "POST",
       })
   
@@ -155,7 +168,7 @@ export default function DashboardPage() {
         ? Math.round((productive / (productive + unproductive)) * 100)
         : 0;
 
-        router.push(`/focus-wrapped?focus=${compRate}&score=${result2.focus_score*100}&completed=${completed}&total=${total}`);
+        router.push(`/focus-wrapped?focus=${compRate}&score=${result2.focus_score*100}&completed=${completed}&total=${total}${sessionId ? `&session=${encodeURIComponent(sessionId)}` : ""}`);
         //alert(`🧠 Focus Score: ${result2.focus_score}`)
       }
       
@@ -247,6 +260,11 @@ export default function DashboardPage() {
         >
           {formatTime(countdown)}
         </div>
+        {isRunning && live && (
+          <div style={{ textAlign: "center", marginTop: "0.5rem" }}>
+            {live.focused ? "👀" : "💤"} Focus {live.focusPct.toFixed(1)}% · {live.domain}
+          </div>
+        )}
 
         <div style={{ display: "flex", gap: "12px", justifyContent: "center", marginTop: "1rem" }}>
           {!isRunning && (
@@ -2,6 +2,7 @@
 "use client";
 
 import { useSearchParams } from "next/navigation";
+import { useEffect, useState } from "react";
 import FocusWrapped from "./focus-wrapped";
 
 export default function FocusWrappedPage() {
@@ -12,7 +13,23 @@ export default function FocusWrappedPage() {
   const totalTasks = parseInt(searchParams.get("total") || "1"); // Avoid division by 0
   const checklistPercentage = Math.round((completedTasks / totalTasks) * 100);
 
-  const focusPercentage = parseInt(searchParams.get("focus") || "0");
+  const [focusPercentage, setFocusPercentage] = useState(parseInt(searchParams.get("focus") || "0"));
+  const sessionId = searchParams.get("session");
+
+  // The server keeps a running session summary; weight the productivity
+  // ratio by time spent rather than by domain count when it's available
+  useEffect(() => {
+    const sessionQuery = sessionId ? `?session=${encodeURIComponent(sessionId)}` : "";
+    fetch(`http://localhost:5001/summary${sessionQuery}`)
+      .then(response => response.json())
+      .then(summary => {
+        const labelled = summary.productive_seconds + summary.unproductive_seconds;
+        if (labelled > 0) {
+          setFocusPercentage(Math.round((summary.productive_seconds / labelled) * 100));
+        }
+      })
+      .catch(err => console.error("Could not load the session summary:", err));
+  }, [sessionId]);
 
   const overallScore = parseInt(searchParams.get("score") || "0");
 
@@ -0,0 +1,256 @@
+"""asyncio-native serving mode for the tracking API (Starlette + uvicorn).
+
+Same routes and session handling as the Flask apps, but nothing slow runs
+on the event loop: /domains/analyze awaits classification on a worker
+thread, session lookups (which may replay or flush a log) and disk and
+camera work go to the thread pool, /stream clients are async generators
+rather than a pool thread each, and /track records the visit in memory
+on the loop, so extension beacons never queue behind an analysis.
+
+starlette and uvicorn are optional and only imported when this mode is used:
+
+    pip install starlette uvicorn
+"""
+import asyncio
+import json
+import math
+import time
+
+import metrics
+from sessions import BatchTooLargeError, SessionLimitError, session_id_from
+from live import LiveFeed
+from report import FORMATS, ReportRenderer
+import preview as preview_stream
+
+def create_app(sessions, domain_root, live_focus, analyzer=None, on_vision_stop=None, reports=None,
+               preview=None):
+    """Build the ASGI app over an existing SessionManager.
+
+    `live_focus(session)` feeds /stream. `analyzer` is the
+    productivity_analyzer module; without it there is no /domains/analyze
+    and /summary only shows labels it was given. With `on_vision_stop`,
+    /vision/stop calls that instead of the session's own tracker
+    (combined.py owns its camera loop). `reports` is the ReportRenderer to
+    share with the Flask app, if any; `preview` is the camera loop's
+    PreviewStream, served at /preview and /preview.jpg.
+    """
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+    from starlette.routing import Route
+
+    if reports is None:
+        reports = ReportRenderer()
+        if sessions.on_evict is None:
+            sessions.on_evict = reports.forget
+    label_of = analyzer.cached_label if analyzer else None
+
+    async def read_json(request):
+        try:
+            return json.loads(await request.body() or b"null")
+        except ValueError:
+            return None
+
+    async def session_for(request, body=None):
+        # Opening a session replays its log and may close an evicted one
+        return await run_in_threadpool(sessions.get,
+                                       session_id_from(request.query_params, request.headers, body))
+
+    def with_session(handler):
+        # Same session lookup, errors and request timing as the Flask hooks
+        async def endpoint(request):
+            start = time.perf_counter()
+            response = await handle(request)
+            metrics.http_seconds.observe(time.perf_counter() - start, request.url.path,
+                                         request.method, response.status_code)
+            return response
+
+        async def handle(request):
+            body = await read_json(request) if request.method in ("POST", "DELETE") else None
+            try:
+                session = await session_for(request, body)
+            except ValueError as e:
+                return JSONResponse({"status": "error", "message": str(e)}, 400)
+            except SessionLimitError as e:
+                return JSONResponse({"status": "error", "message": str(e)}, 503)
+            return await handler(request, session, body)
+        return endpoint
+
+    async def track(request, session, data):
+        if not data:
+            return JSONResponse({"status": "error", "message": "No data received"}, 400)
+        url = data.get("url", "unknown") if isinstance(data, dict) else None
+        if not isinstance(url, str):
+            return JSONResponse({"status": "error", "message": 'Expected {"url": "..."}'}, 400)
+        domain = domain_root(url)
+        if domain is None:
+            return JSONResponse({"status": "ignored"})
+
+        # Microseconds of in-memory work (the log only buffers it), so it runs
+        # on the loop and the answer can carry the domain limit like Flask's
+        if not session.track(url, domain):
+            return JSONResponse({"status": "error", "message": "Domain limit reached for this session"}, 429)
+        return JSONResponse({"status": "ok"})
+
+    async def track_batch(request, session, data):
+        if not isinstance(data, dict) or not isinstance(data.get("events"), list):
+            return JSONResponse({"status": "error", "message": 'Expected {"events": [...]}'}, 400)
+        try:
+            accepted, rejected = session.track_batch(data["events"], domain_root)
+        except BatchTooLargeError as e:
+            return JSONResponse({"status": "error", "message": str(e)}, 413)
+        except ValueError as e:
+            return JSONResponse({"status": "error", "message": str(e)}, 400)
+        return JSONResponse({"status": "ok", "accepted": accepted, "rejected": rejected})
+
+    async def get_domains(request, session, _):
+        return JSONResponse(session.store.to_json())
+
+    async def delete_domains(request, session, _):
+        records = await run_in_threadpool(session.reset)
+        return JSONResponse({"status": "ok", "domains": {d: record.to_dict() for d, record in records.items()}})
+
+    async def domain_times(request, session, _):
+        params = request.query_params
+        try:
+            start = float(params["start"]) if "start" in params else None
+            end = float(params["end"]) if "end" in params else None
+        except ValueError:
+            return JSONResponse({"status": "error", "message": "start and end must be unix timestamps"}, 400)
+        if not all(math.isfinite(t) for t in (start, end) if t is not None):
+            return JSONResponse({"status": "error", "message": "start and end must be unix timestamps"}, 400)
+        return JSONResponse({
+            "dwell": session.timeline.dwell_seconds(start, end),
+            "focused": session.timeline.focused_seconds(start, end),
+        })
+
+    async def analyze(request, session, _):
+        # Classification can take seconds; await it on a worker thread so
+        # /track keeps being served meanwhile
+        snapshot = session.store.snapshot_and_reset()
+        counts, fallbacks, labels = await asyncio.to_thread(analyzer.analyze_history, snapshot)
+        session.labels(labels)
+        response = {"status": "ok", "productive": counts[0], "unproductive": counts[1]}
+        if fallbacks:
+            response["note"] = f"Best guess (classifier unavailable or timed out): {', '.join(fallbacks)}"
+            response["fallback_domains"] = fallbacks
+        return JSONResponse(response)
+
+    async def session_summary(request, session, _):
+        return JSONResponse(session.summary.to_json(label_of=label_of))
+
+    async def summary_report(request, session, _):
+        fmt = request.query_params.get("format", "png")
+        if fmt not in FORMATS:
+            return JSONResponse({"status": "error", "message": f"format must be one of {', '.join(FORMATS)}"}, 400)
+        summary = session.summary.to_json(label_of=label_of)
+        # Rendered on the report worker; the loop only awaits the result
+        image = await asyncio.wrap_future(reports.report(session.id, summary, fmt))
+        return Response(image, media_type=FORMATS[fmt])
+
+    async def history_sessions(request, session, _):
+        return JSONResponse(await run_in_threadpool(session.log.sessions))
+
+    async def history_days(request, session, _):
+        return JSONResponse(await run_in_threadpool(session.log.days))
+
+    async def stream(request, session, _):
+        feed = LiveFeed(session.store, lambda: live_focus(session), session=session)
+        return StreamingResponse(feed.aevents(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def start_vision(request, session, _):
+        try:
+            await run_in_threadpool(sessions.start_tracker, session)
+        except SessionLimitError as e:
+            return JSONResponse({"status": "error", "message": str(e)}, 409)
+        return JSONResponse({"status": "ok"})
+
+    async def step_vision(request, session, _):
+        state = (session.tracker.step() if session.tracker else None) or {}
+        return JSONResponse({"status": "ok", **state})
+
+    async def stop_vision(request, session, _):
+        if on_vision_stop:
+            on_vision_stop()
+            return JSONResponse({"status": "ok"})
+        score = await run_in_threadpool(session.tracker.stop) if session.tracker else 0
+        return JSONResponse({"focus_score": score})
+
+    async def preview_mjpeg(request):
+        preview_stream.preview_viewers.inc("mjpeg")
+        return StreamingResponse(preview.mjpeg(), media_type=preview_stream.MIMETYPE,
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def preview_jpeg(request):
+        preview_stream.preview_viewers.inc("jpeg")
+        image = await run_in_threadpool(preview.snapshot)
+        if image is None:
+            return JSONResponse({"status": "error", "message": "No camera frames yet"}, 503)
+        return Response(image, media_type="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+    async def metrics_text(request):
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    async def debug_profile(request):
+        if not metrics.PROFILER_ENABLED:
+            return JSONResponse({"status": "error",
+                                 "message": "Profiler is off; start the server with MIZA_PROFILE=1"}, 404)
+        try:
+            seconds = float(request.query_params.get("seconds", 5))
+        except ValueError:
+            seconds = math.nan
+        if not math.isfinite(seconds):
+            return JSONResponse({"status": "error", "message": "seconds must be a number"}, 400)
+        seconds = min(max(seconds, 0.0), metrics.MAX_PROFILE_SECONDS)
+        return PlainTextResponse(await asyncio.to_thread(metrics.profile, seconds))
+
+    routes = [
+        Route("/metrics", metrics_text, methods=["GET"]),
+        Route("/debug/profile", debug_profile, methods=["GET"]),
+        Route("/track", with_session(track), methods=["POST"]),
+        Route("/track/batch", with_session(track_batch), methods=["POST"]),
+        Route("/domains", with_session(get_domains), methods=["GET"]),
+        Route("/domains", with_session(delete_domains), methods=["DELETE"]),
+        Route("/domains/time", with_session(domain_times), methods=["GET"]),
+        Route("/summary", with_session(session_summary), methods=["GET"]),
+        Route("/summary/report", with_session(summary_report), methods=["GET"]),
+        Route("/history/sessions", with_session(history_sessions), methods=["GET"]),
+        Route("/history/days", with_session(history_days), methods=["GET"]),
+        Route("/stream", with_session(stream), methods=["GET"]),
+        Route("/vision/stop", with_session(stop_vision), methods=["POST"]),
+    ]
+    if analyzer:
+        routes.append(Route("/domains/analyze", with_session(analyze), methods=["GET"]))
+    if preview:
+        routes.append(Route("/preview", preview_mjpeg, methods=["GET"]))
+        routes.append(Route("/preview.jpg", preview_jpeg, methods=["GET"]))
+    if not on_vision_stop:
+        routes.append(Route("/vision/start", with_session(start_vision), methods=["POST"]))
+        routes.append(Route("/vision/step", with_session(step_vision), methods=["POST"]))
+
+    middleware = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+    return Starlette(routes=routes, middleware=middleware)
+
+def serve(app, host="127.0.0.1", port=5001, ready=None):
+    """Run an app from create_app() with uvicorn (blocking).
+
+    `ready` is an optional threading.Event, set once the socket is listening.
+    """
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+
+    async def run():
+        async def signal_ready():
+            while not server.started:
+                await asyncio.sleep(0.01)
+            ready.set()
+
+        watcher = asyncio.create_task(signal_ready()) if ready else None
+        await server.serve()
+        if watcher:
+            watcher.cancel()
+
+    asyncio.run(run())
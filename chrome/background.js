@@ -1,5 +1,10 @@
 console.log("Background script loaded");
 
+const SERVER_URLS = ["http://127.0.0.1:5002", "http://localhost:5002"];
+const FLUSH_IDLE_MS = 2000;      // send once tabs have been quiet this long
+const FLUSH_MAX_DELAY_MS = 10000; // but never hold an event longer than this
+const MAX_BUFFERED = 500;
+
 // Query and log available tabs
 chrome.tabs.query({}, (tabs) => {
   console.log("Tabs available:", tabs.length);
@@ -13,47 +18,92 @@ chrome.tabs.query({ active: true, currentWindow: true }, (tabs) => {
   }
 });
 
+// Tab events are buffered with the time they happened and sent to
+// /track/batch together; the server files a late event at its own time as
+// long as it is within its reorder window (timeline.REORDER_WINDOW).
+let buffer = [];
+let lastUrl = null;
+let idleTimer = null;
+let maxDelayTimer = null;
+let flushing = false;
+
 function sendTabURLToPython(tab) {
-  if (tab && tab.url) {
-    console.log("Sending URL:", tab.url);
-    fetch("http://127.0.0.1:5002/track", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ url: tab.url })
-    })
-    .then(response => {
-      console.log("Response status:", response.status);
-      return response.json();
-    })
-    .then(data => console.log("Server response:", data))
-    .catch(err => {
-      console.error("Failed to send URL:", err);
-      console.log("Trying alternate URL...");
-      fetch("http://localhost:5002/track", {
+  if (!tab || !tab.url) {
+    console.log("No valid tab or URL:", tab);
+    return;
+  }
+  // onActivated and onUpdated often report the same page back to back
+  if (tab.url === lastUrl) {
+    return;
+  }
+  lastUrl = tab.url;
+  buffer.push({ url: tab.url, t: Date.now() });
+  if (buffer.length > MAX_BUFFERED) {
+    buffer.splice(0, buffer.length - MAX_BUFFERED);
+  }
+  scheduleFlush();
+}
+
+function scheduleFlush() {
+  clearTimeout(idleTimer);
+  idleTimer = setTimeout(flush, FLUSH_IDLE_MS);
+  if (!maxDelayTimer) {
+    maxDelayTimer = setTimeout(flush, FLUSH_MAX_DELAY_MS);
+  }
+}
+
+async function flush() {
+  clearTimeout(idleTimer);
+  clearTimeout(maxDelayTimer);
+  idleTimer = maxDelayTimer = null;
+  if (flushing || buffer.length === 0) {
+    return;
+  }
+  flushing = true;
+  const events = buffer;
+  buffer = [];
+  // No session id: combined.py joins these with its webcam in the default session
+  const body = JSON.stringify({ events });
+
+  let sent = false;
+  for (const server of SERVER_URLS) {
+    try {
+      const response = await fetch(`${server}/track/batch`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ url: tab.url })
-      })
-      .then(response => {
-        console.log("Alternate response status:", response.status);
-        return response.json();
-      })
-      .then(data => console.log("Server response (alternate):", data))
-      .catch(altErr => console.error("All connection attempts failed:", altErr));
-    });
-  } else {
-    console.log("No valid tab or URL:", tab);
+        body
+      });
+      console.log("Sent", events.length, "tab events:", await response.json());
+      sent = true;
+      break;
+    } catch (err) {
+      console.error(`Failed to send tab events to ${server}:`, err);
+    }
+  }
+  flushing = false;
+
+  if (!sent) {
+    // Keep them (oldest first) for the next attempt
+    buffer = events.concat(buffer).slice(-MAX_BUFFERED);
+    scheduleFlush();
+  } else if (buffer.length > 0) {
+    scheduleFlush();
   }
 }
 
 chrome.tabs.onActivated.addListener(activeInfo => {
-  console.log("Tab activated:", activeInfo);
   chrome.tabs.get(activeInfo.tabId, sendTabURLToPython);
 });
 
 chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
-  console.log("Tab updated:", changeInfo, tabId);
   if (changeInfo.status === "complete") {
     sendTabURLToPython(tab);
   }
 });
+
+// Going idle or locking the screen is a natural point to send what we have
+chrome.idle.onStateChanged.addListener(state => {
+  if (state !== "active") {
+    flush();
+  }
+});
@@ -0,0 +1,73 @@
+"""Benchmark the classification stage against a local stand-in for Gemini.
+
+    python bench_analyzer.py --domains 200 --latency 0.8 --failure-rate 0.1
+"""
+import argparse
+import json
+import random
+import time
+
+from classification_cache import ClassificationCache
+import productivity_analyzer as analyze
+
+class FakeModel:
+    """Mimics GenerativeModel.generate_content with configurable latency and errors"""
+
+    def __init__(self, latency=0.5, jitter=0.2, failure_rate=0.0, hang_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        timeout = (request_options or {}).get("timeout")
+        delay = self.latency + random.uniform(0, self.jitter)
+        if random.random() < self.hang_rate:
+            delay = float("inf")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake model timed out after {timeout:.1f}s")
+        time.sleep(delay)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("fake model error")
+
+        domains = prompt.rsplit("Websites:\n", 1)[1].split()
+        labels = {d: ("unproductive" if hash(d) % 3 == 0 else "productive") for d in domains}
+
+        class Response:
+            text = json.dumps(labels)
+        return Response()
+
+def run(domains, model, deadline):
+    # Start every run cold, with the local classifier off, so neither the
+    # cache nor the local labels hide the model latency
+    analyze._cache = ClassificationCache(path=None, seeds={})
+    analyze.USE_LOCAL = False
+    start = time.perf_counter()
+    labels, fallbacks = analyze.classify_domains(domains, model=model, deadline=deadline)
+    return time.perf_counter() - start, len(labels), len(fallbacks)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--domains", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--deadline", type=float, default=analyze.DEADLINE)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    domains = [f"site{i}.example.com" for i in range(args.domains)]
+    print(f"{args.domains} domains, batch size {analyze.BATCH_SIZE}, "
+          f"{analyze.MAX_WORKERS} workers, deadline {args.deadline:.1f}s")
+    for i in range(args.runs):
+        model = FakeModel(args.latency, args.jitter, args.failure_rate, args.hang_rate)
+        elapsed, labelled, fallbacks = run(domains, model, args.deadline)
+        print(f"run {i + 1}: {elapsed:.2f}s, {model.calls} model calls, "
+              f"{labelled - fallbacks} classified, {fallbacks} defaulted")
+
+if __name__ == "__main__":
+    main()
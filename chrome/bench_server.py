@@ -0,0 +1,210 @@
+"""Benchmark /track on the Flask dev server against the ASGI mode.
+
+    python bench_server.py --connections 50 --duration 10
+    python bench_server.py --analyze-every 2 --analyze-latency 1.5
+
+Each mode runs chrome/server.py's routes in its own subprocess, with a
+throwaway session log. A local asyncio load generator keeps --connections
+keep-alive connections busy with /track beacons for --duration seconds.
+With --analyze-every it also runs a /domains/analyze against a stand-in
+model that takes --analyze-latency seconds, to show whether beacons queue
+behind classification. Reports req/s and p50/p99 latency for each mode.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MODES = ("flask", "asgi")
+
+# ---- server side (child process) ----
+
+def serve(mode, port, analyze_latency):
+    import server
+    if analyze_latency:
+        import productivity_analyzer as analyze
+        from bench_analyzer import FakeModel
+        from classification_cache import ClassificationCache
+        # Under the setup lock so the background Gemini setup can't undo this
+        with analyze._setup_lock:
+            analyze._model = FakeModel(latency=analyze_latency, jitter=0)
+            analyze._analyzer_enabled = True
+        analyze._cache = ClassificationCache(path=None, seeds=None)
+        analyze.USE_LOCAL = False
+    if mode == "asgi":
+        from asgi_server import create_app, serve as serve_asgi
+        serve_asgi(create_app(server.sessions, server.domain_of, server.live_focus,
+                              analyzer=server.analyze), port=port)
+    else:
+        # What run_server() does today
+        server.app.run(port=port)
+
+# ---- load generator ----
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    length, keep_alive = 0, not status_line.startswith(b"HTTP/1.0")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            keep_alive = value == "keep-alive" or (keep_alive and value != "close")
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive
+
+def http_request(method, path, port, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: keep-alive\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+    return head.encode() + payload
+
+async def beacon_worker(port, worker_id, deadline, latencies, errors):
+    requests = [http_request("POST", "/track", port,
+                             {"url": f"https://site{k}.test/page", "session": f"bench-{worker_id % 20}"})
+                for k in range(10)]
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        start = time.perf_counter()
+        try:
+            writer.write(requests[i % len(requests)])
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors.append("connection")
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 300:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            writer = None
+        i += 1
+    if writer is not None:
+        writer.close()
+
+async def send_once(port, request):
+    # One request per connection; Werkzeug's dev server closes after each anyway
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        return (await read_response(reader))[0]
+    finally:
+        writer.close()
+
+async def analyze_worker(port, every, deadline, timings):
+    while time.perf_counter() + every < deadline:
+        await asyncio.sleep(every)
+        for k in range(5):
+            await send_once(port, http_request("POST", "/track", port, {
+                "url": f"https://analyze{k}-{len(timings)}.test/", "session": "bench-analyze"}))
+        start = time.perf_counter()
+        await send_once(port, http_request("GET", "/domains/analyze?session=bench-analyze", port))
+        timings.append(time.perf_counter() - start)
+
+async def run_load(port, connections, duration, analyze_every):
+    latencies, errors, analyze_times = [], [], []
+    deadline = time.perf_counter() + duration
+    tasks = [beacon_worker(port, i, deadline, latencies, errors) for i in range(connections)]
+    if analyze_every:
+        tasks.append(analyze_worker(port, analyze_every, deadline, analyze_times))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return latencies, errors, analyze_times, time.perf_counter() - start
+
+# ---- driver ----
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(port, process, timeout=60):
+    end = time.time() + timeout
+    while time.time() < end:
+        if process.poll() is not None:
+            raise RuntimeError("server process exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+def bench_mode(mode, args):
+    port = free_port()
+    env = dict(os.environ, MIZA_SESSION_LOG=tempfile.mkdtemp(prefix=f"miza-bench-{mode}-"))
+    command = [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port)]
+    if args.analyze_every:
+        command += ["--fake-model", str(args.analyze_latency)]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, process)
+        asyncio.run(run_load(port, 20, 1.0, 0))  # warm up, opening every bench session
+        latencies, errors, analyze_times, wall = asyncio.run(
+            run_load(port, args.connections, args.duration, args.analyze_every))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "req_per_s": len(latencies) / wall,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "errors": len(errors),
+        "analyze_s": [round(t, 2) for t in analyze_times],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--analyze-every", type=float, default=0,
+                        help="seconds between /domains/analyze calls during the run (0 = none)")
+    parser.add_argument("--analyze-latency", type=float, default=1.5, help="stand-in model latency")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--fake-model", type=float, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.fake_model)
+        return
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = report = bench_mode(mode, args)
+        print(f"{mode:<6} {report['req_per_s']:8.0f} req/s   p50 {report['p50_ms']:7.2f} ms   "
+              f"p99 {report['p99_ms']:7.2f} ms   max {report['max_ms']:7.1f} ms   errors {report['errors']}"
+              + (f"   analyze {report['analyze_s']} s" if report["analyze_s"] else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
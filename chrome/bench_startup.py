@@ -0,0 +1,71 @@
+"""Measure combined.py's cold start: launch to the first accepted /track.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --budget 1.0 --asgi
+
+Each run starts combined.py --headless in a fresh process, replaying a few
+blank frames instead of the webcam and with a throwaway session log, and
+polls /track until it answers. Reports the median and worst time and exits
+1 if the median is over --budget seconds.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACK_URL = "http://127.0.0.1:5002/track"
+
+def blank_frames(count=300):
+    """A directory of tiny black frames, enough for a few seconds of replay"""
+    import cv2
+    path = tempfile.mkdtemp(prefix="miza-startup-frames-")
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for i in range(count):
+        cv2.imwrite(os.path.join(path, f"{i:04d}.png"), frame)
+    return path
+
+def time_to_first_track(frames, asgi, timeout=30.0):
+    env = dict(os.environ, MIZA_SESSION_LOG=tempfile.mkdtemp(prefix="miza-startup-"))
+    command = [sys.executable, os.path.join(ROOT, "combined.py"), "--headless", "--source", frames]
+    if asgi:
+        command.append("--asgi")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("combined.py exited before /track answered")
+            try:
+                # github.com is a seeded label, so shutdown never calls the model
+                if requests.post(TRACK_URL, json={"url": "https://github.com/"}, timeout=1).ok:
+                    return time.perf_counter() - start
+            except requests.RequestException:
+                time.sleep(0.01)
+        raise RuntimeError(f"/track did not answer within {timeout:.0f}s")
+    finally:
+        process.kill()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed for the median run")
+    parser.add_argument("--asgi", action="store_true", help="start combined.py with --asgi")
+    args = parser.parse_args()
+
+    frames = blank_frames()
+    times = np.array([time_to_first_track(frames, args.asgi) for _ in range(args.runs)])
+    median = float(np.median(times))
+    print(f"cold start to first /track over {args.runs} runs: median {1000 * median:.0f} ms, "
+          f"worst {1000 * times.max():.0f} ms (budget {1000 * args.budget:.0f} ms)")
+    sys.exit(0 if median <= args.budget else 1)
+
+if __name__ == "__main__":
+    main()
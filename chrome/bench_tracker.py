@@ -0,0 +1,180 @@
+"""Benchmark the eye-tracking pipeline on recorded video.
+
+    python bench_tracker.py corpus/desk.mp4 corpus/frames/ --backend haar
+    python bench_tracker.py corpus/*.mp4 --json results.json
+    python bench_tracker.py corpus/*.mp4 --baseline results.json
+    python bench_tracker.py corpus/*.mp4 --gate
+
+Reports fps, p50/p99 per-stage timings (grab, gate, grayscale, face, eyes,
+heatmap), CPU time per recorded frame and the focus score of every clip.
+--gate runs the motion gate and adaptive sampling rate the trackers use:
+frames between samples (in recording time) keep the last focus state, and
+still frames reuse the last detection. Pass --expected with a JSON file of
+{clip: focus_score} to measure accuracy, and --baseline with a previous
+--json output to flag regressions.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detection import FaceEyeDetector, make_detector
+from frame_source import open_source
+from heatmap import AttentionHeatmap
+from motion import AdaptiveRate, MotionGate
+
+STAGES = ("grab", "gate", "grayscale", "face", "eyes", "heatmap")
+
+def run_clip(path, backend, realtime=False, max_frames=None, gate=False):
+    source = open_source(path, realtime=realtime)
+    if not source.isOpened():
+        raise RuntimeError(f"Could not open {path!r}")
+    detector = make_detector(backend)
+    haar = isinstance(detector, FaceEyeDetector)
+    motion = MotionGate() if gate else None
+    rate = AdaptiveRate(max_fps=source.fps) if gate else None
+    timings = {stage: [] for stage in STAGES}
+    heatmap = None
+    frames = focused = processed = detected = 0
+    results, state, next_sample = [], False, 0.0
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    while max_frames is None or frames < max_frames:
+        t0 = time.perf_counter()
+        ret, frame = source.read()
+        t1 = time.perf_counter()
+        if not ret:
+            break
+        if heatmap is None:
+            heatmap = AttentionHeatmap(frame.shape)
+        frames += 1
+        if rate is not None and source.timestamp < next_sample:
+            # Not sampled: the last focus state holds until the next sample
+            focused += state
+            continue
+        processed += 1
+
+        fresh = motion is None or motion.changed(frame)
+        t1g = time.perf_counter()
+        if not fresh:
+            t2 = t3 = t4 = t1g
+        elif haar:
+            # Time the Haar stages separately, the way the tracker loops run them
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            t2 = time.perf_counter()
+            faces = detector.detect_faces(gray)
+            t3 = time.perf_counter()
+            results = [((x, y, w, h), detector.eye_cascade.detectMultiScale(gray[y:y+h, x:x+w]))
+                       for (x, y, w, h) in faces]
+            t4 = time.perf_counter()
+        else:
+            t2 = t1g
+            results = detector.detect(frame)
+            t3 = t4 = time.perf_counter()
+
+        for (x, y, w, h), eyes in results:
+            for (ex, ey, ew, eh) in eyes:
+                heatmap.add(x + ex + ew // 2, y + ey + eh // 2)
+        heatmap.step()
+        t5 = time.perf_counter()
+
+        for stage, elapsed in zip(STAGES, (t1 - t0, t1g - t1, t2 - t1g, t3 - t2, t4 - t3, t5 - t4)):
+            timings[stage].append(elapsed)
+        detected += fresh
+        focus = detector.is_focused(results)
+        if rate is not None:
+            rate.observe(motion.moved or focus != state, source.timestamp)
+            next_sample = source.timestamp + rate.interval
+        state = focus
+        focused += focus
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    source.release()
+
+    report = {
+        "frames": frames,
+        "processed": processed,
+        "detected": detected,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "cpu_ms_per_frame": 1000 * cpu / frames if frames else 0.0,
+        # Every frame covers 1/fps of the recording, so the share of focused
+        # frames is the focus score in recording time
+        "focus_score": focused / frames if frames else 0.0,
+    }
+    for stage, values in timings.items():
+        ms = np.array(values) * 1000 if values else np.zeros(1)
+        report[f"{stage}_p50_ms"] = float(np.percentile(ms, 50))
+        report[f"{stage}_p99_ms"] = float(np.percentile(ms, 99))
+    return report
+
+def print_report(name, report, expected=None):
+    print(f"\n{name}: {report['frames']} frames, {report['fps']:.1f} fps, "
+          f"focus score {report['focus_score']:.3f}"
+          + (f" (expected {expected:.3f}, error {report['focus_score'] - expected:+.3f})"
+             if expected is not None else ""))
+    print(f"  processed {report['processed']}, detector ran on {report['detected']}, "
+          f"CPU {report['cpu_ms_per_frame']:.2f} ms per frame")
+    for stage in STAGES:
+        print(f"  {stage:<10} p50 {report[f'{stage}_p50_ms']:7.2f} ms   p99 {report[f'{stage}_p99_ms']:7.2f} ms")
+
+def compare(results, baseline, tolerance):
+    """Names of metrics that got worse than the baseline by more than `tolerance`"""
+    regressions = []
+    for clip, report in results.items():
+        before = baseline.get(clip)
+        if not before:
+            continue
+        if report["fps"] < before["fps"] * (1 - tolerance):
+            regressions.append(f"{clip}: fps {before['fps']:.1f} -> {report['fps']:.1f}")
+        for stage in STAGES:
+            key = f"{stage}_p99_ms"
+            if key in before and report[key] > before[key] * (1 + tolerance) + 0.5:
+                regressions.append(f"{clip}: {key} {before[key]:.2f} -> {report[key]:.2f}")
+        if abs(report["focus_score"] - before["focus_score"]) > 0.02:
+            regressions.append(f"{clip}: focus_score {before['focus_score']:.3f} -> {report['focus_score']:.3f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("clips", nargs="+", help="video files or directories of frames")
+    parser.add_argument("--backend", help="detector backend (default: MIZA_DETECTOR or haar)")
+    parser.add_argument("--realtime", action="store_true", help="replay at recorded speed")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--expected", help="JSON file mapping clip name to true focus score")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--gate", action="store_true", help="motion gate and adaptive sampling rate")
+    args = parser.parse_args()
+
+    expected = {}
+    if args.expected:
+        with open(args.expected) as f:
+            expected = json.load(f)
+
+    results = {}
+    for path in args.clips:
+        name = os.path.basename(os.path.normpath(path))
+        results[name] = run_clip(path, args.backend, args.realtime, args.max_frames, args.gate)
+        print_report(name, results[name], expected.get(name))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "MIZA_CLASSIFICATION_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".classification_cache.json"),
+)
+DEFAULT_TTL = 30 * 24 * 3600  # a month; domains rarely change category
+DEFAULT_MAX_ENTRIES = 2000
+
+# Domains we already know the answer for, so common sites never hit Gemini.
+SEED_LABELS = {
+    "github.com": "productive",
+    "stackoverflow.com": "productive",
+    "wikipedia.org": "productive",
+    "google.com": "productive",
+    "khanacademy.org": "productive",
+    "coursera.org": "productive",
+    "edx.org": "productive",
+    "instructure.com": "productive",
+    "quizlet.com": "productive",
+    "chegg.com": "productive",
+    "wolframalpha.com": "productive",
+    "desmos.com": "productive",
+    "overleaf.com": "productive",
+    "notion.so": "productive",
+    "arxiv.org": "productive",
+    "localhost:3000": "productive",
+    "youtube.com": "unproductive",
+    "netflix.com": "unproductive",
+    "twitch.tv": "unproductive",
+    "tiktok.com": "unproductive",
+    "instagram.com": "unproductive",
+    "facebook.com": "unproductive",
+    "twitter.com": "unproductive",
+    "x.com": "unproductive",
+    "reddit.com": "unproductive",
+    "9gag.com": "unproductive",
+    "hulu.com": "unproductive",
+    "disneyplus.com": "unproductive",
+    "primevideo.com": "unproductive",
+    "spotify.com": "unproductive",
+    "discord.com": "unproductive",
+    "pinterest.com": "unproductive",
+    "amazon.com": "unproductive",
+    "ebay.com": "unproductive",
+}
+
+def normalize_domain(domain):
+    """Canonical cache key for a domain: lowercase, no www., no trailing dot"""
+    domain = (domain or "").strip().lower().rstrip(".")
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return domain
+
+class ClassificationCache:
+    """On-disk domain -> label cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, seeds=SEED_LABELS):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.seeds = {normalize_domain(d): label for d, label in (seeds or {}).items()}
+        self._entries = OrderedDict()  # domain -> (label, stored_at), oldest first
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable classification cache {self.path!r}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            # The file is written least-recently-used first, so insertion order
+            # restores the LRU order.
+            for domain, (label, stored_at) in data.items():
+                if now - stored_at < self.ttl:
+                    self._entries[domain] = (label, stored_at)
+            self._evict()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {d: [label, ts] for d, (label, ts) in self._entries.items()}
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not write classification cache {self.path!r}: {e}")
+
+    def get(self, domain):
+        key = normalize_domain(domain)
+        if key in self.seeds:
+            return self.seeds[key]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            label, stored_at = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return label
+
+    def put(self, domain, label):
+        self.put_many({domain: label})
+
+    def put_many(self, labels):
+        now = time.time()
+        with self._lock:
+            for domain, label in labels.items():
+                key = normalize_domain(domain)
+                self._entries[key] = (label, now)
+                self._entries.move_to_end(key)
+            self._evict()
+            self._dirty = True
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
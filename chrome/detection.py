@@ -0,0 +1,204 @@
+import os
+
+import cv2
+import numpy as np
+
+import metrics
+
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+EYE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_eye.xml'
+
+# Backend selection: haar (default), dnn or yunet. The dnn/yunet model files
+# are not bundled; point these at a downloaded copy.
+DETECTOR_BACKEND = os.environ.get("MIZA_DETECTOR", "haar")
+DNN_MODEL_PATH = os.environ.get("MIZA_DNN_MODEL", "res10_300x300_ssd_iter_140000.caffemodel")
+DNN_CONFIG_PATH = os.environ.get("MIZA_DNN_CONFIG", "deploy.prototxt")
+YUNET_MODEL_PATH = os.environ.get("MIZA_YUNET_MODEL", "face_detection_yunet_2023mar.onnx")
+
+# One series per detector call: Haar face search (full frame or around the
+# last face), Haar eyes, and the dnn/yunet forward passes
+detect_seconds = metrics.histogram("miza_detect_seconds", "Time per face/eye detector call",
+                                   buckets=metrics.FAST_BUCKETS, labels=("stage",))
+
+class DetectorBackend:
+    """Face/eye detector interface used by the trackers.
+
+    detect(frame) takes a BGR frame and returns [((x, y, w, h), eyes)] with
+    eye boxes relative to their face, the same shape the Haar loops always
+    produced. Backends that benefit from batching override detect_batch() and
+    set batch_size so the tracker can queue that many frames per call.
+    """
+
+    name = None
+    batch_size = 1
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+    def is_focused(self, results):
+        return any(len(eyes) > 0 for _, eyes in results)
+
+    def reset(self):
+        pass
+
+class FaceEyeDetector(DetectorBackend):
+    """Haar face + eye detection that avoids scanning the whole frame.
+
+    Full-frame face detection only runs on keyframes (every
+    `keyframe_interval` frames) or after the face is lost. In between, the
+    face cascade searches a window around the last face, expanded by
+    `roi_margin` of its size, optionally downscaled by `roi_scale`, and with
+    minSize/maxSize pinned close to the last face size.
+    """
+
+    name = "haar"
+
+    def __init__(self, keyframe_interval=15, roi_margin=0.5, roi_scale=1.0,
+                 size_tolerance=0.3, min_face=60):
+        self.face_cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+        self.eye_cascade = cv2.CascadeClassifier(EYE_CASCADE_PATH)
+        self.keyframe_interval = keyframe_interval
+        self.roi_margin = roi_margin
+        self.roi_scale = roi_scale
+        self.size_tolerance = size_tolerance
+        self.min_face = min_face
+        self._last_face = None
+        self._since_keyframe = 0
+        self.keyframes = 0
+        self.roi_hits = 0
+
+    def reset(self):
+        self._last_face = None
+        self._since_keyframe = 0
+
+    def _full_frame(self, gray):
+        self.keyframes += 1
+        self._since_keyframe = 0
+        with detect_seconds.time("face_full"):
+            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5, minSize=(self.min_face, self.min_face))
+        return [tuple(int(v) for v in f) for f in faces]
+
+    def _track(self, gray):
+        x, y, w, h = self._last_face
+        mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(x - mx, 0), max(y - my, 0)
+        x1, y1 = min(x + w + mx, gray.shape[1]), min(y + h + my, gray.shape[0])
+        roi = gray[y0:y1, x0:x1]
+        scale = self.roi_scale
+        if scale != 1.0:
+            roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        size = max(w, h) * scale
+        min_size = max(int(size * (1 - self.size_tolerance)), 1)
+        max_size = int(size * (1 + self.size_tolerance)) + 1
+        with detect_seconds.time("face_roi"):
+            faces = self.face_cascade.detectMultiScale(roi, 1.1, 5, minSize=(min_size, min_size),
+                                                       maxSize=(max_size, max_size))
+        return [(x0 + int(fx / scale), y0 + int(fy / scale), int(fw / scale), int(fh / scale))
+                for (fx, fy, fw, fh) in faces]
+
+    def detect_faces(self, gray):
+        faces = []
+        if self._last_face is not None and self._since_keyframe < self.keyframe_interval:
+            faces = self._track(gray)
+            if faces:
+                self.roi_hits += 1
+        if not faces:
+            faces = self._full_frame(gray)
+        self._since_keyframe += 1
+        # Follow the largest face between keyframes
+        self._last_face = max(faces, key=lambda f: f[2] * f[3]) if faces else None
+        return faces
+
+    def detect(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        results = []
+        for (x, y, w, h) in self.detect_faces(gray):
+            with detect_seconds.time("eye"):
+                eyes = self.eye_cascade.detectMultiScale(gray[y:y+h, x:x+w])
+            results.append(((x, y, w, h), eyes))
+        return results
+
+def _eye_boxes(face, points):
+    """Small boxes around eye landmark points, relative to the face box"""
+    x, y, w, h = face
+    size = max(int(w * 0.2), 2)
+    return [(int(px) - x - size // 2, int(py) - y - size // 2, size, size) for px, py in points]
+
+class DnnFaceDetector(DetectorBackend):
+    """SSD face detector on cv2.dnn (CPU), run over a batch of frames at a time.
+
+    The res10 SSD has no landmarks, so the eye points are placed at their
+    usual position inside the face box; focus is a confident face detection.
+    """
+
+    name = "dnn"
+
+    def __init__(self, model_path=DNN_MODEL_PATH, config_path=DNN_CONFIG_PATH,
+                 confidence=0.6, input_size=(300, 300), batch_size=4):
+        self.net = cv2.dnn.readNet(model_path, config_path) if config_path else cv2.dnn.readNet(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+        self.input_size = input_size
+        self.batch_size = batch_size
+
+    def detect_batch(self, frames):
+        if not frames:
+            return []
+        frames = [f if f.ndim == 3 else cv2.cvtColor(f, cv2.COLOR_GRAY2BGR) for f in frames]
+        blob = cv2.dnn.blobFromImages(frames, 1.0, self.input_size, (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        # Rows are [image_id, label, confidence, x0, y0, x1, y1] for the whole batch
+        with detect_seconds.time("dnn"):
+            detections = self.net.forward().reshape(-1, 7)
+        results = [[] for _ in frames]
+        for image_id, _, confidence, x0, y0, x1, y1 in detections:
+            if confidence < self.confidence or not 0 <= image_id < len(frames):
+                continue
+            frame_h, frame_w = frames[int(image_id)].shape[:2]
+            x, y = int(max(x0, 0) * frame_w), int(max(y0, 0) * frame_h)
+            w, h = int(min(x1, 1) * frame_w) - x, int(min(y1, 1) * frame_h) - y
+            if w <= 0 or h <= 0:
+                continue
+            face = (x, y, w, h)
+            eyes = _eye_boxes(face, [(x + 0.3 * w, y + 0.38 * h), (x + 0.7 * w, y + 0.38 * h)])
+            results[int(image_id)].append((face, eyes))
+        return results
+
+class YuNetDetector(DetectorBackend):
+    """YuNet ONNX face detector with eye landmarks (cv2.FaceDetectorYN)"""
+
+    name = "yunet"
+
+    def __init__(self, model_path=YUNET_MODEL_PATH, confidence=0.8):
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), confidence)
+        self._input_size = None
+
+    def detect(self, frame):
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        size = (frame.shape[1], frame.shape[0])
+        if size != self._input_size:
+            self.detector.setInputSize(size)
+            self._input_size = size
+        with detect_seconds.time("yunet"):
+            _, faces = self.detector.detect(frame)
+        results = []
+        for row in (faces if faces is not None else np.empty((0, 15))):
+            face = tuple(int(v) for v in row[:4])
+            # Landmarks 0 and 1 are the right and left eye centres
+            results.append((face, _eye_boxes(face, [row[4:6], row[6:8]])))
+        return results
+
+BACKENDS = {cls.name: cls for cls in (FaceEyeDetector, DnnFaceDetector, YuNetDetector)}
+
+def make_detector(name=None, **kwargs):
+    """Build the configured detector backend (MIZA_DETECTOR, default haar)"""
+    name = name or DETECTOR_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {name!r}; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,90 @@
+import os
+import sys
+from functools import lru_cache
+
+PUBLIC_SUFFIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public_suffix_list.dat")
+CACHE_SIZE = 4096
+
+# Browser-internal and local pages aren't websites; they get no domain at all
+INTERNAL_SCHEMES = frozenset({
+    "chrome", "chrome-extension", "chrome-search", "chrome-untrusted", "devtools",
+    "edge", "brave", "opera", "vivaldi", "moz-extension", "about", "file",
+    "filesystem", "data", "blob", "javascript", "view-source",
+})
+WEB_SCHEMES = frozenset({"http", "https"})
+
+def _load_rules(path=PUBLIC_SUFFIX_PATH):
+    rules, wildcards, exceptions = set(), set(), set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rule = line.strip()
+            if not rule or rule.startswith("//"):
+                continue
+            if rule.startswith("!"):
+                exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                wildcards.add(rule[2:])
+            else:
+                rules.add(rule)
+    return rules, wildcards, exceptions
+
+_RULES, _WILDCARDS, _EXCEPTIONS = _load_rules()
+
+def _is_ip(host):
+    return host.startswith("[") or host.replace(".", "").isdigit()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def registrable_domain(host):
+    """eTLD+1 of a hostname per the public suffix list: mail.google.com -> google.com.
+
+    Results are interned, so every visit to a site shares one key string.
+    """
+    host = host.lower().rstrip(".")
+    if "." not in host or _is_ip(host):
+        return sys.intern(host)
+    labels = host.split(".")
+    # The first (longest) matching rule wins; exceptions beat wildcards
+    for i in range(len(labels)):
+        candidate = ".".join(labels[i:])
+        if candidate in _EXCEPTIONS:
+            suffix_start = i + 1
+            break
+        if candidate in _RULES or ".".join(labels[i + 1:]) in _WILDCARDS:
+            suffix_start = i
+            break
+    else:
+        suffix_start = len(labels) - 1  # implicit "*" rule: the TLD is the suffix
+    return sys.intern(".".join(labels[max(suffix_start - 1, 0):]))
+
+def domain_of(url):
+    """Registrable domain of a tab URL, or None for internal or non-web pages.
+
+    Plain string slicing instead of urlparse; hosts go through the cached
+    registrable_domain(). Hosts without a dot (localhost) and IPs keep their
+    port, since a local dev server is a site of its own.
+    """
+    if not isinstance(url, str):
+        return None
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return None
+    scheme = scheme.lower()
+    if scheme in INTERNAL_SCHEMES or scheme not in WEB_SCHEMES:
+        return None
+    end = len(rest)
+    for ch in "/?#":
+        pos = rest.find(ch)
+        if pos != -1 and pos < end:
+            end = pos
+    netloc = rest[:end].rpartition("@")[2]
+    if not netloc:
+        return None
+    if netloc.startswith("["):
+        host, _, port = netloc[1:].partition("]")
+        host, port = f"[{host}]", port.lstrip(":")
+    else:
+        host, _, port = netloc.partition(":")
+    host = host.lower()
+    if port and ("." not in host or _is_ip(host)):
+        return sys.intern(f"{host}:{port}")
+    return registrable_domain(host)
@@ -0,0 +1,89 @@
+"""Measure the local domain classifier against a labeled domain list.
+
+    python eval_classifier.py
+    python eval_classifier.py my_domains.tsv --threshold 0.9
+    python eval_classifier.py --train local_classifier.npz
+
+Reports agreement overall and on the domains the classifier is confident
+about (the ones the analyzer would not send to Gemini), k-fold agreement
+of a model trained on the rest of the list (what to expect on unseen
+domains), and throughput of the model alone and with the rules. --train refits on the whole list and writes the
+weights, e.g. over the bundled local_classifier.npz.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import local_classifier as local
+
+def agreement(classifier, domains, labels, threshold):
+    results = classifier.classify(domains)
+    predicted = np.array([results[d][0] for d in domains])
+    confidence = np.array([results[d][1] for d in domains])
+    truth = np.array(labels)
+    confident = confidence >= threshold
+    return {
+        "agreement": float((predicted == truth).mean()),
+        "coverage": float(confident.mean()),
+        "confident_agreement": float((predicted[confident] == truth[confident]).mean()) if confident.any() else 0.0,
+        "misses": [(d, t, p, c) for d, t, p, c in zip(domains, truth, predicted, confidence) if t != p],
+    }
+
+def cross_validate(domains, labels, threshold, folds=5, seed=0):
+    order = np.random.default_rng(seed).permutation(len(domains))
+    scores = []
+    for k in range(folds):
+        held = set(order[k::folds].tolist())
+        train = [i for i in range(len(domains)) if i not in held]
+        model = local.LocalClassifier.train([domains[i] for i in train], [labels[i] for i in train])
+        scores.append(agreement(model, [domains[i] for i in held], [labels[i] for i in held], threshold))
+    return {key: float(np.mean([s[key] for s in scores])) for key in ("agreement", "coverage", "confident_agreement")}
+
+def throughput(run, domains, repeat=20):
+    batch = (domains * (10000 // len(domains) + 1))[:10000]
+    run(batch)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(batch)
+    return len(batch) * repeat / ((time.perf_counter() - start) * 1000)
+
+def print_scores(title, scores, threshold):
+    print(f"{title}: agreement {scores['agreement']:.1%}; confident (>= {threshold:.2f}) on "
+          f"{scores['coverage']:.1%} of domains with {scores['confident_agreement']:.1%} agreement")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("labeled", nargs="?", default=local.DEFAULT_LABELED_PATH,
+                        help="domain<TAB>label file (default: the bundled list)")
+    parser.add_argument("--weights", default=local.DEFAULT_WEIGHTS_PATH)
+    parser.add_argument("--threshold", type=float, default=local.CONFIDENCE,
+                        help="confidence the analyzer needs to skip Gemini")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--train", metavar="PATH", help="fit on the whole list and save the weights here")
+    args = parser.parse_args()
+
+    domains, labels = local.load_labeled(args.labeled)
+    print(f"{len(domains)} labeled domains ({labels.count('productive')} productive, "
+          f"{labels.count('unproductive')} unproductive)")
+
+    if args.folds > 1:
+        print_scores(f"{args.folds}-fold held out", cross_validate(domains, labels, args.threshold, args.folds),
+                     args.threshold)
+    if args.train:
+        classifier = local.LocalClassifier.train(domains, labels)
+        classifier.save(args.train)
+        print(f"Wrote weights trained on all {len(domains)} domains to {args.train}")
+        classifier = local.LocalClassifier.load(args.train)
+    else:
+        classifier = local.LocalClassifier.load(args.weights)
+
+    scores = agreement(classifier, domains, labels, args.threshold)
+    print_scores("Weights on the full list", scores, args.threshold)
+    for domain, truth, predicted, confidence in scores["misses"][:20]:
+        print(f"  {domain}: labeled {truth}, predicted {predicted} ({confidence:.2f})")
+    print(f"Throughput: {throughput(classifier.predict_proba, domains):.0f} domains/ms for the model, "
+          f"{throughput(classifier.classify, domains):.0f} with the rules")
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,163 @@
 # eyes.py
-import cv2
-import numpy as np
 import time
+import threading
+from detection import make_detector
+from frame_source import open_source
+from motion import AdaptiveRate, gated
+import metrics
 
 class EyeTracker:
-    def __init__(self):
+    def __init__(self, threaded=False, fps=15, on_focus_change=None, backend=None, source=None):
         self.cap = None
         self.focus_time = 0
         self.start_time = None
         self.running = False
 
+        # Threaded mode: a worker owns the camera and the request handlers
+        # only read the focus state under the lock.
+        self.threaded = threaded
+        self.fps = fps
+        self.focused = False
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        # Called as on_focus_change(focused, timestamp) whenever the state flips
+        self.on_focus_change = on_focus_change
+        # Detector backend name (haar, dnn, yunet); None uses MIZA_DETECTOR
+        self.backend = backend
+        self.detector = None
+        # Webcam index, video file or frame directory (see frame_source)
+        self.source = source
+        self._last_sample = None
+        # Detection rate relaxes toward MIZA_MIN_FPS while the picture and
+        # the focus state hold still (motion.py)
+        self.rate = AdaptiveRate(max_fps=fps)
+
     def start(self):
-        self.cap = cv2.VideoCapture(0)
+        if self.running:
+            self.stop()
+
+        self.cap = open_source(self.source)
         if not self.cap.isOpened():
             print("Error: Could not open webcam")
             return
 
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-        self.focus_time = 0
-        self.start_time = time.time()
+        if self.detector is None:
+            self.detector = gated(make_detector(self.backend))
+        self.detector.reset()
+        self.rate.reset()
+        with self._lock:
+            self.focus_time = 0
+            self.focused = False
+            self.frames = 0
+            self.start_time = time.time()
+            self._last_sample = self.start_time
         self.running = True
 
-    def step(self):
-        if not self.running:
-            return
+        if self.threaded:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
 
+    def _detect(self):
         ret, frame = self.cap.read()
         if not ret:
-            return
+            return None
+        return self.detector.is_focused(self.detector.detect(frame))
+
+    def _record(self, eyes_detected, timestamp):
+        with self._lock:
+            # Credit the wall-clock time since the previous sample to the
+            # state that was observed during it.
+            if self.focused:
+                self.focus_time += timestamp - self._last_sample
+            self._last_sample = timestamp
+            changed = eyes_detected != self.focused
+            self.focused = eyes_detected
+            self.frames += 1
+        if changed:
+            self._notify(eyes_detected, timestamp)
+        return changed
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+    def _run(self):
+        # Frames wait here, stamped with their capture time, until there are
+        # enough for one call to a batching backend (one frame for Haar).
+        pending = []
+        while not self._stop_event.is_set():
+            tick = time.time()
+            ret, frame = self.cap.read()
+            if ret:
+                pending.append((time.time(), frame))
+            if len(pending) >= self.detector.batch_size:
+                start = time.perf_counter()
+                results = self.detector.detect_batch([frame for _, frame in pending])
+                changed = False
+                for (captured_at, _), faces in zip(pending, results):
+                    changed |= self._record(self.detector.is_focused(faces), captured_at)
+                # Without the gate there is no `moved`, and the rate stays at fps
+                self.rate.observe(changed or getattr(self.detector, "moved", True))
+                per_frame = (time.perf_counter() - start) / len(pending)
+                for _ in pending:
+                    metrics.frame_seconds.observe(per_frame, "tracker")
+                pending = []
 
-        eyes_detected = False
-        for (x, y, w, h) in faces:
-            roi_gray = gray[y:y+h, x:x+w]
-            eyes = self.eye_cascade.detectMultiScale(roi_gray)
-            if len(eyes) > 0:
-                eyes_detected = True
-                break
+            remaining = (self.rate.interval if self.fps > 0 else 0) - (time.time() - tick)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
 
+    def step(self):
+        if not self.running:
+            return
+
+        # The worker thread already samples the camera; just report the state.
+        if self.threaded:
+            return self.status()
+
+        eyes_detected = self._detect()
+        if eyes_detected is not None and eyes_detected != self.focused:
+            self.focused = eyes_detected
+            self._notify(eyes_detected, time.time())
         if eyes_detected:
             self.focus_time += 1  # Each frame = ~1 step; you can calibrate this
 
+    def _notify(self, focused, timestamp):
+        if self.on_focus_change:
+            self.on_focus_change(focused, timestamp)
+
+    def status(self):
+        with self._lock:
+            elapsed = time.time() - self.start_time if self.start_time else 0
+            focus_score = self.focus_time / elapsed if elapsed > 0 else 0
+            return {
+                "focused": self.focused,
+                "focus_time": round(self.focus_time, 2),
+                "elapsed": round(elapsed, 2),
+                "focus_score": round(focus_score, 2),
+                "frames": self.frames,
+            }
+
     def stop(self):
+        if self.start_time is None:
+            return 0
         self.running = False
-        total_time = time.time() - self.start_time
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
         if self.cap:
             self.cap.release()
-        focus_score = self.focus_time / total_time if total_time > 0 else 0
+            self.cap = None
+        with self._lock:
+            stopped_at = time.time()
+            # The worker credits focus up to its last sample; the rest of a
+            # focused stretch runs until now (step() counts frames instead)
+            if self.threaded and self.focused:
+                self.focus_time += stopped_at - self._last_sample
+                self._last_sample = stopped_at
+            total_time = stopped_at - self.start_time
+            focus_score = self.focus_time / total_time if total_time > 0 else 0
+            was_focused, self.focused = self.focused, False
+        if was_focused:
+            self._notify(False, stopped_at)
         return round(focus_score, 2)
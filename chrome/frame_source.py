@@ -0,0 +1,120 @@
+import os
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+class FrameSource:
+    """cv2.VideoCapture-style reader (isOpened/read/release) over recorded frames.
+
+    With realtime=True, read() waits until each frame's timestamp so a
+    recording replays at the pace it was captured; otherwise frames come as
+    fast as they can be decoded. `timestamp` is the position of the last
+    frame in seconds, which is what benchmarks should use for focus time.
+    """
+
+    def __init__(self, fps=30.0, realtime=False, loop=False):
+        self.fps = fps or 30.0
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.timestamp = 0.0
+        self.dropped = 0
+        self._started = None
+
+    def _next(self):
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def _skip(self):
+        """Step past one frame without decoding it; False at the end"""
+        raise NotImplementedError
+
+    def read(self):
+        if self.realtime and self._started is not None:
+            # Like a live camera: frames that went by while the reader was
+            # busy (or sampling slowly) are gone, so the replay keeps pace
+            due = int((time.time() - self._started) * self.fps)
+            while self.index < due and self._skip():
+                self.index += 1
+                self.dropped += 1
+        ret, frame = self._next()
+        if not ret and self.loop and self.index:
+            self._rewind()
+            ret, frame = self._next()
+        if not ret:
+            return False, None
+
+        self.timestamp = self.index / self.fps
+        self.index += 1
+        if self.realtime:
+            if self._started is None:
+                self._started = time.time()
+            delay = self._started + self.timestamp - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime=False, loop=False):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS), realtime, loop)
+
+    def _next(self):
+        return self.cap.read()
+
+    def _skip(self):
+        return self.cap.grab()
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.index = 0
+        self._started = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, path, fps=30.0, realtime=False, loop=False):
+        super().__init__(fps, realtime, loop)
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    def _next(self):
+        if self.index >= len(self.paths):
+            return False, None
+        frame = cv2.imread(self.paths[self.index])
+        return frame is not None, frame
+
+    def _skip(self):
+        return self.index < len(self.paths)
+
+    def _rewind(self):
+        self.index = 0
+        self._started = None
+
+    def isOpened(self):
+        return bool(self.paths)
+
+def open_source(source=None, realtime=True, loop=False):
+    """Open a webcam index, a video file or a directory of frames.
+
+    None or a number means a webcam (default 0), like cv2.VideoCapture(0).
+    """
+    if source is None or isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source or 0))
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, realtime=realtime, loop=loop)
+    return VideoFileSource(source, realtime=realtime, loop=loop)
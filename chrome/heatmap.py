@@ -0,0 +1,90 @@
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+heatmap_seconds = metrics.histogram("miza_heatmap_seconds", "Time per heatmap splat and overlay render",
+                                    buckets=metrics.FAST_BUCKETS, labels=("op",))
+
+class AttentionHeatmap:
+    """Decaying attention heatmap kept on a coarse grid.
+
+    The grid holds values divided by a global scale factor, so the per-frame
+    decay is one multiply on that scalar instead of a pass over the array; the
+    grid is only rescaled when the factor gets small enough to hurt float32
+    precision. Splats stamp a precomputed Gaussian kernel into a small window,
+    and the colored overlay is only rebuilt at the display rate.
+    """
+
+    def __init__(self, frame_shape, cell=8, radius=30, intensity=0.1,
+                 decay=0.99, display_fps=10, renormalize_below=1e-3):
+        self.frame_height, self.frame_width = frame_shape[:2]
+        self.cell = cell
+        self.intensity = intensity
+        self.decay = decay
+        self.renormalize_below = renormalize_below
+        self.render_interval = 1.0 / display_fps if display_fps else 0
+        self._grid = np.zeros((self.frame_height // cell + 1, self.frame_width // cell + 1),
+                              dtype=np.float32)
+        self._scale = 1.0
+        self._last_render = 0.0
+
+        # Gaussian covering the same footprint as the old cv2.circle splat
+        r = max(1, int(round(radius / cell)))
+        axis = np.arange(-r, r + 1, dtype=np.float32)
+        xx, yy = np.meshgrid(axis, axis)
+        self._kernel = np.exp(-(xx ** 2 + yy ** 2) / (2 * (r / 2.0) ** 2)).astype(np.float32)
+        self._radius = r
+
+    def add(self, x, y):
+        """Splat one gaze point given in frame pixel coordinates"""
+        start = time.perf_counter()
+        gx, gy = int(x) // self.cell, int(y) // self.cell
+        r = self._radius
+        rows, cols = self._grid.shape
+        y0, y1 = max(gy - r, 0), min(gy + r + 1, rows)
+        x0, x1 = max(gx - r, 0), min(gx + r + 1, cols)
+        if y0 >= y1 or x0 >= x1:
+            return
+        kernel = self._kernel[y0 - (gy - r):y1 - (gy - r), x0 - (gx - r):x1 - (gx - r)]
+        # Stored values are divided by the scale, so new weight is too
+        self._grid[y0:y1, x0:x1] += kernel * (self.intensity / self._scale)
+        heatmap_seconds.observe(time.perf_counter() - start, "add")
+
+    def step(self):
+        """Apply one frame of decay"""
+        self._scale *= self.decay
+        if self._scale < self.renormalize_below:
+            self._grid *= self._scale
+            self._scale = 1.0
+
+    def grid(self):
+        """The decayed grid in true units, e.g. for exporting at session end"""
+        return self._grid * self._scale
+
+    def save(self, path):
+        np.save(path, self.grid())
+
+    def render(self, frame, now=None):
+        """Blend the heatmap over `frame`, or return None if it isn't time yet"""
+        now = now if now is not None else time.time()
+        if now - self._last_render < self.render_interval:
+            return None
+        self._last_render = now
+        start = time.perf_counter()
+        blended = self.overlay(frame)
+        heatmap_seconds.observe(time.perf_counter() - start, "render")
+        return blended
+
+    def overlay(self, frame):
+        """Blend the heatmap over `frame`, which may be a downscaled copy of the camera frame"""
+        height, width = frame.shape[:2]
+        scale = width / self.frame_width
+        # Min-max normalization ignores the global scale, so use the raw grid
+        hm_norm = cv2.normalize(self._grid, None, 0, 255, cv2.NORM_MINMAX)
+        hm_color = cv2.applyColorMap(np.uint8(hm_norm), cv2.COLORMAP_JET)
+        size = (round(scale * self.cell * self._grid.shape[1]), round(scale * self.cell * self._grid.shape[0]))
+        hm_color = cv2.resize(hm_color, size, interpolation=cv2.INTER_LINEAR)[:height, :width]
+        return cv2.addWeighted(frame, 0.6, hm_color, 0.4, 0)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+
+def sse(event, payload):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+class LiveFeed:
+    """Server-Sent Events stream of focus and domain changes.
+
+    The first event is a full `snapshot`; after that each `delta` only
+    carries what changed since the previous event: domains whose record
+    moved on, the current domain, the focus state and a `reset` flag when the
+    history was cleared. Nothing is sent while nothing changes apart from a
+    comment line every `heartbeat` seconds to keep proxies from closing the
+    connection.
+
+    `focus_fn` returns a small JSON-able dict (e.g. focused / focus_pct); it is
+    polled every `interval` seconds, while domain changes wake the threaded
+    stream straight away (the asyncio one checks for them on the same poll).
+
+    `session` (a sessions.UserSession) is the one being streamed: it is
+    touched on every poll and counted as watched while the stream is open,
+    so it isn't evicted under it, and the stream ends if it is closed anyway.
+    """
+
+    def __init__(self, store, focus_fn=None, interval=0.25, heartbeat=15.0, session=None):
+        self.store = store
+        self.focus_fn = focus_fn or (lambda: None)
+        self.session = session
+        self.interval = interval
+        self.heartbeat = heartbeat
+
+    def _watching(self):
+        return self.session.watching() if self.session is not None else nullcontext()
+
+    def _open(self):
+        return self.session is None or not self.session.closed
+
+    def _snapshot(self):
+        # (first event, state the deltas are computed against)
+        store = self.store
+        version, domains = store.changes_since(-1)
+        state = {"version": version, "generation": store.generation, "focus": self.focus_fn(),
+                 "current": store.current_domain, "last_sent": time.time()}
+        return sse("snapshot", {"focus": state["focus"], "current_domain": state["current"],
+                                "domains": domains}), state
+
+    def _next(self, state):
+        # The delta or keepalive due after a wait, or None
+        store = self.store
+        if self.session is not None:
+            self.session.touch()
+        delta = {}
+        if store.generation != state["generation"]:
+            state["generation"] = store.generation
+            delta["reset"] = True
+            state["version"] = -1
+        state["version"], domains = store.changes_since(state["version"])
+        if domains:
+            delta["domains"] = domains
+        if store.current_domain != state["current"]:
+            state["current"] = delta["current_domain"] = store.current_domain
+        new_focus = self.focus_fn()
+        if new_focus != state["focus"]:
+            state["focus"] = delta["focus"] = new_focus
+
+        now = time.time()
+        if delta:
+            state["last_sent"] = now
+            return sse("delta", delta)
+        if now - state["last_sent"] >= self.heartbeat:
+            state["last_sent"] = now
+            return ": keepalive\n\n"
+        return None
+
+    def events(self):
+        """The stream for a threaded server: blocks between events"""
+        with self._watching():
+            first, state = self._snapshot()
+            yield first
+            while self._open():
+                self.store.wait_for_change(state["version"], timeout=self.interval)
+                chunk = self._next(state)
+                if chunk:
+                    yield chunk
+
+    async def aevents(self):
+        """The stream for an asyncio server: polls every `interval` on the loop
+        instead of holding a worker thread per client"""
+        with self._watching():
+            first, state = self._snapshot()
+            yield first
+            while self._open():
+                await asyncio.sleep(self.interval)
+                chunk = self._next(state)
+                if chunk:
+                    yield chunk
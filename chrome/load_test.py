@@ -0,0 +1,106 @@
+"""Load-test the multi-session server.
+
+    python load_test.py --sessions 300 --requests 40
+    python load_test.py --url http://127.0.0.1:5002 --sessions 100
+    python load_test.py --in-process --sessions 300
+
+Every simulated client tracks its own set of domains under its own session
+id, then reads /domains back and checks the counts match what it sent and
+that no other client's domains leaked in. Reports throughput, latency
+percentiles and errors; exits 1 on any error or isolation failure.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+def run_client(base_url, session_id, n_requests, n_domains, latencies, lock):
+    http = requests.Session()
+    domains = [f"site{k}-{session_id}.test" for k in range(n_domains)]
+    expected = {}
+    errors = 0
+    for _ in range(n_requests):
+        domain = random.choice(domains)
+        start = time.perf_counter()
+        try:
+            response = http.post(f"{base_url}/track", json={"url": f"https://{domain}/page", "session": session_id},
+                                 timeout=10)
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+        if ok:
+            expected[domain] = expected.get(domain, 0) + 1
+        else:
+            errors += 1
+
+    try:
+        got = http.get(f"{base_url}/domains", params={"session": session_id}, timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return errors + 1, [f"{session_id}: could not read /domains"]
+    problems = []
+    counts = {domain: record["count"] for domain, record in got.items()}
+    if counts != expected:
+        leaked = sorted(set(counts) - set(expected))
+        problems.append(f"{session_id}: expected {sum(expected.values())} visits over {len(expected)} domains, "
+                        f"got {sum(counts.values())} over {len(counts)}"
+                        + (f" (foreign: {leaked[:3]})" if leaked else ""))
+    return errors, problems
+
+def start_in_process():
+    """Serve chrome/server.py's app on a free port with a throwaway log directory"""
+    os.environ.setdefault("MIZA_SESSION_LOG", tempfile.mkdtemp(prefix="miza-load-"))
+    from werkzeug.serving import make_server
+    import server
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}", server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--sessions", type=int, default=200, help="simulated clients, one session id each")
+    parser.add_argument("--requests", type=int, default=50, help="/track calls per client")
+    parser.add_argument("--domains", type=int, default=10, help="distinct domains per client")
+    parser.add_argument("--concurrency", type=int, default=64, help="clients running at once")
+    parser.add_argument("--in-process", action="store_true", help="start chrome/server.py here instead of --url")
+    args = parser.parse_args()
+
+    base_url, server = start_in_process() if args.in_process else (args.url, None)
+    run_id = uuid.uuid4().hex[:8]
+    latencies, lock = [], threading.Lock()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(run_client, base_url, f"load-{run_id}-{i}", args.requests, args.domains,
+                               latencies, lock)
+                   for i in range(args.sessions)]
+        results = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+
+    errors = sum(e for e, _ in results)
+    problems = [p for _, ps in results for p in ps]
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    print(f"{args.sessions} sessions x {args.requests} /track calls against {base_url}")
+    print(f"  {len(latencies) / wall:.0f} req/s over {wall:.1f}s")
+    print(f"  latency p50 {np.percentile(ms, 50):.1f} ms   p99 {np.percentile(ms, 99):.1f} ms   "
+          f"max {ms.max():.1f} ms")
+    print(f"  errors: {errors}   isolation failures: {len(problems)}")
+    if server is not None:
+        print(f"  sessions open: {len(server.sessions)}   evicted: {server.sessions.evicted}")
+    for line in problems[:10]:
+        print(f"    {line}")
+    sys.exit(1 if errors or problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Offline first-tier domain classifier: hashed character n-grams and a linear model.
+
+A batch is packed into one stream of code points, and every n-gram of
+every domain is hashed into 2**BITS weights with vectorized NumPy, so a batch of
+thousands costs a handful of array passes rather than a Python loop per
+domain. The score is a logistic regression over those hashed counts (scaled
+by 1/sqrt(count) so long names don't get extreme scores), trained with
+NumPy as well; the weights ship in local_classifier.npz. A few rules
+(academic and government suffixes, gambling and game tokens) override the
+model with full confidence.
+
+The analyzer uses it ahead of Gemini: labels at or above its confidence
+threshold are taken as is, and only the rest cost a model call. NumPy is
+imported on first use, so importing the analyzer stays cheap.
+"""
+import os
+
+from classification_cache import normalize_domain
+
+LABELS = ("productive", "unproductive")
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_classifier.npz")
+DEFAULT_LABELED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "labeled_domains.tsv")
+
+# Labels at least this confident skip Gemini; held out, about 98% of them
+# agree with the labeled list (eval_classifier.py)
+CONFIDENCE = float(os.environ.get("MIZA_LOCAL_CONFIDENCE", 0.95))
+NGRAMS = (2, 3, 4)
+BITS = 14
+_MIX = 2654435761  # Knuth's multiplicative hash constant
+
+# Checked in order before the model; a match is certain
+SUFFIX_RULES = (
+    ((".edu", ".ac.uk", ".edu.au", ".ac.jp", ".ac.in", ".gov", ".gov.uk", ".mil", ".int"), "productive"),
+    ((".casino", ".bet", ".poker", ".game", ".games", ".xxx", ".porn", ".sex"), "unproductive"),
+)
+TOKEN_RULES = (
+    ({"docs", "learn", "wiki", "scholar", "library", "university", "academy", "course", "courses",
+      "lecture", "lectures", "tutorial", "tutorials", "homework", "edu", "research"}, "productive"),
+    ({"casino", "poker", "slots", "betting", "porn", "xxx", "games", "game", "dating", "memes"}, "unproductive"),
+)
+_RULE_LABELS = [label for _, label in SUFFIX_RULES + TOKEN_RULES]
+
+def _ranks(rules, first):
+    # suffix or token -> rank of the first rule listing it
+    ranks = {}
+    for rank, (texts, _) in enumerate(rules, first):
+        for text in texts:
+            ranks.setdefault(text, rank)
+    return ranks
+
+_SUFFIX_RANKS = _ranks(SUFFIX_RULES, 0)
+_TOKEN_RANKS = _ranks(TOKEN_RULES, len(SUFFIX_RULES))
+_SUFFIX_LABELS = max(suffix.count(".") for suffix in _SUFFIX_RANKS)  # labels in the longest suffix
+_SUFFIX_ENDS = {suffix.rsplit(".", 1)[1] for suffix in _SUFFIX_RANKS}
+
+def _rule_rank(domain):
+    # Rank of the earliest rule that matches, len(_RULE_LABELS) if none does
+    rank = len(_RULE_LABELS)
+    labels = domain.split(".")
+    for k in range(1, min(_SUFFIX_LABELS, len(labels) - 1) + 1):
+        rank = min(rank, _SUFFIX_RANKS.get("." + ".".join(labels[-k:]), rank))
+    for token in domain.replace("-", ".").replace("_", ".").split("."):
+        rank = min(rank, _TOKEN_RANKS.get(token, rank))
+    return rank
+
+def rule_labels(domains):
+    """{index: label} for the domains a rule decides; the earliest rule wins.
+
+    Suffixes are looked up by each domain's last labels and tokens by the
+    runs between separators (. - _). Rules match few domains, so one set
+    check on the tokens and the last one passes over most of them.
+    """
+    text = "\n".join(domains).lower()
+    tokens = text.replace("-", ".").replace("_", ".").split("\n")
+    labels = {}
+    for i, domain in enumerate(text.split("\n")):
+        parts = tokens[i].split(".")
+        if _TOKEN_RANKS.keys().isdisjoint(parts) and (len(parts) < 2 or parts[-1] not in _SUFFIX_ENDS):
+            continue
+        rank = _rule_rank(domain)
+        if rank < len(_RULE_LABELS):
+            labels[i] = _RULE_LABELS[rank]
+    return labels
+
+def rule_label(domain):
+    """Label forced by a rule, or None"""
+    return rule_labels([normalize_domain(domain)]).get(0)
+
+def _pack(domains):
+    """(chars, owner): the batch as one stream of "^domain$" lines.
+
+    chars holds the code points (bytes when the batch is ASCII, which is
+    nearly always) and owner the domain index of every position, the
+    newline counting towards the domain after it. Domains are expected
+    normalized already (domains.domain_of), so only case is folded here.
+    """
+    import numpy as np
+    text = "^" + "$\n^".join(domains).lower() + "$"
+    if text.isascii():
+        chars = np.frombuffer(text.encode("ascii"), np.uint8)
+    else:
+        chars = np.frombuffer(text.encode("utf-32-le"), np.uint32)
+    owner = np.cumsum(chars == 10, dtype=np.intp)
+    return chars, owner
+
+def hashed_ngrams(domains, ngrams=NGRAMS, bits=BITS):
+    """(buckets, owner, counts) for the n-gram windows of a batch.
+
+    buckets has one array per n with the weight index of the window
+    starting at each position of the packed stream; windows that span a
+    newline point at index 1 << bits, a weight that stays zero, so scoring
+    is a gather and a bincount by owner. counts is the n-grams per domain.
+    """
+    import numpy as np
+    chars, owner = _pack(domains)
+    lengths = np.bincount(owner, minlength=len(domains))
+    lengths[1:] -= 1  # the newline in front
+    padding = 1 << bits
+    newline = chars == 10
+    codes = chars.astype(np.uint32)
+    buckets = []
+    h, crosses = codes, newline
+    for n in range(1, max(ngrams) + 1):
+        if n > 1:
+            # Rolling: the n-gram hash extends the (n-1)-gram hash by one character
+            h = h[:-1] * np.uint32(257) + codes[n - 1:]
+            crosses = crosses[:-1] | newline[n - 1:]
+        if n in ngrams:
+            bucket = ((h + np.uint32(n)) * np.uint32(_MIX)) >> np.uint32(32 - bits)
+            bucket[crosses] = padding
+            buckets.append(bucket)
+    counts = sum(np.maximum(lengths - n + 1, 0) for n in ngrams)
+    return buckets, owner, counts
+
+class LocalClassifier:
+    """Logistic regression over hashed n-gram counts; p is P(productive)"""
+
+    def __init__(self, weights, bias=0.0, ngrams=NGRAMS):
+        import numpy as np
+        # One extra, always-zero weight for padding windows
+        self.weights = np.append(np.asarray(weights, dtype=np.float32), np.float32(0))
+        self.bias = float(bias)
+        self.ngrams = tuple(int(n) for n in ngrams)
+        self.bits = int(np.log2(len(weights)))
+
+    @classmethod
+    def load(cls, path=DEFAULT_WEIGHTS_PATH):
+        import numpy as np
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), data["ngrams"])
+
+    def save(self, path=DEFAULT_WEIGHTS_PATH):
+        import numpy as np
+        # float16 keeps the bundled file small; scores move by well under 1e-3
+        np.savez_compressed(path, weights=self.weights[:-1].astype(np.float16), bias=self.bias,
+                            ngrams=np.array(self.ngrams))
+
+    def predict_proba(self, domains):
+        import numpy as np
+        if not len(domains):
+            return np.zeros(0)
+        buckets, owner, counts = hashed_ngrams(domains, self.ngrams, self.bits)
+        acc = np.zeros(len(owner), np.float32)
+        for bucket in buckets:
+            acc[:len(bucket)] += self.weights[bucket]
+        scores = np.bincount(owner, weights=acc, minlength=len(domains)) / np.sqrt(np.maximum(counts, 1))
+        return 1.0 / (1.0 + np.exp(-(scores + self.bias)))
+
+    def classify(self, domains):
+        """{domain: (label, confidence)}, with rules taking precedence over the model"""
+        import numpy as np
+        domains = list(domains)
+        if not domains:
+            return {}
+        p = self.predict_proba(domains)
+        confidence = np.maximum(p, 1.0 - p).tolist()
+        labels = np.where(p >= 0.5, "productive", "unproductive").tolist()
+        for i, label in rule_labels(domains).items():
+            labels[i], confidence[i] = label, 1.0
+        return dict(zip(domains, zip(labels, confidence)))
+
+    @classmethod
+    def train(cls, domains, labels, ngrams=NGRAMS, bits=BITS, epochs=300, rate=4.0, l2=1e-4):
+        """Fit on (domain, label) pairs with full-batch gradient descent"""
+        import numpy as np
+        y = np.array([label == "productive" for label in labels], dtype=np.float64)
+        buckets, owner, counts = hashed_ngrams(domains, ngrams, bits)
+        scale = 1.0 / np.sqrt(np.maximum(counts, 1))
+        weights = np.zeros((1 << bits) + 1)
+        bias = 0.0
+        for _ in range(epochs):
+            acc = np.zeros(len(owner))
+            for bucket in buckets:
+                acc[:len(bucket)] += weights[bucket]
+            scores = np.bincount(owner, weights=acc, minlength=len(y)) * scale + bias
+            error = 1.0 / (1.0 + np.exp(-scores)) - y
+            # Gradient of the mean log loss, scattered back onto the buckets
+            per_position = (error * scale)[owner]
+            grad = sum(np.bincount(bucket, weights=per_position[:len(bucket)], minlength=len(weights))
+                       for bucket in buckets) / len(y)
+            grad[-1] = 0.0  # the padding weight stays zero
+            weights -= rate * (grad + l2 * weights)
+            bias -= rate * error.mean()
+        return cls(weights[:-1], bias, ngrams)
+
+def load_labeled(path=DEFAULT_LABELED_PATH):
+    """(domains, labels) from a "domain<TAB>label" file; # starts a comment"""
+    domains, labels = [], []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            domain, label = line.split()
+            if label not in LABELS:
+                raise ValueError(f"{path}: unknown label {label!r} for {domain}")
+            domains.append(domain)
+            labels.append(label)
+    return domains, labels
+
+_default = None
+
+def default_classifier():
+    """The bundled model, loaded on first use; None if the weights file is missing"""
+    global _default
+    if _default is None:
+        try:
+            _default = LocalClassifier.load()
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Local classifier unavailable ({e}); every uncached domain goes to Gemini")
+            _default = False
+    return _default or None
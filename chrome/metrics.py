@@ -0,0 +1,234 @@
+"""Counters, fixed-bucket histograms and a sampling profiler for the hot paths.
+
+Metrics are created once at import time by the module that owns them
+(detection, heatmap, productivity_analyzer, the servers) and rendered in
+the Prometheus text format by render(), which both servers expose at
+/metrics. Recording is a bisect and a few integer adds under a per-metric
+lock, cheap enough to leave on around every cascade call and request.
+
+The profiler is off unless MIZA_PROFILE=1; then /debug/profile?seconds=N
+samples every thread's stack for N seconds and returns folded stacks
+(one "frame;frame;frame count" line each) for flamegraph.pl or speedscope.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounts
+
+# Upper bounds in seconds; everything above the last one lands in +Inf
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+PROFILER_ENABLED = os.environ.get("MIZA_PROFILE") == "1"
+PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value}"
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+class Histogram:
+    """Observations counted into fixed buckets, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        """Context manager that observes the wall time of its block"""
+        return _Timer(self, label_values)
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_label_text(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labels, label_values)} {counts[-1]:.6f}"
+            yield f"{self.name}_count{_label_text(self.labels, label_values)} {cumulative}"
+
+def _register(cls, name, *args, **kwargs):
+    # Idempotent, so a module imported under two names shares its metrics
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args, **kwargs)
+        return metric
+
+def counter(name, help, labels=()):
+    return _register(Counter, name, help, labels=labels)
+
+def histogram(name, help, buckets=LATENCY_BUCKETS, labels=()):
+    return _register(Histogram, name, help, buckets=buckets, labels=labels)
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_seconds = histogram("miza_http_request_seconds", "Time spent handling HTTP requests",
+                         labels=("route", "method", "status"))
+# Shared by the capture loops. loop="tracker" (eyes.EyeTracker) includes
+# detection; loop="combined" is the drawing/heatmap/bookkeeping work after it,
+# since detection there may run on pipeline threads (see miza_detect_seconds).
+frame_seconds = histogram("miza_frame_seconds", "Per-frame processing time in a tracking loop, capture excluded",
+                          buckets=FAST_BUCKETS, labels=("loop",))
+
+def instrument_flask(app):
+    """Time every request on `app` and serve /metrics (and /debug/profile).
+
+    Call right after creating the app so the timer's before_request hook
+    runs ahead of any that may answer early.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.get("metrics_start")
+        if start is not None:
+            # The rule, not the path, so query strings and ids don't add series
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_seconds.observe(time.perf_counter() - start, route, request.method, response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    @app.route('/debug/profile', methods=['GET'])
+    def debug_profile():
+        if not PROFILER_ENABLED:
+            return {"status": "error", "message": "Profiler is off; start the server with MIZA_PROFILE=1"}, 404
+        seconds = request.args.get('seconds', default=5.0, type=float)
+        return Response(profile(seconds), content_type="text/plain; charset=utf-8")
+
+class SamplingProfiler:
+    """Samples every other thread's Python stack at a fixed interval.
+
+    Nothing is traced, so the profiled code pays nothing per call; the cost
+    is one sys._current_frames() walk per interval on the sampler's thread.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = _StackCounts()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+def profile(seconds):
+    """Sample all threads for `seconds` (capped) and return folded stacks"""
+    profiler = SamplingProfiler().start()
+    time.sleep(max(0.0, min(seconds, MAX_PROFILE_SECONDS)))
+    return profiler.stop().folded()
@@ -0,0 +1,150 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from detection import DetectorBackend
+
+# On by default; MIZA_MOTION_GATE=0 detects every frame at a fixed rate again
+MOTION_GATE = os.environ.get("MIZA_MOTION_GATE", "1") != "0"
+MIN_FPS = float(os.environ.get("MIZA_MIN_FPS", 3))
+
+gate_frames = metrics.counter("miza_motion_gate_frames_total", "Frames through the motion gate, by outcome",
+                              labels=("outcome",))
+
+class MotionGate:
+    """Says whether a frame differs enough from the last detected one to be worth detecting.
+
+    Frames are shrunk to a `size` thumbnail in grayscale (a fraction of a
+    millisecond with INTER_AREA) and compared by mean absolute difference against the
+    thumbnail of the frame the detector last ran on, so slow drift still
+    adds up to a change. After `max_reuse` reused frames the next one is
+    detected anyway, which bounds how stale a result can get.
+    """
+
+    def __init__(self, size=(32, 24), threshold=3.0, max_reuse=30):
+        self.size = size
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self._reference = None
+        self._reused = 0
+        self.last_change = 0.0
+        self.moved = True  # last frame really changed, as opposed to a forced refresh
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def changed(self, frame):
+        """True if `frame` needs a fresh detection (and makes it the new reference)"""
+        thumb = self._thumbnail(frame)
+        self.moved = True
+        if self._reference is not None:
+            self.last_change = float(np.abs(thumb - self._reference).mean())
+            self.moved = self.last_change >= self.threshold
+            if not self.moved and self._reused < self.max_reuse:
+                self._reused += 1
+                return False
+        self._reference = thumb
+        self._reused = 0
+        return True
+
+    def reset(self):
+        self._reference = None
+        self._reused = 0
+        self.moved = True
+
+class GatedDetector(DetectorBackend):
+    """Wraps a detector backend and reuses its last result while the picture is still.
+
+    `moved` tells the caller whether the last frame (or any frame of the
+    last batch) differed from the previous detection, which the adaptive
+    rate uses; the gate's periodic forced refresh doesn't count.
+    """
+
+    def __init__(self, detector, gate=None):
+        self.detector = detector
+        self.gate = gate or MotionGate()
+        self.name = detector.name
+        self.batch_size = detector.batch_size
+        self.moved = True
+        self.detected = 0
+        self.reused = 0
+        self._last = []
+
+    def detect_batch(self, frames):
+        results = [None] * len(frames)
+        fresh, moved = [], False
+        for i, frame in enumerate(frames):
+            if self.gate.changed(frame):
+                fresh.append(i)
+            moved |= self.gate.moved
+        if fresh:
+            for i, result in zip(fresh, self.detector.detect_batch([frames[i] for i in fresh])):
+                results[i] = result
+        last = self._last
+        for i in range(len(frames)):
+            if results[i] is None:
+                results[i] = last
+            last = results[i]
+        self._last = last
+        self.moved = moved
+        self.detected += len(fresh)
+        self.reused += len(frames) - len(fresh)
+        gate_frames.inc("detected", amount=len(fresh))
+        gate_frames.inc("reused", amount=len(frames) - len(fresh))
+        return results
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def is_focused(self, results):
+        return self.detector.is_focused(results)
+
+    def reset(self):
+        self.detector.reset()
+        self.gate.reset()
+        self._last = []
+        self.moved = True
+
+class AdaptiveRate:
+    """Sampling rate that relaxes while nothing happens and snaps back on activity.
+
+    observe() is called once per processed frame with whether there was
+    motion or a focus change. Activity restores `max_fps` at once; after
+    `calm_after` seconds without any, the rate drops by `backoff` per
+    sample down to `min_fps`.
+    """
+
+    def __init__(self, max_fps=15.0, min_fps=MIN_FPS, calm_after=2.0, backoff=0.85):
+        self.max_fps = max_fps
+        self.min_fps = min(min_fps, max_fps)
+        self.calm_after = calm_after
+        self.backoff = backoff
+        self.fps = max_fps
+        self._active_at = None
+
+    def observe(self, active, now=None):
+        now = now if now is not None else time.time()
+        if active or self._active_at is None:
+            self._active_at = now
+            self.fps = self.max_fps
+        elif now - self._active_at >= self.calm_after:
+            self.fps = max(self.min_fps, self.fps * self.backoff)
+        return self.interval
+
+    @property
+    def interval(self):
+        return 1.0 / self.fps if self.fps > 0 else 0.0
+
+    def reset(self):
+        self.fps = self.max_fps
+        self._active_at = None
+
+def gated(detector):
+    """`detector` behind a MotionGate, unless MIZA_MOTION_GATE=0"""
+    return GatedDetector(detector) if MOTION_GATE else detector
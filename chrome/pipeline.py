@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+
+class LatestFrameQueue:
+    """Bounded queue where a full put drops the oldest item, so readers always get fresh frames"""
+
+    def __init__(self, maxsize=2):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None once closed (or on timeout)"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed and not self._items
+
+def inline_detections(cap, detector):
+    """Capture and detect on the calling thread; yields (captured_at, frame, results)"""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        captured_at = time.time()
+        yield captured_at, frame, detector.detect(frame)
+
+class DetectionPipeline:
+    """Capture thread -> latest-frame-wins queue -> detector workers -> ordered results.
+
+    The capture thread never waits on detection, so a slow frame makes the
+    queue drop stale frames instead of letting the camera buffer fill up.
+    Each worker owns its own detector (cascade ROI state is per instance),
+    and results() hands frames back in capture order, skipping any that
+    finish after a newer frame has already been reported.
+    """
+
+    def __init__(self, cap, detector_factory, workers=2, queue_size=2):
+        self.cap = cap
+        self.detector_factory = detector_factory
+        self.workers = workers
+        self.frames = LatestFrameQueue(queue_size)
+        self.done = LatestFrameQueue(queue_size + workers)
+        self._stop = threading.Event()
+        self._threads = []
+        self._running_workers = workers
+        self._workers_lock = threading.Lock()
+        self._last_seq = -1
+        self.captured = 0
+        self.skipped = 0
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture, daemon=True)]
+        self._threads += [threading.Thread(target=self._detect, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _capture(self):
+        seq = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            self.frames.put((seq, time.time(), frame))
+            seq += 1
+            self.captured = seq
+        self.frames.close()
+
+    def _detect(self):
+        detector = self.detector_factory()
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            seq, captured_at, frame = item
+            self.done.put((seq, captured_at, frame, detector.detect(frame)))
+        # Last worker out tells results() there is nothing more coming
+        with self._workers_lock:
+            self._running_workers -= 1
+            if self._running_workers == 0:
+                self.done.close()
+
+    def results(self):
+        """Yield (captured_at, frame, results) in capture order until the source ends"""
+        while True:
+            item = self.done.get(timeout=0.5)
+            if item is None:
+                if self.done.closed or self._stop.is_set():
+                    return
+                continue
+            seq, captured_at, frame, results = item
+            if seq < self._last_seq:
+                self.skipped += 1
+                continue
+            self._last_seq = seq
+            yield captured_at, frame, results
+
+    def stop(self):
+        self._stop.set()
+        self.frames.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
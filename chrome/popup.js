@@ -1,21 +1,28 @@
-fetch("http://127.0.0.1:5001/domains")
-  .then(res => res.json())
-  .then(data => {
-    document.getElementById("status").textContent = "Running";
-    document.getElementById("status").className = "connected";
-    // Use the most recently visited domain (last_seen)
-    const domains = Object.keys(data);
-    if (domains.length > 0) {
-      const latestDomain = domains.reduce((a, b) =>
-        data[a].last_seen > data[b].last_seen ? a : b
-      );
-      document.getElementById("domain").textContent = latestDomain || "unknown";
-    } else {
-      document.getElementById("domain").textContent = "none tracked yet";
-    }
-  })
-  .catch(() => {
-    document.getElementById("status").textContent = "Not Connected";
-    document.getElementById("status").className = "disconnected";
-    document.getElementById("domain").textContent = "N/A";
-  });
\ No newline at end of file
+// Live status from the server: a snapshot on connect, then only changes
+const source = new EventSource("http://127.0.0.1:5001/stream");
+
+function showDomain(domain) {
+  document.getElementById("domain").textContent =
+    domain && domain !== "unknown" ? domain : "none tracked yet";
+}
+
+source.addEventListener("snapshot", event => {
+  const data = JSON.parse(event.data);
+  document.getElementById("status").textContent = "Running";
+  document.getElementById("status").className = "connected";
+  showDomain(data.current_domain);
+});
+
+source.addEventListener("delta", event => {
+  const data = JSON.parse(event.data);
+  if (data.current_domain !== undefined) {
+    showDomain(data.current_domain);
+  }
+});
+
+source.onerror = () => {
+  source.close();
+  document.getElementById("status").textContent = "Not Connected";
+  document.getElementById("status").className = "disconnected";
+  document.getElementById("domain").textContent = "N/A";
+};
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""Downscaled MJPEG preview of the tracker, encoded once for all viewers.
+
+The tracking loop hands every frame to PreviewStream.publish(), which
+returns straight away unless someone is watching and a preview frame is
+due: with no viewer connected nothing is resized, drawn or encoded. A due
+frame is shrunk to PREVIEW_WIDTH, overlaid with the attention heatmap, eye
+points and focus percentage, JPEG-encoded once, and the same bytes go to
+every client of /preview (multipart MJPEG) and /preview.jpg.
+"""
+import os
+import threading
+import time
+
+import metrics
+
+PREVIEW_FPS = float(os.environ.get("MIZA_PREVIEW_FPS", 5))
+PREVIEW_WIDTH = int(os.environ.get("MIZA_PREVIEW_WIDTH", 320))
+JPEG_QUALITY = 70
+BOUNDARY = "frame"
+MIMETYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+# How long a viewer waits for a frame before checking whether to give up
+VIEWER_POLL = 1.0
+
+preview_seconds = metrics.histogram("miza_preview_encode_seconds", "Time to downscale, annotate and encode a preview frame",
+                                    buckets=metrics.FAST_BUCKETS)
+preview_viewers = metrics.counter("miza_preview_viewers_total", "Preview connections, by endpoint",
+                                  labels=("endpoint",))
+
+class PreviewStream:
+    """Latest encoded preview frame plus the viewers waiting for the next one"""
+
+    def __init__(self, max_fps=PREVIEW_FPS, width=PREVIEW_WIDTH, quality=JPEG_QUALITY):
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.width = width
+        self.quality = quality
+        self.viewers = 0
+        self.encoded = 0
+        self._jpeg = None
+        self._seq = 0
+        self._last = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def publish(self, frame, eyes=(), heatmap=None, focus_pct=None, now=None):
+        """Encode `frame` for the viewers if any are connected and one is due; True if it was"""
+        if not self.viewers:
+            return False
+        now = now if now is not None else time.time()
+        if now - self._last < self.interval:
+            return False
+        self._last = now
+        with preview_seconds.time():
+            jpeg = self._encode(frame, eyes, heatmap, focus_pct)
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self.encoded += 1
+            self._cond.notify_all()
+        return True
+
+    def _encode(self, frame, eyes, heatmap, focus_pct):
+        import cv2
+        scale = min(1.0, self.width / frame.shape[1])
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if heatmap is not None:
+            small = heatmap.overlay(small)
+        for x, y in eyes:
+            cv2.circle(small, (int(x * scale), int(y * scale)), 3, (0, 0, 255), -1)
+        if focus_pct is not None:
+            cv2.putText(small, f"Focus: {focus_pct:.1f}%", (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        ok, buffer = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buffer.tobytes()
+
+    def _next(self, seq, timeout):
+        # Newest frame after `seq` as (seq, jpeg); (seq, None) on timeout, None once closed
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq or self._closed, timeout)
+            if self._closed:
+                return None
+            if self._seq == seq:
+                return seq, None
+            return self._seq, self._jpeg
+
+    def frames(self):
+        """Yield each new JPEG while the caller is connected; counts as a viewer meanwhile"""
+        with self._cond:
+            self.viewers += 1
+            seq = self._seq
+        try:
+            while True:
+                item = self._next(seq, VIEWER_POLL)
+                if item is None:
+                    return
+                seq, jpeg = item
+                if jpeg is not None:
+                    yield jpeg
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+    def mjpeg(self):
+        """frames() as multipart/x-mixed-replace chunks"""
+        for jpeg in self.frames():
+            yield (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                   + jpeg + b"\r\n")
+
+    def snapshot(self, timeout=2.0):
+        """A JPEG at most one frame interval old, or None if none arrives within `timeout`"""
+        deadline = time.time() + timeout
+        with self._cond:
+            if self._jpeg is not None and time.time() - self._last <= self.interval:
+                return self._jpeg
+            self.viewers += 1
+            seq = self._seq
+        try:
+            while time.time() < deadline:
+                item = self._next(seq, deadline - time.time())
+                if item is None:
+                    return None
+                if item[1] is not None:
+                    return item[1]
+        finally:
+            with self._cond:
+                self.viewers -= 1
+        return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
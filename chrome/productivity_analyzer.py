@@ -1,15 +1,49 @@
+import json
 import os
-import google.generativeai as genai
-import matplotlib
-matplotlib.use('Agg')  # Use a backend that doesn't require a display
-import matplotlib.pyplot as plt
-import requests
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from classification_cache import ClassificationCache, normalize_domain
+import local_classifier
+import metrics
 
 load_dotenv()
 
+MODEL_NAME = "gemini-2.0-flash-lite"
+SERVER_URL = "http://localhost:5001"
+LABELS = ("productive", "unproductive")
+DEFAULT_LABEL = "productive"
+
+# Classification limits: misses are split into batches that run concurrently,
+# each model call gets CALL_TIMEOUT seconds and the whole analysis DEADLINE.
+BATCH_SIZE = 25
+MAX_WORKERS = 4
+CALL_TIMEOUT = 8.0
+DEADLINE = 15.0
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# Label with the bundled n-gram model first and ask Gemini only about the
+# domains it isn't confident about (local_classifier.CONFIDENCE)
+USE_LOCAL = os.environ.get("MIZA_LOCAL_CLASSIFIER", "1") != "0"
+
 # Track if the analyzer is properly configured
 _analyzer_enabled = False
+_model = None
+_setup_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="classify")
+
+# Labels survive restarts, so repeat domains never cost a model call
+_cache = ClassificationCache()
+
+# Gemini latency and error rate come from the per-call outcome label
+model_call_seconds = metrics.histogram("miza_model_call_seconds", "Gemini request latency by outcome",
+                                       labels=("outcome",))
+analyze_seconds = metrics.histogram("miza_analyze_seconds", "Time to label a set of domains, cache included")
+labels_total = metrics.counter("miza_domain_labels_total", "Domains labelled, by where the label came from",
+                               labels=("source",))
 
 def setup_analyzer():
     """Initialize the productivity analyzer with the API key"""
@@ -30,6 +64,8 @@ def setup_analyzer():
 
     # Configure Gemini with the API key
     try:
+        # Imported here: the SDK alone takes most of a second to load
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
         _analyzer_enabled = True
         print("Productivity analyzer successfully configured")
@@ -39,75 +75,233 @@ def setup_analyzer():
         _analyzer_enabled = False
         return False
 
-def analyze_productivity(domain):
-    """Use Gemini API to determine if a domain is productive for studying"""
-    if not _analyzer_enabled:
-        if not setup_analyzer():
-            return "productive"  # fallback if setup fails
+def ensure_analyzer():
+    """Configure Gemini unless it already is; callers racing the background setup wait for it"""
+    with _setup_lock:
+        return _analyzer_enabled or setup_analyzer()
+
+def setup_analyzer_in_background():
+    """Run the Gemini setup on a daemon thread so importers don't wait for the SDK"""
+    thread = threading.Thread(target=ensure_analyzer, daemon=True, name="analyzer-setup")
+    thread.start()
+    return thread
+
+def _get_model():
+    """Build the Gemini model once and reuse it for every request"""
+    global _model
+    if _model is None:
+        import google.generativeai as genai
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
 
+def _parse_batch_response(text, domains):
+    """Pull a {domain: label} mapping out of the model's batched reply"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        raw = json.loads(text)
+    except ValueError:
+        # Fall back to "domain: label" lines if the model ignored the format
+        raw = {}
+        for line in text.splitlines():
+            if ":" in line:
+                domain, _, label = line.rpartition(":")
+                raw[domain.strip().strip('"')] = label.strip().strip('",')
+
+    if not isinstance(raw, dict):
+        return {}
+
+    wanted = {}
+    for domain in domains:
+        wanted.setdefault(normalize_domain(domain), []).append(domain)
+    labels = {}
+    for domain, label in raw.items():
+        label = str(label).strip().lower()
+        if label in LABELS:
+            for original in wanted.get(normalize_domain(str(domain)), ()):
+                labels[original] = label
+    return labels
+
+def classify_batch(domains, model=None, timeout=None):
+    """Classify several domains with a single Gemini request"""
     prompt = f"""You are an assistant helping students stay on task.
-Given a single website domain, decide whether it is productive or unproductive for a typical study session.
-Make a clear binary choice and respond with exactly one of these two words (no punctuation, no extra text):
+For each website domain below, decide whether it is productive or unproductive for a typical study session.
+Make a clear binary choice for every domain and respond with only a JSON object mapping each domain to
+exactly one of these two words (no extra text):
 
 productive
 unproductive
 
-Website: {domain}
+Websites:
+{chr(10).join(domains)}
 """
+    model = model or _get_model()
+    request_options = {"timeout": timeout} if timeout else None
+    start = time.perf_counter()
+    try:
+        response = model.generate_content(prompt, request_options=request_options)
+    except Exception:
+        model_call_seconds.observe(time.perf_counter() - start, "error")
+        raise
+    model_call_seconds.observe(time.perf_counter() - start, "ok")
+    return _parse_batch_response(response.text, domains)
+
+def _classify_with_retry(domains, model, deadline):
+    """Run one batch with a per-call timeout, retrying with backoff until the deadline"""
+    delay = RETRY_BACKOFF
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            return classify_batch(domains, model=model, timeout=min(CALL_TIMEOUT, remaining))
+        except Exception as e:
+            print(f"Attempt {attempt + 1} failed for {len(domains)} domains: {e}")
+        if attempt < MAX_RETRIES:
+            pause = delay * (1 + random.random())  # jitter so retries don't line up
+            time.sleep(max(0, min(pause, deadline - time.monotonic())))
+            delay *= 2
+    return {}
 
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
+def _local_guesses(domains):
+    """{domain: (label, confidence)} from the local classifier, or {} if it is off or missing"""
+    classifier = local_classifier.default_classifier() if USE_LOCAL and domains else None
+    return classifier.classify(domains) if classifier else {}
 
-    try:
-        response = model.generate_content(prompt)
-        result = response.text.strip().lower()
-        if result in ("productive", "unproductive"):
-            return result
+def classify_domains(domains, model=None, deadline=DEADLINE):
+    """Label every domain within `deadline` seconds.
+
+    Returns (labels, fallbacks) where fallbacks lists the domains that got a
+    best guess (the local classifier's, else the default label) because the
+    cache missed, the local classifier wasn't sure and the model didn't
+    answer in time.
+    """
+    start = time.perf_counter()
+    labels = {}
+    misses = []
+    for domain in domains:
+        label = _cache.get(domain)
+        if label is None:
+            misses.append(domain)
         else:
-            print(f"Unexpected response for {domain!r}: {result!r}. Defaulting to productive.")
-            return "productive"
-    except Exception as e:
-        print(f"Error analyzing productivity for {domain!r}: {e}. Defaulting to productive.")
-        return "productive"
+            labels[domain] = label
+    cached = len(domains) - len(misses)
+
+    guesses = _local_guesses(misses)
+    unsure = []
+    for domain in misses:
+        label, confidence = guesses.get(domain, (None, 0.0))
+        if confidence >= local_classifier.CONFIDENCE:
+            labels[domain] = label
+            labels_total.inc("rule" if confidence >= 1.0 else "local")
+        else:
+            unsure.append(domain)
+    misses = unsure
+
+    if misses and (model is not None or ensure_analyzer()):
+        end = time.monotonic() + deadline
+        batches = [misses[i:i + BATCH_SIZE] for i in range(0, len(misses), BATCH_SIZE)]
+        futures = [_executor.submit(_classify_with_retry, batch, model, end) for batch in batches]
+        done, not_done = wait(futures, timeout=max(0, end - time.monotonic()))
+        if not_done:
+            print(f"Classification deadline hit with {len(not_done)} batches outstanding.")
+            # Batches still queued behind the pool never start; running ones
+            # stop at their own deadline check
+            for future in not_done:
+                future.cancel()
+        for future in done:
+            fresh = future.result()
+            _cache.put_many(fresh)
+            labels.update(fresh)
+        _cache.save()
+
+    fallbacks = [domain for domain in misses if domain not in labels]
+    for domain in fallbacks:
+        label = guesses[domain][0] if domain in guesses else DEFAULT_LABEL
+        print(f"No label for {domain!r}. Defaulting to {label}.")
+        labels[domain] = label
+    labels_total.inc("cache", amount=cached)
+    labels_total.inc("model", amount=len(misses) - len(fallbacks))
+    labels_total.inc("fallback", amount=len(fallbacks))
+    analyze_seconds.observe(time.perf_counter() - start)
+    return labels, fallbacks
+
+def analyze_domains(domains, model=None):
+    """Label every domain, asking Gemini only about the ones the cache doesn't know"""
+    return classify_domains(domains, model=model)[0]
+
+def cached_label(domain):
+    """The cached or confidently local label for `domain`, or None; never calls the model"""
+    label = _cache.get(domain)
+    if label is None:
+        label, confidence = _local_guesses([domain]).get(domain, (None, 0.0))
+        if confidence < local_classifier.CONFIDENCE:
+            label = None
+    return label
+
+def analyze_productivity(domain):
+    """Use Gemini API to determine if a domain is productive for studying"""
+    return analyze_domains([domain])[domain]
 
 def list_available_models():
     """Optional: List available models for the Gemini API"""
     try:
+        import google.generativeai as genai
         models = genai.list_models()
         print("Available models:", models)
     except Exception as e:
         print("Error listing available models:", e)
 
-# Initialize the analyzer on import
-setup_analyzer()
+# Initialize the analyzer on import, without holding up the importer
+setup_analyzer_in_background()
 
-def main():
+def fetch_history(server_url=SERVER_URL):
+    """Snapshot and reset the server's domain history over HTTP.
+
+    Only needed when the analyzer runs as its own process; the server calls
+    analyze_history() directly with an in-process snapshot. DELETE /domains
+    answers with the records it cleared, so one request both takes and
+    resets them.
+    """
+    import requests
     try:
-        response = requests.get("http://localhost:5001/domains")
-        del_response = requests.delete("http://localhost:5001/domains")
+        response = requests.delete(f"{server_url}/domains")
         response.raise_for_status()
-        domain_history = response.json()
-        sample_domains = list(domain_history.keys())
-        if not sample_domains:
-            print("No domains tracked yet.")
+        return response.json()["domains"]
     except Exception as e:
         print(f"Error fetching domain history: {e}")
-        sample_domains = []
+        return {}
+
+def analyze_history(domain_history):
+    """Classify every domain in a history snapshot and tally the labels.
+
+    Returns (counts, fallbacks, labels) with counts as [productive, unproductive].
+    """
+    sample_domains = list(domain_history.keys())
+    if not sample_domains:
+        print("No domains tracked yet.")
 
     # Tally results
     results = {"productive": 0, "unproductive": 0}
 
+    labels, fallbacks = classify_domains(sample_domains)
     for domain in sample_domains:
-        label = analyze_productivity(domain)
+        label = labels[domain]
         results[label] += 1
         print(f"{domain}: {label}")
 
     print("Analysis results:", results)
+    if fallbacks:
+        print(f"Best guesses (no model answer): {fallbacks}")
 
     # Plot the results
     statuses = list(results.keys())
     counts   = list(results.values())
 
-    return counts
+    return counts, fallbacks, labels
 
     # plt.figure(figsize=(6,4))
     # plt.bar(statuses, counts, color=['green', 'red'])
@@ -117,6 +311,9 @@ def main():
     # plt.savefig("analysis_result.png")
     #plt.show()
 
+def main():
+    return analyze_history(fetch_history())
+
 # if __name__ == "__main__":
 #     # Uncomment to debug model names
 #     # list_available_models()
@@ -0,0 +1,132 @@
+"""Session charts rendered off the request and tracking threads.
+
+Figures are drawn with matplotlib's object API on an Agg canvas, never
+through pyplot, so rendering needs no display and is safe on a worker
+thread. ReportRenderer keeps the last image per (key, format) and only
+redraws when the summary it was drawn from has changed.
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+PRODUCTIVE_COLOR = '#2ecc71'
+UNPRODUCTIVE_COLOR = '#e74c3c'
+UNLABELED_COLOR = '#95a5a6'
+# A running session's chart is redrawn at most this often; dwell keeps
+# growing without the summary version changing
+MAX_AGE = 10.0
+
+def _figure(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize, facecolor='black')
+    FigureCanvasAgg(fig)
+    return fig
+
+def _style(ax, title, xlabel=None, ylabel=None):
+    ax.set_facecolor('black')
+    ax.set_title(title, color='white')
+    if xlabel:
+        ax.set_xlabel(xlabel, color='white')
+    if ylabel:
+        ax.set_ylabel(ylabel, color='white')
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white')
+    for spine in ax.spines.values():
+        spine.set_color('white')
+
+def _focus_bars(ax, focus_time, duration):
+    times = [focus_time, max(0.0, duration - focus_time)]
+    bars = ax.bar(['Focused', 'Not Focused'], times, color=[PRODUCTIVE_COLOR, UNPRODUCTIVE_COLOR],
+                  edgecolor='white', linewidth=1.2, zorder=2)
+    for bar, yval in zip(bars, times):
+        ax.text(bar.get_x() + bar.get_width() / 2.0, yval / 2, f'{yval:.1f}s',
+                ha='center', va='center', color='black', fontsize=10, fontweight='bold',
+                bbox=dict(facecolor='white', alpha=0.6, boxstyle='round,pad=0.3'))
+    ax.set_ylim(bottom=0)
+    _style(ax, "Focus Breakdown", ylabel="Time (s)")
+
+def session_figure(summary):
+    """The three-panel session report from a SessionSummary.to_json() dict"""
+    fig = _figure((18, 4))
+    ax1, ax2, ax3 = fig.subplots(1, 3)
+    colors = {"productive": PRODUCTIVE_COLOR, "unproductive": UNPRODUCTIVE_COLOR}
+
+    domains = summary["domains"]
+    names = list(domains)
+    ax1.barh(names, [domains[d]["dwell"] for d in names],
+             color=[colors.get(domains[d]["label"], UNLABELED_COLOR) for d in names])
+    _style(ax1, "Time Spent Per Website", xlabel="Time (s)")
+
+    ax2.bar(["productive", "unproductive"], [summary["productive_seconds"], summary["unproductive_seconds"]],
+            color=[PRODUCTIVE_COLOR, UNPRODUCTIVE_COLOR])
+    _style(ax2, "Productive vs Unproductive", ylabel="Time (s)")
+
+    _focus_bars(ax3, summary["focus_time"], summary["duration"])
+    fig.tight_layout()
+    return fig
+
+def focus_figure(focus_time, duration):
+    """eyes.py's single focus-breakdown chart"""
+    fig = _figure((6, 4))
+    _focus_bars(fig.subplots(), focus_time, duration)
+    fig.tight_layout()
+    return fig
+
+def render(fig, fmt="png"):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, facecolor=fig.get_facecolor())
+    return buffer.getvalue()
+
+class ReportRenderer:
+    """One worker thread that renders report images and caches the latest of each.
+
+    submit() returns a Future for the image bytes and writes them to `path`
+    too when given. The worker is a regular executor thread, so a pending
+    render still finishes (and its file lands) before the interpreter exits.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+        self._cache = {}  # (key, fmt) -> (version, rendered_at, bytes)
+        self._lock = threading.Lock()
+
+    def submit(self, key, version, make_figure, fmt="png", path=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format {fmt!r}; choose from {', '.join(FORMATS)}")
+        return self._executor.submit(self._render, key, version, make_figure, fmt, path)
+
+    def cached(self, key, version, fmt="png"):
+        """Image bytes drawn from `version`, if still fresh enough to serve"""
+        with self._lock:
+            entry = self._cache.get((key, fmt))
+        if entry is None or entry[0] != version or time.time() - entry[1] > self.max_age:
+            return None
+        return entry[2]
+
+    def _render(self, key, version, make_figure, fmt, path):
+        image = self.cached(key, version, fmt)
+        if image is None:
+            image = render(make_figure(), fmt)
+            with self._lock:
+                self._cache[(key, fmt)] = (version, time.time(), image)
+        if path:
+            with open(path, "wb") as f:
+                f.write(image)
+        return image
+
+    def forget(self, key):
+        """Drop `key`'s cached images, e.g. once its session is evicted"""
+        with self._lock:
+            for cached in [k for k in self._cache if k[0] == key]:
+                del self._cache[cached]
+
+    def report(self, key, summary, fmt="png", path=None):
+        """Future for `summary`'s session report, reusing the cached image when current"""
+        return self.submit(key, summary["version"], lambda: session_figure(summary), fmt, path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
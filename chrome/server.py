@@ -1,10 +1,16 @@
-from flask import Flask, request
-from urllib.parse import urlparse
+from flask import Flask, Response, g, request, stream_with_context
+import argparse
+import atexit
 import threading
 import time
-from datetime import datetime
+from concurrent.futures import TimeoutError
 import productivity_analyzer as analyze
 import eyes as vision
+from live import LiveFeed
+from report import FORMATS, ReportRenderer
+import metrics
+from domains import domain_of
+from sessions import DEFAULT_SESSION, BatchTooLargeError, SessionLimitError, SessionManager, request_session_id
 
 from flask_cors import CORS
 
@@ -13,25 +19,42 @@ from flask_cors import CORS
 
 # Create the Flask app instance
 app = Flask(__name__)
+# Request timing plus /metrics; first so it also times requests rejected below
+metrics.instrument_flask(app)
 CORS(app)
 CORS(app, origins=["http://localhost:3000"], methods=["DELETE"], supports_credentials=True)
-tracker = vision.EyeTracker()
-
-# Store all domain names with timestamps
-domain_history = {}
-current_url = "unknown"
-current_domain = "unknown"
-
-def get_domain_root(url):
-    parsed = urlparse(url)
-    domain = parsed.netloc.lower()
-    if domain.startswith("www."):
-        domain = domain[4:]
-    return domain
+# Every client (dashboard tab or browser profile) gets its own domain store,
+# timeline, durable log and eye tracker, picked by a session id. Clients that
+# don't send one share the "default" session, like the single-user setup.
+# Each tracker samples the camera on its own thread, so the /vision routes
+# below only read its focus state.
+# Session charts are drawn on a worker thread and cached (report.py)
+reports = ReportRenderer()
+REPORT_TIMEOUT = 30.0
+sessions = SessionManager(
+    tracker_factory=lambda on_focus_change: vision.EyeTracker(threaded=True, fps=15,
+                                                              on_focus_change=on_focus_change),
+    on_evict=reports.forget)
+sessions.get(DEFAULT_SESSION)
+atexit.register(sessions.close)
+
+@app.before_request
+def load_session():
+    try:
+        g.session = sessions.get(request_session_id(request))
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    except SessionLimitError as e:
+        return {"status": "error", "message": str(e)}, 503
+
+def live_focus(session):
+    if session.tracker is None:
+        return {"focused": False, "focus_pct": 0.0}
+    state = session.tracker.status()
+    return {"focused": state["focused"], "focus_pct": round(state["focus_score"] * 100, 1)}
 
 @app.route('/track', methods=['POST'])
 def track_url():
-    global current_url, current_domain, domain_history
     print("Track endpoint called!")  # Debug: confirms the endpoint is hit
     data = request.get_json()
     print("Data received:", data)      # Debug: shows raw JSON data
@@ -41,77 +64,143 @@ def track_url():
         print("No data received!")
         return {"status": "error", "message": "No data received"}, 400
 
-    url = data.get('url', 'unknown')
+    url = data.get('url', 'unknown') if isinstance(data, dict) else None
+    if not isinstance(url, str):
+        return {"status": "error", "message": "Expected {\"url\": \"...\"}"}, 400
     print("URL extracted:", url)       # Debug: confirms URL extraction
-    domain = get_domain_root(url)
+    domain = domain_of(url)
     print("Domain extracted:", domain)   # Debug: shows extracted domain
-
-    current_url = url
-    current_domain = domain
+    if domain is None:
+        # chrome://, file:// and other non-web pages aren't tracked
+        return {"status": "ignored"}
 
     # Update domain history
-    now = datetime.now()
-    if domain in domain_history:
-        domain_history[domain]['count'] += 1
-        domain_history[domain]['last_seen'] = now
-    else:
-        domain_history[domain] = {
-            'first_seen': now,
-            'last_seen': now,
-            'count': 1
-        }
-    
+    if not g.session.track(url, domain):
+        return {"status": "error", "message": "Domain limit reached for this session"}, 429
+
     print(f"[TRACKED] {domain}")        # Confirmation message
     return {"status": "ok"}
 
+@app.route('/track/batch', methods=['POST'])
+def track_batch():
+    # [{"url", "t"}] buffered by the extension; t is the client's ms timestamp
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return {"status": "error", "message": "Expected {\"events\": [...]}"}, 400
+    try:
+        accepted, rejected = g.session.track_batch(data['events'], domain_of)
+    except BatchTooLargeError as e:
+        return {"status": "error", "message": str(e)}, 413
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    print(f"[TRACKED] {accepted} batched events ({rejected} over the domain limit)")
+    return {"status": "ok", "accepted": accepted, "rejected": rejected}
+
 @app.route('/domains', methods=['GET'])
 def get_domains():
-    serializable_history = {}
-    for domain, data in domain_history.items():
-        serializable_history[domain] = {
-            'first_seen': data['first_seen'].strftime('%Y-%m-%d %H:%M:%S'),
-            'last_seen': data['last_seen'].strftime('%Y-%m-%d %H:%M:%S'),
-            'count': data['count']
-        }
-    #Wipe the domain_history dict here to allow the server to permarun - assumes u only get when u need to delete too
-    #domain_history = {}
-    return serializable_history
+    return g.session.store.to_json()
 
 @app.route('/domains', methods=['DELETE'])
 def delete_domains():
-    global domain_history
-    domain_history= {}
-    print(f"DELETE: Total Domains Tracked: {len(domain_history)}")
-    return {"status": "ok"}
+    # The cleared records come back in the same response, so a client can
+    # analyze them without a GET that a /track could slip in front of
+    records = g.session.reset()
+    print(f"DELETE [{g.session.id}]: Total Domains Tracked: {len(g.session.store)}")
+    return {"status": "ok", "domains": {domain: record.to_dict() for domain, record in records.items()}}
+
+@app.route('/domains/time', methods=['GET'])
+def domain_times():
+    # Optional ?start=&end= window as unix timestamps; defaults to the whole session
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    timeline = g.session.timeline
+    return {
+        "dwell": timeline.dwell_seconds(start, end),
+        "focused": timeline.focused_seconds(start, end),
+    }
 
 @app.route('/domains/analyze', methods=['GET'])
 def analyze_domains():
-    counts = analyze.main()
-    delete_domains()
-    return {"status": "ok", "productive": counts[0], "unproductive": counts[1]}
+    # Classify the snapshot in-process; a /track landing mid-analysis goes
+    # into the fresh history instead of being dropped by a later DELETE.
+    counts, fallbacks, labels = analyze.analyze_history(g.session.store.snapshot_and_reset())
+    g.session.labels(labels)
+    response = {"status": "ok", "productive": counts[0], "unproductive": counts[1]}
+    if fallbacks:
+        response["note"] = f"Best guess (classifier unavailable or timed out): {', '.join(fallbacks)}"
+        response["fallback_domains"] = fallbacks
+    return response
+
+@app.route('/summary', methods=['GET'])
+def session_summary():
+    # Live totals for focus-wrapped: focus time, dwell per domain, productive split
+    return g.session.summary.to_json(label_of=analyze.cached_label)
+
+@app.route('/summary/report', methods=['GET'])
+def summary_report():
+    fmt = request.args.get('format', 'png')
+    if fmt not in FORMATS:
+        return {"status": "error", "message": f"format must be one of {', '.join(FORMATS)}"}, 400
+    summary = g.session.summary.to_json(label_of=analyze.cached_label)
+    try:
+        image = reports.report(g.session.id, summary, fmt).result(timeout=REPORT_TIMEOUT)
+    except TimeoutError:
+        return {"status": "error", "message": f"Report not rendered within {REPORT_TIMEOUT:.0f}s"}, 504
+    return Response(image, mimetype=FORMATS[fmt])
+
+@app.route('/history/sessions', methods=['GET'])
+def history_sessions():
+    # Totals per session from the durable log, including the one in progress
+    return g.session.log.sessions()
+
+@app.route('/history/days', methods=['GET'])
+def history_days():
+    return g.session.log.days()
 
 @app.route('/vision/start', methods=['POST'])
 def start_vision():
-    tracker.start()
+    try:
+        sessions.start_tracker(g.session)
+    except SessionLimitError as e:
+        return {"status": "error", "message": str(e)}, 409
     return {"status": "ok"}
 
 @app.route('/vision/step', methods=['POST'])
 def step_vision():
-    tracker.step()
-    return {"status": "ok"}
+    tracker = g.session.tracker
+    state = (tracker.step() if tracker else None) or {}
+    return {"status": "ok", **state}
 
 @app.route('/vision/stop', methods=['POST'])
 def stop_vision():
-    score = tracker.stop()
+    tracker = g.session.tracker
+    score = tracker.stop() if tracker else 0
     return {"focus_score": score}
 
-def run_server():
-    app.run(port=5001)
+@app.route('/stream', methods=['GET'])
+def stream():
+    # Server-Sent Events: a snapshot, then only focus/domain deltas as they change
+    session = g.session
+    feed = LiveFeed(session.store, lambda: live_focus(session), session=session)
+    return Response(stream_with_context(feed.events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def run_server(asgi=False):
+    if asgi:
+        # Same routes on asyncio (optional starlette + uvicorn)
+        from asgi_server import create_app, serve
+        serve(create_app(sessions, domain_of, live_focus, analyzer=analyze, reports=reports), port=5001)
+    else:
+        app.run(port=5001)
 
 if __name__ == "__main__":
-    threading.Thread(target=run_server, daemon=True).start()
+    parser = argparse.ArgumentParser(description="Miza tab tracking and eye tracking server")
+    parser.add_argument("--asgi", action="store_true", help="serve with uvicorn instead of Flask's dev server")
+    args = parser.parse_args()
+    threading.Thread(target=run_server, args=(args.asgi,), daemon=True).start()
     
     while True:
-        print(f"Current Domain: {current_domain}")
-        print(f"Total Domains Tracked: {len(domain_history)}")
+        store = sessions.get(DEFAULT_SESSION).store
+        print(f"Current Domain: {store.current_domain}")
+        print(f"Total Domains Tracked: {len(store)} | Sessions: {len(sessions)}")
         time.sleep(3)
@@ -0,0 +1,427 @@
+import json
+import os
+import threading
+import time
+from bisect import insort
+from datetime import date, datetime, timedelta
+
+from session_store import TIME_FORMAT, DomainRecord
+from timeline import REORDER_WINDOW
+
+DEFAULT_LOG_DIR = os.environ.get(
+    "MIZA_SESSION_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session_log"),
+)
+FLUSH_INTERVAL = 1.0              # seconds of events a crash can lose
+MAX_BATCH = 256                   # flush early once this many events are waiting
+COMPACT_BYTES = 4 * 1024 * 1024   # fold segments into the snapshot past this size
+SNAPSHOT_NAME = "snapshot.json"
+
+def _day(t):
+    return date.fromtimestamp(t).isoformat()
+
+def _next_midnight(t):
+    d = date.fromtimestamp(t) + timedelta(days=1)
+    return datetime(d.year, d.month, d.day).timestamp()
+
+class Aggregate:
+    """Running per-session and per-day totals folded from log events, one at a time.
+
+    Holds only the totals, the open segment (current domain, focus state
+    and when it started) and the tab and focus events of the last
+    REORDER_WINDOW seconds, so it stays small however long a session runs
+    and can be saved as the compaction snapshot and replayed into a
+    SessionStore and Timeline after a restart. Those recent events are
+    folded in time order once they leave the window, so a late one (from a
+    delayed /track/batch) still counts at its own time, like in Timeline.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.sessions = state.get("sessions", {})
+        self.days = state.get("days", {})
+        self.session = state.get("session")
+        self.domain = state.get("domain")
+        self.focused = state.get("focused", False)
+        self.since = state.get("since")
+        self.pending = state.get("pending", [])  # [t, arrival, event], sorted
+        self.arrivals = state.get("arrivals", 0)
+
+    def to_dict(self):
+        return {"sessions": self.sessions, "days": self.days, "session": self.session,
+                "domain": self.domain, "focused": self.focused, "since": self.since,
+                "pending": self.pending, "arrivals": self.arrivals}
+
+    def _start(self, sid, t):
+        # The tab and focus state carry over into the new session, like Timeline.reset
+        self.session = sid
+        self.sessions[sid] = {"start": t, "end": t, "domains": {}, "labels": {}}
+
+    def _day_totals(self, t):
+        return self.days.setdefault(_day(t), {"visits": 0, "dwell": 0.0, "focused": 0.0, "domains": {}})
+
+    def _domain_totals(self, domain):
+        return self.sessions[self.session]["domains"].setdefault(
+            domain, {"visits": 0, "first": None, "last": None, "dwell": 0.0, "focused": 0.0})
+
+    def _advance(self, t):
+        if self.since is not None and self.domain is not None and t > self.since:
+            totals = self._domain_totals(self.domain)
+            totals["dwell"] += t - self.since
+            if self.focused:
+                totals["focused"] += t - self.since
+            # Split the segment at midnight so each day gets its own share
+            start = self.since
+            while start < t:
+                end = min(t, _next_midnight(start))
+                day = self._day_totals(start)
+                day["dwell"] += end - start
+                if self.focused:
+                    day["focused"] += end - start
+                day["domains"][self.domain] = day["domains"].get(self.domain, 0.0) + end - start
+                start = end
+        self.since = t if self.since is None else max(self.since, t)
+        session = self.sessions[self.session]
+        session["end"] = max(session["end"], t)
+
+    def apply(self, event):
+        kind, t = event["e"], event["t"]
+        if kind == "start":
+            self.settle()
+            if self.session is not None:
+                self._advance(t)
+            self._start(event["s"], t)
+            self.since = t
+            return
+        if self.session is None:
+            self._start(str(t), t)
+        if kind == "labels":
+            # Not a tab or focus change, so it doesn't close the open segment
+            self.sessions[self.session]["labels"].update(event["l"])
+            return
+        if kind == "resume":
+            # Restarted after downtime: skip the gap instead of crediting it
+            # to the last tab, and the tracker starts out unfocused
+            self.settle()
+            self.since = None
+            self.focused = False
+            self._advance(t)
+            return
+        if self.since is not None and t < self.since:
+            t = self.since  # later than the reorder window allows
+        self.arrivals += 1
+        insort(self.pending, [t, self.arrivals, event])
+        self._fold(self.pending[-1][0] - REORDER_WINDOW)
+
+    def _fold(self, until):
+        # Apply the pending events up to `until`, oldest first
+        k = 0
+        while k < len(self.pending) and self.pending[k][0] <= until:
+            t, _, event = self.pending[k]
+            self._change(event, t)
+            k += 1
+        del self.pending[:k]
+
+    def settle(self):
+        """Fold every pending event (for queries, and before a session boundary)"""
+        self._fold(float("inf"))
+
+    def _change(self, event, t):
+        self._advance(t)
+        if event["e"] == "tab":
+            totals = self._domain_totals(event["d"])
+            totals["visits"] += 1
+            totals["first"] = totals["first"] or t
+            totals["last"] = t
+            self._day_totals(t)["visits"] += 1
+            self.domain = event["d"]
+        elif event["e"] == "focus":
+            self.focused = bool(event["f"])
+
+    def close(self, now):
+        """Credit the open segment up to `now` (for queries of the session in progress)"""
+        if self.session is not None:
+            self.settle()
+            self._advance(now)
+
+    def session_summaries(self):
+        result = {}
+        for sid, session in self.sessions.items():
+            labels = session["labels"]
+            domains = session["domains"]
+            summary = {
+                "start": datetime.fromtimestamp(session["start"]).strftime(TIME_FORMAT),
+                "end": datetime.fromtimestamp(session["end"]).strftime(TIME_FORMAT),
+                "duration": round(session["end"] - session["start"], 1),
+                "visits": sum(d["visits"] for d in domains.values()),
+                "dwell": round(sum(d["dwell"] for d in domains.values()), 1),
+                "focused": round(sum(d["focused"] for d in domains.values()), 1),
+                "domains": {name: {"visits": d["visits"], "dwell": round(d["dwell"], 1),
+                                   "focused": round(d["focused"], 1), "label": labels.get(name)}
+                            for name, d in domains.items()},
+            }
+            for label in ("productive", "unproductive"):
+                summary[f"{label}_seconds"] = round(sum(d["dwell"] for name, d in domains.items()
+                                                        if labels.get(name) == label), 1)
+            result[sid] = summary
+        return result
+
+    def day_summaries(self):
+        return {day: {"visits": d["visits"], "dwell": round(d["dwell"], 1), "focused": round(d["focused"], 1),
+                      "domains": {name: round(s, 1) for name, s in d["domains"].items()}}
+                for day, d in sorted(self.days.items())}
+
+class SessionLog:
+    """Durable append-only log of tab switches, focus flips and classifications.
+
+    Each event is one compact JSON line. Appending only buffers it; a writer
+    thread writes the buffer and fsyncs once every `flush_interval` seconds
+    (sooner if `max_batch` events pile up), so a crash loses at most that
+    much. The log is a series of numbered segments: once the active one
+    passes `compact_bytes` it is rotated and the closed segments are folded
+    into snapshot.json, which keeps only the running totals and the open
+    segment. Startup replay is the snapshot plus whatever segments came after
+    it; a snapshot that can't be read is set aside and the segments still on
+    disk are replayed from scratch.
+
+    Queries stream the segments through an Aggregate line by line, so memory
+    is bounded by the totals and the current session, not the log size.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_DIR, flush_interval=FLUSH_INTERVAL,
+                 max_batch=MAX_BATCH, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.compact_bytes = compact_bytes
+        self.session_id = None
+        self.session_start = None
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._closed = False
+        self._focused = False
+        os.makedirs(path, exist_ok=True)
+
+        self._folded = self._read_snapshot()[0]
+        # A torn last line from a crash stays in its old segment; start a fresh one
+        self._active = max(self._segments() + [self._folded]) + 1
+        self._file = open(self._segment_path(self._active), "a")
+        self._bytes = 0
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    # ---- files ----
+
+    def _segment_path(self, seq):
+        return os.path.join(self.path, f"{seq:06d}.log")
+
+    def _segments(self):
+        """Sequence numbers of segments not yet folded into the snapshot"""
+        seqs = []
+        for name in os.listdir(self.path):
+            stem, ext = os.path.splitext(name)
+            if ext == ".log" and stem.isdigit() and int(stem) > self._folded:
+                seqs.append(int(stem))
+        return sorted(seqs)
+
+    def _read_snapshot(self):
+        snapshot_path = os.path.join(self.path, SNAPSHOT_NAME)
+        if not os.path.exists(snapshot_path):
+            return 0, Aggregate()
+        try:
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+            return int(snapshot["segment"]), Aggregate(snapshot["state"])
+        except (ValueError, KeyError, TypeError) as e:
+            # Moved aside so it is reported once; everything since the last
+            # good compaction is still in the segments
+            print(f"Unreadable session log snapshot {snapshot_path} ({e}); replaying the log segments")
+            os.replace(snapshot_path, snapshot_path + ".corrupt")
+            self._folded = 0
+            return 0, Aggregate()
+
+    def _events(self, seq):
+        with open(self._segment_path(seq)) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn write at the end of a crashed segment
+
+    # ---- writing ----
+
+    def append(self, kind, t=None, **fields):
+        event = {"e": kind, "t": round(t if t is not None else time.time(), 3), **fields}
+        with self._cond:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._buffer) >= self.max_batch or self._closed,
+                                    self.flush_interval)
+                closing = self._closed
+            self.flush()
+            if self._bytes >= self.compact_bytes:
+                self.compact()
+            if closing:
+                return
+
+    def flush(self):
+        """Write and fsync everything buffered so far"""
+        with self._file_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # Taking the batch under the file lock keeps concurrent flushes in order
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if not batch or self._file.closed:
+            return
+        data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in batch)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._bytes += len(data)
+
+    def compact(self):
+        """Rotate the active segment and fold every closed segment into the snapshot"""
+        with self._file_lock:
+            self._flush_locked()
+            self._file.close()
+            closed = [seq for seq in self._segments() if seq <= self._active]
+            self._active += 1
+            self._file = open(self._segment_path(self._active), "a")
+            self._bytes = 0
+
+            _, aggregate = self._read_snapshot()
+            for seq in closed:
+                for event in self._events(seq):
+                    aggregate.apply(event)
+            folded = closed[-1] if closed else self._folded
+            tmp_path = os.path.join(self.path, SNAPSHOT_NAME + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"segment": folded, "state": aggregate.to_dict()}, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.path, SNAPSHOT_NAME))
+            self._folded = folded
+            for seq in closed:
+                os.remove(self._segment_path(seq))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join(timeout=5)
+        with self._file_lock:
+            self._flush_locked()
+            self._file.close()
+
+    # ---- events ----
+
+    def start_session(self, t=None):
+        t = t if t is not None else time.time()
+        self.session_id = datetime.fromtimestamp(t).strftime("%Y%m%d-%H%M%S-%f")
+        self.session_start = t
+        self.append("start", t, s=self.session_id)
+        return self.session_id
+
+    def tab_switch(self, domain, t=None):
+        self.append("tab", t, d=domain)
+
+    def focus_change(self, focused, t=None):
+        # The video loop reports focus every frame; only flips are worth a line
+        if focused == self._focused:
+            return
+        self._focused = focused
+        self.append("focus", t, f=int(focused))
+
+    def labels(self, labels, t=None):
+        if labels:
+            self.append("labels", t, l=dict(labels))
+
+    # ---- reading ----
+
+    def aggregate(self, now=None, on_event=None):
+        """Totals over the whole log, streamed from the snapshot and later segments.
+
+        on_event(event, aggregate), if given, sees each segment event after
+        the snapshot once it has been applied.
+        """
+        with self._file_lock:
+            self._flush_locked()
+            _, aggregate = self._read_snapshot()
+            if on_event is not None:
+                on_event(None, aggregate)
+            for seq in self._segments():
+                for event in self._events(seq):
+                    aggregate.apply(event)
+                    if on_event is not None:
+                        on_event(event, aggregate)
+        if now is not None:
+            aggregate.close(now)
+        return aggregate
+
+    def sessions(self):
+        return self.aggregate(time.time()).session_summaries()
+
+    def days(self):
+        return self.aggregate(time.time()).day_summaries()
+
+    def recover(self, store=None, timeline=None):
+        """Replay the unfinished session into `store`/`timeline` and carry on logging it.
+
+        Starts a new session if the log has none. The time the process was
+        down is skipped rather than credited to the last tab. What the
+        snapshot folded comes back into the timeline as per-domain totals
+        (see Timeline.seed); the segments after it replay event by event.
+        """
+        def replay(event, aggregate):
+            if timeline is None:
+                return
+            if event is None:
+                # The snapshot: totals so far plus the open segment
+                if aggregate.session is not None:
+                    session = aggregate.sessions[aggregate.session]
+                    since = aggregate.since if aggregate.since is not None else session["start"]
+                    timeline.reset(session["start"])
+                    timeline.seed({d: s["dwell"] for d, s in session["domains"].items()},
+                                  {d: s["focused"] for d, s in session["domains"].items()}, since)
+                    if aggregate.domain is not None:
+                        timeline.tab_switch(aggregate.domain, since)
+                    timeline.focus_change(aggregate.focused, since)
+                    # Events the snapshot hadn't folded yet
+                    for t, _, pending in aggregate.pending:
+                        replay(dict(pending, t=t), aggregate)
+            elif event["e"] == "start":
+                timeline.reset(event["t"])
+            elif event["e"] == "tab":
+                timeline.tab_switch(event["d"], event["t"])
+            elif event["e"] == "focus":
+                timeline.focus_change(bool(event["f"]), event["t"])
+            elif event["e"] == "resume":
+                timeline.skip_to(event["t"])
+                timeline.focus_change(False, event["t"])
+
+        aggregate = self.aggregate(on_event=replay)
+        if aggregate.session is None:
+            return self.start_session()
+
+        aggregate.settle()
+        self.session_id = aggregate.session
+        session = aggregate.sessions[aggregate.session]
+        self.session_start = session["start"]
+        if store is not None:
+            store.load({domain: DomainRecord(datetime.fromtimestamp(d["first"]),
+                                             datetime.fromtimestamp(d["last"]), d["visits"])
+                        for domain, d in session["domains"].items() if d["visits"]},
+                       current=aggregate.domain)
+        if timeline is not None:
+            timeline.skip_to(time.time())
+            timeline.focus_change(False)
+        self.append("resume")
+        return self.session_id
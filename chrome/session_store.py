@@ -0,0 +1,162 @@
+import threading
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class DomainRecord:
+    """Per-domain counters for one session"""
+    __slots__ = ("first_seen", "last_seen", "count", "version")
+
+    def __init__(self, first_seen, last_seen=None, count=0, version=0):
+        self.first_seen = first_seen
+        self.last_seen = last_seen or first_seen
+        self.count = count
+        self.version = version  # store version of the last change, for deltas
+
+    def copy(self):
+        return DomainRecord(self.first_seen, self.last_seen, self.count, self.version)
+
+    def to_dict(self):
+        return {
+            'first_seen': self.first_seen.strftime(TIME_FORMAT),
+            'last_seen': self.last_seen.strftime(TIME_FORMAT),
+            'count': self.count,
+        }
+
+class SessionStore:
+    """Thread-safe domain history shared by the Flask handlers and the tracker loop.
+
+    Records are spread over lock stripes keyed by domain, so concurrent /track
+    requests only contend when they touch the same stripe. The current
+    URL/domain pair is replaced as one tuple and can be read without taking a
+    lock.
+
+    Every change bumps a store-wide version and stamps it on the record, so
+    live readers can ask for just the records changed since the version they
+    last saw (changes_since) and sleep until there is something new
+    (wait_for_change). `generation` counts resets.
+
+    With `max_domains` set, visits to new domains past that many are refused
+    (track returns 0) so one client can't grow the store without bound.
+    """
+
+    def __init__(self, stripes=16, max_domains=None):
+        self.max_domains = max_domains
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._records = [{} for _ in range(stripes)]
+        self._current_lock = threading.Lock()
+        self._current = ("unknown", "unknown")
+        self._current_at = datetime.min
+        self._version = 0
+        self.generation = 0
+        self._changed = threading.Condition()
+
+    def _stripe(self, domain):
+        return hash(domain) % len(self._locks)
+
+    @property
+    def current_url(self):
+        return self._current[0]
+
+    @property
+    def current_domain(self):
+        return self._current[1]
+
+    @property
+    def version(self):
+        return self._version
+
+    def _bump(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+            return self._version
+
+    def track(self, url, domain, now=None):
+        """Record a visit to `domain` and make it the current domain"""
+        now = now or datetime.now()
+        with self._current_lock:
+            # A late batched visit doesn't take over from a newer one
+            if now >= self._current_at:
+                self._current = (url, domain)
+                self._current_at = now
+        i = self._stripe(domain)
+        with self._locks[i]:
+            record = self._records[i].get(domain)
+            if record is None:
+                if self.max_domains is not None and len(self) >= self.max_domains:
+                    return 0
+                record = self._records[i][domain] = DomainRecord(now)
+            record.count += 1
+            # Batched client timestamps can arrive slightly out of order
+            record.first_seen = min(record.first_seen, now)
+            record.last_seen = max(record.last_seen, now)
+            record.version = self._bump()
+            return record.count
+
+    def get(self, domain):
+        i = self._stripe(domain)
+        with self._locks[i]:
+            record = self._records[i].get(domain)
+            return record.copy() if record else None
+
+    def snapshot(self):
+        """Copy of every record; locks one stripe at a time"""
+        result = {}
+        for i, lock in enumerate(self._locks):
+            with lock:
+                for domain, record in self._records[i].items():
+                    result[domain] = record.copy()
+        return result
+
+    def changes_since(self, version):
+        """(current version, {domain: record dict}) for records changed after `version`"""
+        # Read the version before scanning: a record stamped after this point
+        # may be missed now but will be newer than it on the next call.
+        upto = self._version
+        changed = {}
+        for i, lock in enumerate(self._locks):
+            with lock:
+                for domain, record in self._records[i].items():
+                    if record.version > version:
+                        changed[domain] = record.to_dict()
+        return upto, changed
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the store moves past `version`; False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._version > version, timeout)
+
+    def snapshot_and_reset(self):
+        """Take every record and start an empty session as one atomic step"""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            taken = self._records
+            self._records = [{} for _ in self._locks]
+            self.generation += 1
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+        self._bump()
+        result = {}
+        for records in taken:
+            result.update(records)
+        return result
+
+    def load(self, records, current=None):
+        """Put back records replayed from the session log (before serving requests)"""
+        for domain, record in records.items():
+            i = self._stripe(domain)
+            with self._locks[i]:
+                self._records[i][domain] = record
+                record.version = self._bump()
+        if current is not None:
+            with self._current_lock:
+                self._current = ("unknown", current)
+
+    def to_json(self):
+        return {domain: record.to_dict() for domain, record in self.snapshot().items()}
+
+    def __len__(self):
+        return sum(len(records) for records in self._records)
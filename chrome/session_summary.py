@@ -0,0 +1,160 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from session_log import TIME_FORMAT
+
+LABELS = ("productive", "unproductive")
+
+class SessionSummary:
+    """Running totals for the session in progress, ready to report at any time.
+
+    Dwell and focused time per domain already live in the timeline's interval
+    indexes and visit counts in the store, so this only adds what they lack:
+    eye-focus time (credited at each focus flip) and domain labels. Labels
+    come from set_labels(), from `label_of` (a cache lookup) when reported,
+    or, with a `classifier`, from a background worker that labels each new
+    domain as it shows up, so nothing has to be classified at session end.
+    """
+
+    def __init__(self, store, timeline, start=None):
+        self.store = store
+        self.timeline = timeline
+        self.classifier = None  # optional: [domain] -> {domain: label}, may be slow
+        self.version = 0
+        self._lock = threading.Lock()
+        self._labels = {}
+        self._pending = set()
+        self._worker = None
+        self._labelling = None
+        self.reset(start)
+
+    def reset(self, start=None):
+        with self._lock:
+            self.started = start if start is not None else time.time()
+            self.ended = None
+            self.focus_time = 0.0
+            self._focused_since = None
+            self.version += 1
+
+    def domain_seen(self, domain):
+        with self._lock:
+            self.version += 1
+            if domain in self._labels or domain in self._pending or self.classifier is None:
+                return
+            self._pending.add(domain)
+            if self._labelling is None:
+                if self._worker is None:
+                    self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary-labels")
+                self._labelling = self._worker.submit(self._label_pending)
+
+    def _label_pending(self):
+        # Drains everything queued meanwhile, so a burst of new tabs is one call
+        while True:
+            with self._lock:
+                domains = sorted(self._pending - set(self._labels))
+                if not domains:
+                    self._pending.clear()
+                    self._labelling = None  # the next new domain starts a fresh run
+                    return
+            try:
+                labels = self.classifier(domains)
+            except Exception as e:
+                print(f"Background labelling failed for {len(domains)} domains: {e}")
+                labels = {}
+            with self._lock:
+                self._pending.difference_update(domains)
+            self.set_labels(labels)
+
+    def wait_for_labels(self, timeout=None):
+        """Block until background labelling is idle; False on timeout"""
+        future = self._labelling
+        if future is None:
+            return True
+        try:
+            future.result(timeout)
+        except Exception:
+            return future.done()
+        return True
+
+    def set_labels(self, labels):
+        with self._lock:
+            fresh = {d: l for d, l in labels.items() if l in LABELS and self._labels.get(d) != l}
+            if fresh:
+                self._labels.update(fresh)
+                self.version += 1
+
+    def focus_change(self, focused, t=None):
+        t = t if t is not None else time.time()
+        with self._lock:
+            if focused and self._focused_since is None:
+                self._focused_since = t
+            elif not focused and self._focused_since is not None:
+                self.focus_time += max(0.0, t - self._focused_since)
+                self._focused_since = None
+            else:
+                return
+            self.version += 1
+
+    def end(self, t=None):
+        """Freeze the clock: focus and dwell stop counting at `t`"""
+        t = t if t is not None else time.time()
+        self.focus_change(False, t)
+        with self._lock:
+            self.ended = t
+            self.version += 1
+
+    def to_json(self, label_of=None):
+        """Summary in the shape of SessionLog.sessions() entries, plus eye-focus totals.
+
+        `label_of(domain)` fills in labels this summary hasn't been given
+        (e.g. the classification cache); domains still unknown have label None.
+        """
+        with self._lock:
+            started, ended = self.started, self.ended
+            focus_time = self.focus_time
+            if self._focused_since is not None:
+                focus_time += max(0.0, time.time() - self._focused_since)
+            labels = dict(self._labels)
+        end = ended if ended is not None else time.time()
+        dwell = self.timeline.dwell_seconds(started, end)
+        focused = self.timeline.focused_seconds(started, end)
+        records = self.store.snapshot()
+
+        # The store empties on every /domains/analyze snapshot; the timeline
+        # covers the whole session
+        names = set(dwell) | set(records)
+        if label_of is not None:
+            found = {d: label_of(d) for d in names if d not in labels}
+            found = {d: label for d, label in found.items() if label in LABELS}
+            if found:
+                self.set_labels(found)
+                labels.update(found)
+
+        duration = max(0.0, end - started)
+        domains = {name: {"visits": records[name].count if name in records else 0,
+                          "dwell": round(dwell.get(name, 0.0), 1),
+                          "focused": round(focused.get(name, 0.0), 1), "label": labels.get(name)}
+                   for name in sorted(names)}
+        summary = {
+            "start": datetime.fromtimestamp(started).strftime(TIME_FORMAT),
+            "end": datetime.fromtimestamp(end).strftime(TIME_FORMAT),
+            "ended": ended is not None,
+            "duration": round(duration, 1),
+            "focus_time": round(focus_time, 1),
+            "focus_pct": round(100 * focus_time / duration, 1) if duration > 0 else 0.0,
+            "visits": sum(d["visits"] for d in domains.values()),
+            "dwell": round(sum(dwell.values(), 0.0), 1),
+            "focused": round(sum(focused.values(), 0.0), 1),
+            "domains": domains,
+            "version": self.version,
+        }
+        for label in LABELS + (None,):
+            seconds = sum((dwell.get(name, 0.0) for name in domains if labels.get(name) == label), 0.0)
+            summary[f"{label or 'unlabeled'}_seconds"] = round(seconds, 1)
+        return summary
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.shutdown(wait=False, cancel_futures=True)
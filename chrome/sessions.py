@@ -0,0 +1,324 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+from session_store import SessionStore
+from timeline import Timeline
+from session_log import DEFAULT_LOG_DIR, SessionLog
+from session_summary import SessionSummary
+
+DEFAULT_SESSION = "default"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+MAX_SESSIONS = int(os.environ.get("MIZA_MAX_SESSIONS", 500))
+MAX_DOMAINS = int(os.environ.get("MIZA_MAX_DOMAINS", 5000))   # per session
+MAX_BATCH_EVENTS = 500
+# Client timestamps older than this are refused; newer than now are capped
+MAX_EVENT_AGE = 7 * 24 * 3600
+MAX_TRACKERS = int(os.environ.get("MIZA_MAX_TRACKERS", 1))    # each one holds a camera
+IDLE_TIMEOUT = float(os.environ.get("MIZA_IDLE_TIMEOUT", 30 * 60))
+
+class SessionLimitError(Exception):
+    """Raised when a session or tracker can't be created without going over a limit"""
+
+class BatchTooLargeError(ValueError):
+    """Raised for a tab event batch longer than MAX_BATCH_EVENTS; nothing in it is recorded"""
+
+def event_time(t, now=None):
+    """A client unix timestamp checked and capped at `now`; ValueError if it is unusable"""
+    now = now if now is not None else time.time()
+    if isinstance(t, bool) or not isinstance(t, (int, float)) or not math.isfinite(t):
+        raise ValueError(f"Event time must be a finite number, not {t!r}")
+    if t < now - MAX_EVENT_AGE:
+        raise ValueError(f"Event time {t!r} is more than {MAX_EVENT_AGE // 86400} days old")
+    return min(t, now)
+
+def session_id_from(args, headers, body=None):
+    """Session id from ?session=, an X-Miza-Session header or "session" in a JSON body"""
+    return (args.get("session") or headers.get("X-Miza-Session")
+            or (body if isinstance(body, dict) else {}).get("session") or DEFAULT_SESSION)
+
+def request_session_id(request):
+    """session_id_from() for a Flask request"""
+    body = request.get_json(silent=True) if request.is_json else None
+    return session_id_from(request.args, request.headers, body)
+
+class UserSession:
+    """Everything one client (a dashboard or browser profile) tracks.
+
+    The default session logs to the log directory itself, so a single-user
+    setup keeps reading the same history; named sessions get a subdirectory.
+    """
+
+    def __init__(self, session_id, log_dir=DEFAULT_LOG_DIR, max_domains=MAX_DOMAINS, stripes=4):
+        self.id = session_id
+        self.store = SessionStore(stripes, max_domains=max_domains)
+        self.timeline = Timeline()
+        path = log_dir if session_id == DEFAULT_SESSION else os.path.join(log_dir, "sessions", session_id)
+        self.log = SessionLog(path)
+        self.log.recover(self.store, self.timeline)
+        self.summary = SessionSummary(self.store, self.timeline, start=self.log.session_start)
+        self.tracker = None
+        self.last_active = time.time()
+        self.watchers = 0  # open live feeds (/stream)
+        self.closed = False
+        self._watch_lock = threading.Lock()
+
+    def touch(self):
+        self.last_active = time.time()
+
+    @contextmanager
+    def watching(self):
+        """Count a live feed as open while inside; a watched session isn't evicted"""
+        with self._watch_lock:
+            self.watchers += 1
+        try:
+            yield
+        finally:
+            with self._watch_lock:
+                self.watchers -= 1
+
+    def track(self, url, domain, t=None):
+        """Record a tab at unix time `t` (default now); False if the domain limit kept a new domain out.
+
+        Raises ValueError for a `t` that event_time() refuses.
+        """
+        if t is not None:
+            t = event_time(t)
+        now = datetime.fromtimestamp(t) if t is not None else None
+        if not self.store.track(url, domain, now):
+            return False
+        self.timeline.tab_switch(domain, t)
+        self.log.tab_switch(domain, t)
+        self.summary.domain_seen(domain)
+        return True
+
+    def track_batch(self, events, domain_root):
+        """Record [{"url", "t"}] events stamped by the client (t in ms since the epoch).
+
+        Every event is checked before any is applied: a URL that isn't a
+        string or a `t` that event_time() refuses raises ValueError, and more
+        than MAX_BATCH_EVENTS events raise BatchTooLargeError, recording
+        nothing. Events are applied in time order with timestamps
+        capped at the server's clock, and a URL repeating the one before it
+        is not a new visit. URLs `domain_root` maps to None (browser-internal
+        pages) are skipped. Returns (accepted, rejected).
+        """
+        if len(events) > MAX_BATCH_EVENTS:
+            raise BatchTooLargeError(f"At most {MAX_BATCH_EVENTS} events per batch, got {len(events)}")
+        now = time.time()
+        parsed = []
+        for i, event in enumerate(events):
+            if not isinstance(event, dict) or not isinstance(event.get("url"), str):
+                raise ValueError(f"Event {i} needs a string url")
+            t = event.get("t", now * 1000)
+            try:
+                t = event_time(t / 1000 if isinstance(t, (int, float)) and not isinstance(t, bool) else t, now)
+            except ValueError as e:
+                raise ValueError(f"Event {i}: {e}") from None
+            parsed.append((t, event["url"]))
+        parsed.sort(key=lambda e: e[0])
+
+        domains = {}  # each distinct URL is parsed once per batch
+        accepted = rejected = 0
+        previous = None
+        for t, url in parsed:
+            if url == previous:
+                continue
+            previous = url
+            if url not in domains:
+                domains[url] = domain_root(url)
+            if domains[url] is None:
+                continue
+            if self.track(url, domains[url], t):
+                accepted += 1
+            else:
+                rejected += 1
+        return accepted, rejected
+
+    def focus_changed(self, focused, t):
+        self.timeline.focus_change(focused, t)
+        self.log.focus_change(focused, t)
+        self.summary.focus_change(focused, t)
+
+    def labels(self, labels):
+        """Record classifier output in the log and the live summary"""
+        self.log.labels(labels)
+        self.summary.set_labels(labels)
+
+    def reset(self):
+        """Start a new session; returns the domain records it cleared (SessionStore.snapshot_and_reset)"""
+        t = time.time()
+        records = self.store.snapshot_and_reset()
+        self.timeline.reset(t)
+        self.summary.reset(t)
+        # The old session stays in the log; this starts the next one
+        self.log.start_session(t)
+        return records
+
+    @property
+    def busy(self):
+        return self.tracker is not None and self.tracker.running
+
+    def close(self):
+        self.closed = True  # ends its live feeds
+        if self.busy:
+            self.tracker.stop()
+        self.summary.close()
+        self.log.close()
+
+class SessionManager:
+    """Per-client sessions keyed by ID, with idle eviction and size limits.
+
+    Sessions idle for `idle_timeout` seconds are closed (their log is flushed,
+    so nothing is lost; coming back replays it). When `max_sessions` are
+    open, the least recently used idle one makes room; if every session is
+    busy running a tracker or streaming to a /stream client, creating
+    another raises SessionLimitError.
+    Only `max_trackers` eye trackers may run at once since each holds a
+    camera. The default session is never evicted.
+
+    Opening a session (replaying its log) and closing one (flushing it) are
+    slow, so neither holds the manager lock: a session being opened sits in
+    the table as a Future that other requests for it wait on, and a session
+    id being closed can only reopen once its old log is flushed.
+    `on_evict(session_id)` is called after an evicted session is closed.
+    Starting a tracker (opening a camera) doesn't hold the lock either; the
+    tracker's slot is reserved first and given back if it fails to start.
+    """
+
+    def __init__(self, tracker_factory=None, log_dir=DEFAULT_LOG_DIR, max_sessions=MAX_SESSIONS,
+                 max_domains=MAX_DOMAINS, max_trackers=MAX_TRACKERS, idle_timeout=IDLE_TIMEOUT,
+                 on_evict=None):
+        self.tracker_factory = tracker_factory
+        self.log_dir = log_dir
+        self.max_sessions = max_sessions
+        self.max_domains = max_domains
+        self.max_trackers = max_trackers
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._sessions = OrderedDict()  # least recently used first; Futures while opening
+        self._closing = {}              # session id -> Future done once its log is closed
+        self._starting = set()          # sessions whose tracker is opening its camera
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.evicted = 0
+
+    def get(self, session_id=DEFAULT_SESSION):
+        if not SESSION_ID_PATTERN.match(session_id or ""):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        evicted = []
+        opening = None
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                evicted += self._make_room()
+                entry = opening = self._sessions[session_id] = Future()
+                closing = self._closing.get(session_id)
+            self._sessions.move_to_end(session_id)
+            if time.time() - self._last_sweep > min(self.idle_timeout / 4, 60):
+                evicted += self._sweep()
+        self._close(evicted)
+
+        if opening is not None:
+            try:
+                if closing is not None:
+                    closing.result()
+                session = UserSession(session_id, self.log_dir, self.max_domains)
+            except BaseException as e:
+                with self._lock:
+                    if self._sessions.get(session_id) is opening:
+                        del self._sessions[session_id]
+                opening.set_exception(e)
+                raise
+            with self._lock:
+                if self._sessions.get(session_id) is opening:
+                    self._sessions[session_id] = session
+            opening.set_result(session)
+        else:
+            session = entry.result() if isinstance(entry, Future) else entry
+        session.touch()
+        return session
+
+    def _open(self):
+        # (id, session) pairs that are open rather than still opening
+        return [(sid, s) for sid, s in self._sessions.items() if isinstance(s, UserSession)]
+
+    def _tracking(self, session):
+        return session.busy or session in self._starting
+
+    def _busy(self, session):
+        # Not to be evicted
+        return self._tracking(session) or session.watchers > 0
+
+    def _sweep(self):
+        now = self._last_sweep = time.time()
+        idle = [sid for sid, s in self._open()
+                if sid != DEFAULT_SESSION and not self._busy(s) and now - s.last_active > self.idle_timeout]
+        return [self._evict(sid) for sid in idle]
+
+    def _make_room(self):
+        if len(self._sessions) < self.max_sessions:
+            return []
+        for sid, session in self._open():
+            if sid != DEFAULT_SESSION and not self._busy(session):
+                return [self._evict(sid)]
+        raise SessionLimitError(f"All {self.max_sessions} sessions are busy")
+
+    def _evict(self, session_id):
+        # Under the lock: take it out of the table and mark the id as closing.
+        # The caller closes it once the lock is released (see _close).
+        session = self._sessions.pop(session_id)
+        closed = self._closing[session_id] = Future()
+        self.evicted += 1
+        return session_id, session, closed
+
+    def _close(self, evicted):
+        for session_id, session, closed in evicted:
+            try:
+                session.close()
+            finally:
+                with self._lock:
+                    if self._closing.get(session_id) is closed:
+                        del self._closing[session_id]
+                closed.set_result(None)
+            if self.on_evict:
+                self.on_evict(session_id)
+
+    def start_tracker(self, session):
+        """Start (creating if needed) the session's eye tracker, within max_trackers"""
+        with self._lock:
+            if session in self._starting:
+                raise SessionLimitError("This session's eye tracker is already starting")
+            running = sum(1 for _, s in self._open() if self._tracking(s) and s is not session)
+            if running >= self.max_trackers:
+                raise SessionLimitError(f"{running} eye tracker(s) already running")
+            self._starting.add(session)
+        created = session.tracker is None
+        try:
+            if created:
+                session.tracker = self.tracker_factory(session.focus_changed)
+            session.tracker.start()
+        except BaseException:
+            if created:
+                session.tracker = None
+            raise
+        finally:
+            with self._lock:
+                self._starting.discard(session)
+        return session.tracker
+
+    def close(self):
+        with self._lock:
+            sessions = [s for _, s in self._open()]
+            self._sessions = OrderedDict()
+        for session in sessions:
+            session.close()
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import classification_cache
+from classification_cache import ClassificationCache, normalize_domain
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(classification_cache.time, "time", clock)
+    return clock
+
+def test_normalize_domain():
+    assert normalize_domain(" WWW.Example.COM. ") == "example.com"
+    assert normalize_domain("wwwexample.com") == "wwwexample.com"
+    assert normalize_domain(None) == ""
+
+def test_seeds_answer_without_entries():
+    cache = ClassificationCache(path=None, seeds={"Docs.example.com": "productive"})
+    assert cache.get("www.docs.example.com") == "productive"
+    assert len(cache) == 0
+    assert ClassificationCache(path=None).get("github.com") == "productive"
+
+def test_put_and_get_share_the_normalized_key(clock):
+    cache = ClassificationCache(path=None, seeds=None)
+    cache.put_many({"WWW.News.com": "unproductive", "docs.example.org": "productive"})
+    assert cache.get("news.com") == "unproductive"
+    assert cache.get("docs.example.org.") == "productive"
+    assert cache.get("other.com") is None
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ClassificationCache(path=None, ttl=100, seeds=None)
+    cache.put("a.com", "productive")
+    clock.now += 99
+    assert cache.get("a.com") == "productive"
+    clock.now += 1
+    assert cache.get("a.com") is None
+    assert len(cache) == 0
+
+def test_least_recently_used_is_evicted_first(clock):
+    cache = ClassificationCache(path=None, max_entries=2, seeds=None)
+    cache.put("a.com", "productive")
+    cache.put("b.com", "productive")
+    cache.get("a.com")  # b.com is now the oldest
+    cache.put("c.com", "unproductive")
+    assert cache.get("b.com") is None
+    assert cache.get("a.com") == "productive"
+    assert cache.get("c.com") == "unproductive"
+
+def test_save_and_load_keep_lru_order_and_drop_expired(tmp_path, clock):
+    path = str(tmp_path / "cache.json")
+    cache = ClassificationCache(path=path, ttl=100, max_entries=3, seeds=None)
+    cache.put("old.com", "unproductive")
+    clock.now += 60
+    cache.put_many({"a.com": "productive", "b.com": "productive"})
+    cache.get("a.com")
+    cache.save()
+    with open(path) as f:
+        assert list(json.load(f)) == ["old.com", "b.com", "a.com"]
+
+    clock.now += 50  # old.com is past its TTL by now
+    reloaded = ClassificationCache(path=path, ttl=100, max_entries=2, seeds=None)
+    assert len(reloaded) == 2
+    reloaded.put("c.com", "unproductive")  # evicts b.com, the least recently used
+    assert [reloaded.get(d) for d in ("old.com", "b.com", "a.com")] == [None, None, "productive"]
+
+def test_save_writes_only_when_changed(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ClassificationCache(path=str(path), seeds=None)
+    cache.save()
+    assert not path.exists()
+    cache.put("a.com", "productive")
+    cache.save()
+    assert json.loads(path.read_text())["a.com"][0] == "productive"
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{not json")
+    cache = ClassificationCache(path=str(path), seeds=None)
+    assert len(cache) == 0
+    cache.put("a.com", "productive")
+    cache.save()
+    assert json.loads(path.read_text())["a.com"][0] == "productive"
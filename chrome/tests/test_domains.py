@@ -0,0 +1,36 @@
+import pytest
+
+from domains import domain_of, registrable_domain
+
+@pytest.mark.parametrize("url, domain", [
+    ("https://mail.google.com/inbox?x=1#top", "google.com"),
+    ("HTTPS://User:pw@Docs.Python.ORG/3/", "python.org"),
+    ("https://example.com.", "example.com"),
+    ("https://www.example.com:8443/", "example.com"),
+    # Multi-label public suffixes
+    ("http://foo.bar.co.uk/", "bar.co.uk"),
+    ("https://a.b.example.com.au", "example.com.au"),
+    ("https://me.github.io/blog", "me.github.io"),
+    # Wildcard and exception rules
+    ("https://foo.x.kawasaki.jp", "foo.x.kawasaki.jp"),
+    ("https://www.city.kawasaki.jp", "city.kawasaki.jp"),
+    # Local servers and IPs keep their port
+    ("http://localhost:3000/app", "localhost:3000"),
+    ("http://localhost/", "localhost"),
+    ("https://127.0.0.1:5000/a", "127.0.0.1:5000"),
+    ("http://[::1]:8080/", "[::1]:8080"),
+    ("http://[2001:DB8::1]/", "[2001:db8::1]"),
+])
+def test_domain_of(url, domain):
+    assert domain_of(url) == domain
+
+@pytest.mark.parametrize("url", [
+    "chrome://newtab/", "chrome-extension://abc/popup.html", "about:blank", "file:///tmp/a.html",
+    "view-source:https://example.com", "ftp://example.com", "https://", "www.example.com", "", None, 5,
+])
+def test_non_web_urls_have_no_domain(url):
+    assert domain_of(url) is None
+
+def test_registrable_domain_is_interned():
+    assert registrable_domain("a.example.com") is registrable_domain("b.Example.com")
+    assert registrable_domain("com") == "com"
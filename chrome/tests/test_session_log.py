@@ -0,0 +1,127 @@
+import json
+import os
+import time
+
+import pytest
+
+from session_log import SNAPSHOT_NAME, Aggregate, SessionLog
+from session_store import SessionStore
+from timeline import REORDER_WINDOW, Timeline
+
+T = int(time.time()) - 10000
+
+@pytest.fixture
+def open_log(tmp_path):
+    logs = []
+
+    def open_log():
+        log = SessionLog(str(tmp_path), flush_interval=60)
+        logs.append(log)
+        return log
+
+    yield open_log
+    for log in logs:
+        log.close()
+
+def write_session(log, start=T):
+    log.start_session(start)
+    log.tab_switch("a.com", start)
+    log.focus_change(True, start + 10)
+    log.tab_switch("b.com", start + 30)
+    log.focus_change(False, start + 40)
+    log.tab_switch("a.com", start + 50)
+    log.labels({"a.com": "productive"}, start + 50)
+
+def domains(aggregate):
+    return {name: (d["visits"], d["dwell"], d["focused"])
+            for name, d in aggregate.sessions[aggregate.session]["domains"].items()}
+
+def test_aggregate_replays_the_log(open_log):
+    log = open_log()
+    write_session(log)
+    aggregate = log.aggregate(T + 60)
+    assert domains(aggregate) == {"a.com": (2, 40.0, 20.0), "b.com": (1, 20.0, 10.0)}
+    summary = log.sessions()[log.session_id]
+    assert summary["domains"]["a.com"]["label"] == "productive"
+    assert summary["visits"] == 3
+
+def test_compaction_keeps_totals_and_drops_raw_events(open_log, tmp_path):
+    log = open_log()
+    write_session(log)
+    log.tab_switch("c.com", T + 2 * REORDER_WINDOW)
+    before = domains(log.aggregate(T + 3 * REORDER_WINDOW))
+    log.compact()
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".log")] == [f"{log._active:06d}.log"]
+    with open(tmp_path / SNAPSHOT_NAME) as f:
+        state = json.load(f)["state"]
+    # Only what the reorder window still needs stays as events
+    assert [event["d"] for _, _, event in state["pending"]] == ["c.com"]
+    assert domains(log.aggregate(T + 3 * REORDER_WINDOW)) == before
+
+def test_recover_after_compaction(open_log):
+    log = open_log()
+    write_session(log)
+    log.compact()
+    log.tab_switch("b.com", T + 55)
+    log.close()
+
+    store, timeline = SessionStore(), Timeline()
+    log = open_log()
+    restart = time.time()
+    assert log.recover(store, timeline) == log.session_id
+    assert log.session_start == T
+    assert store.current_domain == "b.com"
+    assert {d: r.count for d, r in store.snapshot().items()} == {"a.com": 2, "b.com": 2}
+    # Downtime after the last event isn't credited to b.com
+    assert timeline.dwell_seconds(T, restart) == pytest.approx({"a.com": 35, "b.com": 20})
+    assert timeline.focused_seconds(T, restart) == pytest.approx({"a.com": 20, "b.com": 10})
+
+def test_recover_seeds_the_timeline_from_folded_totals(open_log):
+    log = open_log()
+    write_session(log)
+    log.tab_switch("c.com", T + 2 * REORDER_WINDOW)  # folds everything before the window
+    log.compact()
+    log.close()
+
+    timeline = Timeline()
+    restart = time.time()
+    open_log().recover(timeline=timeline)
+    assert timeline.dwell_seconds(T, restart) == pytest.approx({"a.com": 2 * REORDER_WINDOW - 20, "b.com": 20})
+    assert timeline.focused_seconds(T, restart) == pytest.approx({"a.com": 20, "b.com": 10})
+
+@pytest.mark.parametrize("damage", [lambda text: text[:len(text) // 2], lambda text: "[]", lambda text: "{}"])
+def test_unreadable_snapshot_falls_back_to_the_segments(open_log, tmp_path, damage):
+    log = open_log()
+    write_session(log)
+    log.compact()
+    log.tab_switch("b.com", T + 60)
+    log.tab_switch("c.com", T + 70)
+    log.close()
+    snapshot_path = tmp_path / SNAPSHOT_NAME
+    snapshot_path.write_text(damage(snapshot_path.read_text()))
+
+    log = open_log()
+    aggregate = log.aggregate(T + 80)
+    assert not snapshot_path.exists()
+    assert (tmp_path / (SNAPSHOT_NAME + ".corrupt")).exists()
+    # The compacted session is gone, but the segments after it are replayed
+    assert {name: dwell for name, (_, dwell, _) in domains(aggregate).items()} == {"b.com": 10.0, "c.com": 10.0}
+
+def test_aggregate_files_late_events_at_their_own_time():
+    aggregate = Aggregate()
+    aggregate.apply({"e": "start", "t": T, "s": "s"})
+    aggregate.apply({"e": "tab", "t": T, "d": "a.com"})
+    aggregate.apply({"e": "focus", "t": T + 10, "f": 1})
+    aggregate.apply({"e": "tab", "t": T + 5, "d": "b.com"})
+    aggregate.close(T + 20)
+    assert domains(aggregate) == {"a.com": (1, 5.0, 0.0), "b.com": (1, 15.0, 10.0)}
+
+def test_aggregate_round_trips_through_its_dict():
+    aggregate = Aggregate()
+    aggregate.apply({"e": "start", "t": T, "s": "s"})
+    aggregate.apply({"e": "tab", "t": T, "d": "a.com"})
+    copy = Aggregate(json.loads(json.dumps(aggregate.to_dict())))
+    for agg in (aggregate, copy):
+        agg.apply({"e": "tab", "t": T + 30, "d": "b.com"})
+        agg.close(T + 40)
+    assert domains(copy) == domains(aggregate) == {"a.com": (1, 30.0, 0.0), "b.com": (1, 10.0, 0.0)}
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from timeline import REORDER_WINDOW, IntervalIndex, Timeline
+
+T = time.time() - 10000  # far enough back that no segment is still open at query time
+
+def test_overlap_counts_only_the_window():
+    index = IntervalIndex()
+    index.append(0, 10)
+    index.append(20, 30)
+    assert index.overlap(0, 30) == 20
+    assert index.overlap(5, 25) == 10
+    assert index.overlap(10, 20) == 0
+    assert index.overlap(-5, 2) == 2
+    assert index.overlap(31, 40) == 0
+
+def test_back_to_back_intervals_merge_and_empty_ones_are_dropped():
+    index = IntervalIndex()
+    index.append(0, 10)
+    index.append(10, 15)
+    index.append(15, 15)
+    assert len(index) == 1
+    assert index.overlap(0, 100) == 15
+
+def test_truncate_cuts_the_spanning_interval():
+    index = IntervalIndex()
+    index.append(0, 10)
+    index.append(20, 30)
+    index.truncate(25)
+    assert index.overlap(0, 100) == 15
+    index.truncate(20)
+    assert len(index) == 1
+    assert index.overlap(0, 100) == 10
+    index.append(12, 14)
+    assert index.overlap(0, 100) == 12
+
+def test_windows_split_dwell_and_focus():
+    timeline = Timeline(start=T)
+    timeline.tab_switch("a.com", T)
+    timeline.focus_change(True, T + 10)
+    timeline.tab_switch("b.com", T + 30)
+    timeline.focus_change(False, T + 40)
+    timeline.tab_switch("a.com", T + 50)
+    timeline.tab_switch(None, T + 60)
+    assert timeline.dwell_seconds(T, T + 60) == {"a.com": 40, "b.com": 20}
+    assert timeline.focused_seconds(T, T + 60) == {"a.com": 20, "b.com": 10}
+    assert timeline.dwell_seconds(T + 25, T + 35) == {"a.com": 5, "b.com": 5}
+
+def test_open_segment_counts_up_to_now():
+    now = time.time()
+    timeline = Timeline(start=now - 20)
+    timeline.tab_switch("a.com", now - 20)
+    assert timeline.dwell_seconds()["a.com"] == pytest.approx(20, abs=1)
+    assert timeline.focused_seconds() == {}
+
+def test_late_tab_event_is_filed_at_its_own_time():
+    timeline = Timeline(start=T)
+    timeline.tab_switch("a.com", T)
+    timeline.focus_change(True, T + 10)
+    timeline.tab_switch("b.com", T + 5)  # arrives after the focus flip
+    assert timeline.dwell_seconds(T, T + 20) == {"a.com": 5, "b.com": 15}
+    assert timeline.focused_seconds(T, T + 20) == {"b.com": 10}
+    assert timeline.current_domain == "b.com"
+
+def test_late_event_matches_the_same_events_in_order():
+    events = [("tab", "a.com", 0), ("tab", "b.com", 7), ("focus", True, 12), ("tab", "c.com", 20),
+              ("tab", "a.com", 31), ("focus", False, 40), ("tab", None, 50)]
+    in_order, shuffled = Timeline(start=T), Timeline(start=T)
+    for timeline, order in ((in_order, events), (shuffled, events[:1] + events[2:4] + events[1:2] + events[4:])):
+        for kind, value, t in order:
+            if kind == "tab":
+                timeline.tab_switch(value, T + t)
+            else:
+                timeline.focus_change(value, T + t)
+    for query in ("dwell_seconds", "focused_seconds"):
+        assert getattr(shuffled, query)(T, T + 50) == getattr(in_order, query)(T, T + 50)
+
+def test_events_older_than_the_reorder_window_are_clamped():
+    timeline = Timeline(start=T)
+    timeline.tab_switch("a.com", T)
+    timeline.tab_switch("b.com", T + 2 * REORDER_WINDOW)
+    timeline.tab_switch("c.com", T + 10)  # too late to go back that far: filed at the window's edge
+    end = T + 2 * REORDER_WINDOW + 10
+    assert timeline.dwell_seconds(T, end) == {"a.com": REORDER_WINDOW, "c.com": REORDER_WINDOW, "b.com": 10}
+
+def test_seed_restores_totals_before_new_events():
+    timeline = Timeline(start=T)
+    timeline.seed({"a.com": 30.0, "b.com": 10.0}, {"a.com": 20.0}, T + 40)
+    timeline.tab_switch("b.com", T + 40)
+    timeline.tab_switch(None, T + 50)
+    assert timeline.dwell_seconds(T, T + 50) == {"a.com": 30, "b.com": 20}
+    assert timeline.focused_seconds(T, T + 50) == {"a.com": 20}
+
+def test_skip_to_drops_the_gap():
+    timeline = Timeline(start=T)
+    timeline.tab_switch("a.com", T)
+    timeline.skip_to(T + 100)
+    timeline.tab_switch(None, T + 110)
+    assert timeline.dwell_seconds(T, T + 200) == {"a.com": 10}
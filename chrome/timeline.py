@@ -0,0 +1,208 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+# Seconds a tab or focus event may arrive late (e.g. in a delayed
+# /track/batch) and still be filed at its own time; older ones are placed
+# at the edge of the window
+REORDER_WINDOW = 300.0
+
+class IntervalIndex:
+    """Sorted, non-overlapping [start, end) intervals with prefix sums of their lengths"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.prefix = [0.0]  # prefix[k] = total length of the first k intervals
+
+    def append(self, start, end):
+        if end <= start:
+            return
+        if self.ends and self.ends[-1] == start:
+            # Back-to-back segments (e.g. a focus flip on the same tab) merge
+            self.ends[-1] = end
+            self.prefix[-1] += end - start
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+        self.prefix.append(self.prefix[-1] + end - start)
+
+    def truncate(self, t):
+        """Drop everything after `t`, cutting short an interval that spans it"""
+        k = bisect_left(self.starts, t)  # intervals [k:] start at or after t
+        del self.starts[k:], self.ends[k:], self.prefix[k + 1:]
+        if self.ends and self.ends[-1] > t:
+            self.prefix[-1] -= self.ends[-1] - t
+            self.ends[-1] = t
+
+    def overlap(self, t0, t1):
+        """Total length of the intervals inside [t0, t1], in O(log n)"""
+        i = bisect_right(self.ends, t0)   # first interval ending after t0
+        j = bisect_left(self.starts, t1)  # intervals [0, j) start before t1
+        if i >= j:
+            return 0.0
+        total = self.prefix[j] - self.prefix[i]
+        total -= max(0.0, t0 - self.starts[i])
+        total -= max(0.0, self.ends[j - 1] - t1)
+        return total
+
+    def __len__(self):
+        return len(self.starts)
+
+class Timeline:
+    """Per-domain dwell and focused time built from tab-switch and focus events.
+
+    Every tab switch or focus flip closes the segment since the previous event
+    and files it under the domain that was active, plus under that domain's
+    focused index if the tracker saw the student's eyes. Queries over any
+    [t0, t1] window are then a couple of binary searches per domain, and none
+    of it depends on how often the video loop runs.
+
+    Events normally arrive in time order. One that lands earlier than the
+    last (a batched tab event, say) is inserted at its own time: the
+    intervals after it are cut off and the events since are replayed, so
+    only the last `window` seconds of events are kept for that.
+    """
+
+    def __init__(self, start=None, window=REORDER_WINDOW):
+        self._lock = threading.Lock()
+        self._domain = None
+        self._focused = False
+        self._arrivals = 0  # orders events that share a timestamp
+        self.window = window
+        self.reset(start)
+
+    def reset(self, start=None):
+        """Drop recorded intervals; the current tab and focus state carry over"""
+        with self._lock:
+            self._since = start if start is not None else time.time()
+            self._dwell = {}
+            self._focus = {}
+            self._settle()
+
+    def _settle(self):
+        # Forget the events so far: nothing may move before _since any more
+        self._events = []  # (t, arrival, kind, value), sorted
+        self._floor = self._since
+        self._floor_state = (self._domain, self._focused)
+
+    def _advance(self, t):
+        if self._domain is not None and t > self._since:
+            self._dwell.setdefault(self._domain, IntervalIndex()).append(self._since, t)
+            if self._focused:
+                self._focus.setdefault(self._domain, IntervalIndex()).append(self._since, t)
+        self._since = max(self._since, t)
+
+    def _apply(self, t, kind, value):
+        self._advance(t)
+        if kind == "tab":
+            self._domain = value
+        else:
+            self._focused = value
+
+    def _record(self, kind, value, t):
+        t = max(t, self._floor)
+        self._arrivals += 1
+        event = (t, self._arrivals, kind, value)
+        if t >= self._since:
+            self._events.append(event)
+            self._apply(t, kind, value)
+        else:
+            insort(self._events, event)
+            self._replay_from(bisect_left(self._events, event))
+        self._forget(self._since - self.window)
+
+    def _replay_from(self, i):
+        # Rewind to events[i] and apply it and everything after it again
+        t = self._events[i][0]
+        domain, focused = self._floor_state
+        for _, _, kind, value in self._events[:i]:
+            if kind == "tab":
+                domain = value
+            else:
+                focused = value
+        for indexes in (self._dwell, self._focus):
+            for name in list(indexes):
+                indexes[name].truncate(t)
+                if not len(indexes[name]):
+                    del indexes[name]
+        self._since, self._domain, self._focused = t, domain, focused
+        for t, _, kind, value in self._events[i:]:
+            self._apply(t, kind, value)
+
+    def _forget(self, cutoff):
+        # Events older than the reorder window can't be replayed any more
+        if cutoff <= self._floor:
+            return
+        k = bisect_left(self._events, (cutoff,))
+        domain, focused = self._floor_state
+        for _, _, kind, value in self._events[:k]:
+            if kind == "tab":
+                domain = value
+            else:
+                focused = value
+        del self._events[:k]
+        self._floor, self._floor_state = cutoff, (domain, focused)
+
+    def seed(self, dwell, focused, end):
+        """Start from per-domain totals accumulated before `end` (e.g. a compacted log).
+
+        Each total becomes one interval ending at `end`, so a window that
+        covers all of them is exact and one that cuts into them is an estimate.
+        """
+        with self._lock:
+            for name, totals in (("_dwell", dwell), ("_focus", focused)):
+                indexes = getattr(self, name)
+                for domain, seconds in totals.items():
+                    if seconds > 0:
+                        indexes.setdefault(domain, IntervalIndex()).append(end - seconds, end)
+            self._since = max(self._since, end)
+            self._settle()
+
+    def skip_to(self, t):
+        """Move the clock to `t` without crediting the gap (e.g. downtime before a restart)"""
+        with self._lock:
+            self._since = max(self._since, t)
+            self._settle()
+
+    def tab_switch(self, domain, t=None):
+        t = t if t is not None else time.time()
+        with self._lock:
+            # Kept even when it repeats the current tab: a late event may yet
+            # land before it and make it a switch back
+            self._record("tab", domain, t)
+
+    def focus_change(self, focused, t=None):
+        t = t if t is not None else time.time()
+        with self._lock:
+            # The video loop reports focus every frame, in order; only flips
+            # are kept (a late focus event is still placed at its own time)
+            if focused == self._focused and t >= self._since:
+                return
+            self._record("focus", focused, t)
+
+    @property
+    def current_domain(self):
+        return self._domain
+
+    def _query(self, name, t0, t1, focused_only):
+        now = time.time()
+        t0 = t0 if t0 is not None else float("-inf")
+        t1 = t1 if t1 is not None else now
+        with self._lock:
+            indexes = getattr(self, name)
+            result = {domain: index.overlap(t0, t1) for domain, index in indexes.items()}
+            # The segment since the last event is still open; count it up to now
+            if self._domain is not None and (self._focused or not focused_only):
+                start, end = max(self._since, t0), min(now, t1)
+                if end > start:
+                    result[self._domain] = result.get(self._domain, 0.0) + end - start
+        return result
+
+    def dwell_seconds(self, t0=None, t1=None):
+        """Seconds each domain was the active tab during [t0, t1]"""
+        return self._query("_dwell", t0, t1, focused_only=False)
+
+    def focused_seconds(self, t0=None, t1=None):
+        """Seconds each domain was active while the tracker saw the student focused"""
+        return self._query("_focus", t0, t1, focused_only=True)
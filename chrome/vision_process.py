@@ -0,0 +1,343 @@
+"""Capture and detection in a child process, shared with the server through shared memory.
+
+The child owns the camera and the (motion-gated) detector and writes each
+frame, with its eye points, into a FrameRing: a few frame slots in one
+multiprocessing.shared_memory block that the parent maps and reads in place.
+Only focus flips and a once-a-second frame count travel back on a queue, so
+nothing the vision loop does holds the server's GIL and a busy server can't
+stall the camera. VisionProcess restarts the child when it crashes or stops
+delivering frames.
+"""
+import multiprocessing as mp
+import queue
+import signal
+import sys
+import threading
+import time
+import types
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import metrics
+
+RING_SLOTS = 4
+MAX_EYES = 4
+# Seconds without a new frame before a running child counts as hung
+STALL_TIMEOUT = 10.0
+# Back-to-back failed restarts before giving up; a child that ran for
+# HEALTHY_RUN seconds resets the count and the backoff
+MAX_RESTARTS = 5
+HEALTHY_RUN = 60.0
+MAX_BACKOFF = 30.0
+
+SLOT = np.dtype([("seq", "i8"), ("captured_at", "f8"), ("focused", "?"),
+                 ("eyes", "i4"), ("eye_xy", "i4", (MAX_EYES, 2))])
+
+RingFrame = namedtuple("RingFrame", "seq captured_at focused eyes frame")
+
+restarts = metrics.counter("miza_vision_restarts_total", "Vision process restarts, by reason",
+                           labels=("reason",))
+
+class FrameRing:
+    """Frame slots plus per-slot detection results in one shared-memory block.
+
+    One writer, any number of readers. A slot's seq is -1 while it is being
+    written and the frame's sequence number after, and `head` is the newest
+    complete seq, so readers never wait on the writer: read() returns None
+    for a slot that has already moved on, and valid() tells whether a frame
+    view was overwritten while it was in use.
+    """
+
+    def __init__(self, shm, shape, slots=RING_SLOTS):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.info = np.ndarray((slots,), SLOT, shm.buf)
+        offset = SLOT.itemsize * slots
+        self.head = np.ndarray((1,), np.int64, shm.buf, offset)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, shm.buf, offset + 8)
+
+    @classmethod
+    def create(cls, shape, slots=RING_SLOTS):
+        size = SLOT.itemsize * slots + 8 + slots * int(np.prod(shape))
+        ring = cls(shared_memory.SharedMemory(create=True, size=size), shape, slots)
+        ring.info["seq"] = -1
+        ring.head[0] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots=RING_SLOTS):
+        return cls(shared_memory.SharedMemory(name=name), shape, slots)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, seq, captured_at, frame, focused, eye_points):
+        i = seq % self.slots
+        info = self.info
+        info["seq"][i] = -1
+        self.frames[i] = frame
+        n = min(len(eye_points), MAX_EYES)
+        info["captured_at"][i] = captured_at
+        info["focused"][i] = focused
+        info["eyes"][i] = n
+        if n:
+            info["eye_xy"][i, :n] = eye_points[:n]
+        info["seq"][i] = seq
+        self.head[0] = seq
+
+    def read(self, seq):
+        """Slot `seq` with a view of its frame, or None if it has been overwritten"""
+        i = seq % self.slots
+        info = self.info
+        captured_at = float(info["captured_at"][i])
+        focused = bool(info["focused"][i])
+        eyes = info["eye_xy"][i, :info["eyes"][i]].copy()
+        if info["seq"][i] != seq:
+            return None
+        return RingFrame(seq, captured_at, focused, eyes, self.frames[i])
+
+    def latest(self):
+        seq = int(self.head[0])
+        return self.read(seq) if seq >= 0 else None
+
+    def valid(self, seq):
+        return self.info["seq"][seq % self.slots] == seq
+
+    def close(self):
+        self.info = self.head = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a reader still holds a frame view; the mapping goes with the process
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def _worker(source, events, stop, slots):
+    # `stop` is a shared byte, not an mp.Event: a child killed while waiting
+    # on an Event leaves its condition broken and the parent's set() hangs
+    # Ctrl+C reaches the whole process group; the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    from detection import make_detector
+    from frame_source import open_source
+    from motion import AdaptiveRate, MOTION_GATE, gated
+    from pipeline import inline_detections
+
+    parent = mp.parent_process()
+    cap = open_source(source)
+    if not cap.isOpened():
+        events.put(("error", "Could not open webcam"))
+        raise SystemExit(1)
+    detector = gated(make_detector())
+    rate = AdaptiveRate(max_fps=getattr(cap, "fps", 30.0)) if MOTION_GATE else None
+    ring = None
+    focused = False
+    seq = 0
+    last_stats = time.time()
+    try:
+        for captured_at, frame, results in inline_detections(cap, detector):
+            if stop.value or not parent.is_alive():
+                break
+            if ring is None:
+                ring = FrameRing.create(frame.shape, slots)
+                events.put(("ring", ring.name, frame.shape))
+            points = [(x + ex + ew // 2, y + ey + eh // 2)
+                      for (x, y, w, h), eyes in results for (ex, ey, ew, eh) in eyes]
+            eyes_detected = bool(points)
+            ring.write(seq, captured_at, frame, eyes_detected, points)
+            seq += 1
+            if eyes_detected != focused:
+                events.put(("focus", eyes_detected, captured_at))
+            if captured_at - last_stats >= 1.0:
+                events.put(("stats", seq, time.process_time()))
+                last_stats = captured_at
+            if rate is not None:
+                rate.observe(eyes_detected != focused or detector.moved, captured_at)
+                wait = rate.interval - (time.time() - captured_at)
+                if wait > 0:
+                    time.sleep(wait)
+            focused = eyes_detected
+    finally:
+        cap.release()
+        events.put(("stats", seq, time.process_time()))
+        if ring is not None:
+            ring.close()  # the parent unlinks it
+
+_main_lock = threading.Lock()
+
+def _start_without_main(process):
+    # A spawned or forkserver child first re-runs the parent's __main__ so
+    # that objects defined there unpickle. The server's main is combined.py,
+    # which opens and resumes session logs at import, and _worker needs
+    # nothing from it, so the child is started while __main__ is a blank
+    # module: with no __file__, multiprocessing leaves main alone.
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            process.start()
+        finally:
+            sys.modules["__main__"] = main
+
+class VisionProcess:
+    """Runs the vision loop in a child process and keeps it running.
+
+    on_focus(focused, t) is called from the supervisor thread for every
+    focus flip, and with False when a child dies while focused. latest() and
+    read() give the parent zero-copy access to the ring. `done` is set once
+    the source has ended, stop() was called or restarts gave up.
+    """
+
+    def __init__(self, source=None, on_focus=None, slots=RING_SLOTS,
+                 stall_timeout=STALL_TIMEOUT, max_restarts=MAX_RESTARTS):
+        self.source = source
+        self.on_focus = on_focus
+        self.slots = slots
+        self.stall_timeout = stall_timeout
+        self.max_restarts = max_restarts
+        # Not fork: the server is multithreaded and may have used OpenCV
+        # already, and a forked child can inherit a lock some other thread held
+        self._ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+        self._stop = threading.Event()
+        self._stop_flag = self._ctx.RawValue("b", 0)
+        self.done = threading.Event()
+        self.ring = None
+        self._rings = []
+        self.focused = False
+        self.restarts = 0
+        self.frames = 0
+        self.cpu = 0.0
+        self._process = None
+        self._events = None
+        self._thread = None
+
+    def start(self):
+        # Rings get registered with this process's tracker, not one that a
+        # dying child would take down (unlinking the ring) with it
+        resource_tracker.ensure_running()
+        self._spawn()
+        self._thread = threading.Thread(target=self._supervise, daemon=True, name="vision-supervisor")
+        self._thread.start()
+        return self
+
+    def _spawn(self):
+        self._events = self._ctx.Queue()
+        self._process = self._ctx.Process(target=_worker, name="miza-vision", daemon=True,
+                                          args=(self.source, self._events, self._stop_flag, self.slots))
+        _start_without_main(self._process)
+        self._started_at = self._seen_at = time.time()
+        self._seen = -1
+        self._killed = False
+        self._run_frames = 0
+        self._run_cpu = 0.0
+
+    def _handle(self, event):
+        kind = event[0]
+        if kind == "ring":
+            _, name, shape = event
+            if self.ring is not None:
+                # Nothing attaches to a retired ring again, but it stays
+                # mapped until stop() since a reader may still hold a view
+                self.ring.unlink()
+            self.ring = FrameRing.attach(name, shape, self.slots)
+            self._rings.append(self.ring)
+        elif kind == "focus":
+            self._set_focus(event[1], event[2])
+        elif kind == "stats":
+            self._run_frames, self._run_cpu = event[1], event[2]
+        elif kind == "error":
+            print(f"Vision process: {event[1]}", flush=True)
+
+    def _set_focus(self, focused, t):
+        if focused != self.focused:
+            self.focused = focused
+            if self.on_focus:
+                self.on_focus(focused, t)
+
+    def _drain(self):
+        while True:
+            try:
+                self._handle(self._events.get_nowait())
+            except (queue.Empty, OSError, ValueError):
+                return
+
+    def _stalled(self):
+        seq = int(self.ring.head[0]) if self.ring is not None else -1
+        now = time.time()
+        if seq != self._seen:
+            self._seen, self._seen_at = seq, now
+        return now - self._seen_at > self.stall_timeout
+
+    def _supervise(self):
+        failures = 0
+        backoff = 1.0
+        while True:
+            try:
+                self._handle(self._events.get(timeout=0.5))
+                continue
+            except queue.Empty:
+                pass
+            if self._process.is_alive():
+                if not self._stop.is_set() and self._stalled():
+                    print(f"Vision process delivered no frame for {self.stall_timeout:.0f}s; restarting",
+                          flush=True)
+                    restarts.inc("stall")
+                    self._killed = True
+                    self._process.kill()
+                continue
+
+            self._process.join()
+            self._drain()
+            self.frames += self._run_frames
+            self.cpu += self._run_cpu
+            self._set_focus(False, time.time())
+            code = self._process.exitcode
+            if self._stop.is_set() or code == 0:
+                break  # stopped, or the recording ran out
+            if time.time() - self._started_at >= HEALTHY_RUN:
+                failures, backoff = 0, 1.0
+            if failures >= self.max_restarts:
+                print(f"Vision process failed {failures} times in a row; giving up", flush=True)
+                break
+            failures += 1
+            self.restarts += 1
+            if not self._killed:
+                restarts.inc("crash")
+            print(f"Vision process exited with code {code}; restarting in {backoff:.0f}s", flush=True)
+            if self._stop.wait(backoff):
+                break
+            backoff = min(MAX_BACKOFF, backoff * 2)
+            self._spawn()
+        self.done.set()
+
+    def latest(self):
+        ring = self.ring
+        return ring.latest() if ring is not None else None
+
+    def read(self, seq):
+        ring = self.ring
+        return ring.read(seq) if ring is not None else None
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._stop_flag.value = 1
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.ring = None
+        for ring in self._rings:
+            ring.close()
+            ring.unlink()
+        self._rings = []
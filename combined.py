@@ -1,41 +1,72 @@
-import cv2
-import numpy as np
 import time
-from datetime import datetime
-from flask import Flask, request, jsonify
-from urllib.parse import urlparse
+STARTED_AT = time.perf_counter()
+from flask import Flask, Response, g, request, stream_with_context
 import threading
 import os
-import matplotlib.pyplot as plt
-import requests
-import google.generativeai as genai
+import sys
+import argparse
+import signal
+import atexit
+from concurrent.futures import TimeoutError
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
-# Combined functionality of eye tracker, Flask server, and Gemini analyzer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome"))
+from live import LiveFeed
+import metrics
+from domains import domain_of
+from session_log import DEFAULT_LOG_DIR
+from report import FORMATS, ReportRenderer
+import preview as preview_stream
+from sessions import DEFAULT_SESSION, BatchTooLargeError, SessionLimitError, SessionManager, request_session_id
+# Combined functionality of eye tracker, Flask server, and Gemini analyzer.
+# cv2, matplotlib and the Gemini SDK are imported where they're first used,
+# so the /track server is up before any of them has loaded.
+
+# Seconds from launch until /track takes requests; print a warning past this
+STARTUP_BUDGET = float(os.environ.get("MIZA_STARTUP_BUDGET", "1.0"))
+startup_seconds = metrics.histogram("miza_startup_seconds", "Seconds from process start to each startup milestone",
+                                    labels=("milestone",))
 
 # --------------- Flask Server Setup ---------------
 app = Flask(__name__)
+# Request timing plus /metrics; first so it also times requests rejected below
+metrics.instrument_flask(app)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-current_url = "unknown"
-current_domain = "unknown"
-domain_history = {}
-domain_times = {}
-_analyzer_enabled = False
-
-def get_domain_root(url):
-    parsed = urlparse(url)
-    domain = parsed.netloc.lower()
-    if domain.startswith("www."):
-        domain = domain[4:]
-    return domain
+# One store, timeline and durable log per browser profile (session id);
+# the logs are kept apart from chrome/server.py's so both can run at once
+# Session charts are drawn on a worker thread and cached (chrome/report.py)
+reports = ReportRenderer()
+REPORT_TIMEOUT = 30.0
+sessions = SessionManager(log_dir=DEFAULT_LOG_DIR + "-combined", on_evict=reports.forget)
+atexit.register(sessions.close)
+# The webcam belongs to whoever sits at this machine: the default session.
+# Dwell time per domain comes from its tab switches and eye-tracker focus
+# flips rather than from the video loop.
+local = sessions.get(DEFAULT_SESSION)
+store, timeline = local.store, local.timeline
+# Downscaled MJPEG of the annotated feed at /preview; encodes only while watched
+preview = preview_stream.PreviewStream()
+# Latest focus reading from the eye tracker loop, pushed to /stream clients
+focus_state = {"focused": False, "focus_pct": 0.0}
+
+def live_focus(session):
+    # Only the local session has a camera behind it
+    return dict(focus_state) if session is local else None
+
+@app.before_request
+def load_session():
+    try:
+        g.session = sessions.get(request_session_id(request))
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    except SessionLimitError as e:
+        return {"status": "error", "message": str(e)}, 503
 
 @app.route('/track', methods=['POST', 'OPTIONS'])
 def track_url():
-    global current_url, current_domain, domain_history, domain_times
-    
     # Handle preflight requests
     if request.method == 'OPTIONS':
         response = app.make_response("")
@@ -48,107 +79,173 @@ def track_url():
     if not data:
         return {"status": "error", "message": "No data received"}, 400
 
-    url = data.get('url', 'unknown')
-    domain = get_domain_root(url)
-    current_url = url
-    current_domain = domain
-
-    now = datetime.now()
-    if domain in domain_history:
-        domain_history[domain]['count'] += 1
-        domain_history[domain]['last_seen'] = now
-    else:
-        domain_history[domain] = {
-            'first_seen': now,
-            'last_seen': now,
-            'count': 1
-        }
-
-    # Ensure domain_times has an entry
-    if domain not in domain_times:
-        domain_times[domain] = 0.0
+    url = data.get('url', 'unknown') if isinstance(data, dict) else None
+    if not isinstance(url, str):
+        return {"status": "error", "message": "Expected {\"url\": \"...\"}"}, 400
+    domain = domain_of(url)
+    if domain is None:
+        # chrome://, file:// and other non-web pages aren't tracked
+        return {"status": "ignored"}
+    if not g.session.track(url, domain):
+        return {"status": "error", "message": "Domain limit reached for this session"}, 429
 
     print(f"[TRACKED] {domain}", flush=True)
     return {"status": "ok"}
 
+@app.route('/track/batch', methods=['POST'])
+def track_batch():
+    # [{"url", "t"}] buffered by the extension; t is the client's ms timestamp
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return {"status": "error", "message": "Expected {\"events\": [...]}"}, 400
+    try:
+        accepted, rejected = g.session.track_batch(data['events'], domain_of)
+    except BatchTooLargeError as e:
+        return {"status": "error", "message": str(e)}, 413
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    print(f"[TRACKED] {accepted} batched events", flush=True)
+    return {"status": "ok", "accepted": accepted, "rejected": rejected}
+
 @app.route('/domains', methods=['GET'])
 def get_domains():
     try:
-        serializable_history = {}
-        for domain, data in domain_history.items():
-            serializable_history[domain] = {
-                'first_seen': data['first_seen'].strftime('%Y-%m-%d %H:%M:%S'),
-                'last_seen': data['last_seen'].strftime('%Y-%m-%d %H:%M:%S'),
-                'count': data['count']
-            }
-        return serializable_history
+        return g.session.store.to_json()
     except Exception as e:
         print(f"Error in get_domains: {e}")
         return {"error": str(e)}, 500
 
-def run_flask_server():
-    print("Starting Flask server on http://127.0.0.1:5002", flush=True)
-    app.run(host='127.0.0.1', port=5002, debug=False)
-
-# --------------- Gemini Analyzer ---------------
-def setup_analyzer():
-    global _analyzer_enabled
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        try:
-            with open('.api_key', 'r') as key_file:
-                api_key = key_file.read().strip()
-        except FileNotFoundError:
-            _analyzer_enabled = False
-            return False
+@app.route('/domains/time', methods=['GET'])
+def get_domain_times():
+    # Optional ?start=&end= window as unix timestamps; defaults to the whole session
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    timeline = g.session.timeline
+    return {
+        "dwell": timeline.dwell_seconds(start, end),
+        "focused": timeline.focused_seconds(start, end),
+    }
+
+@app.route('/history/sessions', methods=['GET'])
+def history_sessions():
+    return g.session.log.sessions()
+
+@app.route('/history/days', methods=['GET'])
+def history_days():
+    return g.session.log.days()
+
+@app.route('/summary', methods=['GET'])
+def session_summary():
+    # Live totals for focus-wrapped: focus time, dwell per domain, productive split
+    return g.session.summary.to_json(label_of=cached_label)
+
+@app.route('/summary/report', methods=['GET'])
+def summary_report():
+    fmt = request.args.get('format', 'png')
+    if fmt not in FORMATS:
+        return {"status": "error", "message": f"format must be one of {', '.join(FORMATS)}"}, 400
+    summary = g.session.summary.to_json(label_of=cached_label)
     try:
-        genai.configure(api_key=api_key)
-        _analyzer_enabled = True
-        return True
-    except Exception:
-        _analyzer_enabled = False
-        return False
-
-def analyze_productivity(domain):
-    if not _analyzer_enabled and not setup_analyzer():
-        return "productive"
-    prompt = f"""You are an assistant helping students stay on task.
-Given a single website domain, decide whether it is productive or unproductive for a typical study session.
-Respond with exactly one of these two words (no extra text):
+        image = reports.report(g.session.id, summary, fmt).result(timeout=REPORT_TIMEOUT)
+    except TimeoutError:
+        return {"status": "error", "message": f"Report not rendered within {REPORT_TIMEOUT:.0f}s"}, 504
+    return Response(image, mimetype=FORMATS[fmt])
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    # Server-Sent Events: a snapshot, then only focus/domain deltas as they change
+    session = g.session
+    feed = LiveFeed(session.store, lambda: live_focus(session), session=session)
+    return Response(stream_with_context(feed.events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/preview', methods=['GET'])
+def preview_mjpeg():
+    preview_stream.preview_viewers.inc("mjpeg")
+    return Response(preview.mjpeg(), mimetype=preview_stream.MIMETYPE,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/preview.jpg', methods=['GET'])
+def preview_jpeg():
+    preview_stream.preview_viewers.inc("jpeg")
+    image = preview.snapshot()
+    if image is None:
+        return {"status": "error", "message": "No camera frames yet"}, 503
+    return Response(image, mimetype="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+@app.route('/vision/stop', methods=['POST'])
+def stop_vision():
+    stop_event.set()
+    return {"status": "ok"}
 
-productive
-unproductive
+# Set once the server socket is listening, so callers don't have to guess
+server_ready = threading.Event()
+
+def run_flask_server(asgi=False):
+    if asgi:
+        # Same routes on asyncio (optional starlette + uvicorn)
+        from asgi_server import create_app, serve
+        import productivity_analyzer
+        print("Starting ASGI server on http://127.0.0.1:5002", flush=True)
+        serve(create_app(sessions, domain_of, live_focus, analyzer=productivity_analyzer,
+                         on_vision_stop=stop_event.set, reports=reports, preview=preview),
+              port=5002, ready=server_ready)
+        return
+    # What app.run() does, minus the banner, but the socket is bound by the
+    # time make_server returns
+    from werkzeug.serving import make_server
+    print("Starting Flask server on http://127.0.0.1:5002", flush=True)
+    httpd = make_server('127.0.0.1', 5002, app, threaded=True)
+    server_ready.set()
+    httpd.serve_forever()
+
+def wait_for_server(timeout=10.0):
+    """Block until the server is listening; reports the cold start against STARTUP_BUDGET"""
+    if not server_ready.wait(timeout):
+        print(f"Warning: server not ready after {timeout:.0f}s", flush=True)
+        return False
+    elapsed = time.perf_counter() - STARTED_AT
+    startup_seconds.observe(elapsed, "server_ready")
+    over = f" (over the {STARTUP_BUDGET:.2f}s budget)" if elapsed > STARTUP_BUDGET else ""
+    print(f"Server ready in {1000 * elapsed:.0f} ms{over}", flush=True)
+    return True
 
-Website: {domain}
-"""
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
-    try:
-        resp = model.generate_content(prompt)
-        res = resp.text.strip().lower()
-        return res if res in ("productive", "unproductive") else "productive"
-    except:
-        return "productive"
+# --------------- Gemini Analyzer ---------------
+# Classification, including the on-disk label cache, is shared with the
+# extension backend in chrome/productivity_analyzer.py. Importing it is
+# cheap: Gemini gets configured on a background thread.
+from productivity_analyzer import analyze_domains, cached_label
 
-def list_available_models():
-    try:
-        models = genai.list_models()
-        print("Available models:", models)
-    except Exception as e:
-        print("Error listing available models:", e)
+def label_in_background(domains):
+    labels = analyze_domains(domains)
+    local.log.labels(labels)
+    return labels
 
-# Initialize the analyzer when imported
-setup_analyzer()
+# The local session's domains are labelled as they show up, off the request path
+local.summary.classifier = label_in_background
 
 # --------------- Eye Tracker ---------------
-def run_eye_tracker():
-    cap = cv2.VideoCapture(0)
+SUMMARY_PLOT_PATH = "session_summary.png"
+# Top sampling rate of the inline loop; the camera rarely delivers more
+CAMERA_FPS = 30
+
+# Set by POST /vision/stop or SIGTERM to end the tracking loop
+stop_event = threading.Event()
+
+def run_eye_tracker(heatmap_export=None, headless=False, source=None, workers=0):
+    # OpenCV and everything built on it load here, after the server is up
+    import cv2
+    from heatmap import AttentionHeatmap
+    from detection import make_detector
+    from frame_source import open_source
+    from pipeline import DetectionPipeline, inline_detections
+    from motion import AdaptiveRate, MOTION_GATE, gated
+
+    cap = open_source(source)
     if not cap.isOpened():
         print("Error: Could not open webcam")
         return
 
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-
     eye_positions = []
     max_positions = 30
     ret, frame = cap.read()
@@ -156,151 +253,268 @@ def run_eye_tracker():
         print("Error: Failed to capture initial frame")
         return
 
-    heatmap = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.float32)
+    heatmap = AttentionHeatmap(frame.shape)
+    startup_seconds.observe(time.perf_counter() - STARTED_AT, "camera_ready")
     start_time = time.time()
+    # The summary (and /summary) covers this tracking run
+    local.summary.reset(start_time)
     last_print = start_time
     print_interval = 1.0  # seconds between prints
     focus_time = 0
     last_time = start_time
 
+    # Haar by default (full-frame search only on keyframes); MIZA_DETECTOR
+    # switches to a cv2.dnn backend. With workers, capture and detection run
+    # on their own threads and this loop only consumes the freshest results.
+    # Either way a motion gate reuses the last result while nothing moves;
+    # inline, the loop also samples less often while focus holds steady.
+    pipeline = rate = None
+    if workers:
+        pipeline = DetectionPipeline(cap, lambda: gated(make_detector()), workers=workers).start()
+        detections = pipeline.results()
+    else:
+        detector = gated(make_detector())
+        detections = inline_detections(cap, detector)
+        if MOTION_GATE:
+            rate = AdaptiveRate(max_fps=CAMERA_FPS)
+    was_focused = False
+
+    frame_cpu = 0.0  # CPU seconds spent by this thread per frame
+    frames = 0
+    cpu_mark = time.thread_time()
+
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+        for captured_at, frame, results in detections:
+            if stop_event.is_set():
                 break
-            display = frame.copy()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            frame_start = time.perf_counter()
+            # Headless: no annotated copy, no drawing and no HighGUI windows
+            display = None if headless else frame.copy()
             eyes_detected = False
+            points = []
 
-            for (x, y, w, h) in faces:
-                roi_gray = gray[y:y+h, x:x+w]
-                roi_color = display[y:y+h, x:x+w]
-                eyes = eye_cascade.detectMultiScale(roi_gray)
+            for (x, y, w, h), eyes in results:
                 if len(eyes) > 0:
                     eyes_detected = True
                 for (ex, ey, ew, eh) in eyes:
                     eye_center_x = x + ex + ew // 2
                     eye_center_y = y + ey + eh // 2
-                    cv2.circle(heatmap, (eye_center_x, eye_center_y), 30, 0.1, -1)
+                    heatmap.add(eye_center_x, eye_center_y)
+                    points.append((eye_center_x, eye_center_y))
+                    if headless:
+                        continue
                     eye_positions.append((eye_center_x, eye_center_y))
                     if len(eye_positions) > max_positions:
                         eye_positions.pop(0)
+                    roi_color = display[y:y+h, x:x+w]
                     cv2.rectangle(roi_color, (ex, ey), (ex + ew, ey + eh), (0, 255, 0), 2)
                     cv2.circle(display, (eye_center_x, eye_center_y), 2, (0, 0, 255), -1)
 
+            # Credit focus by when the frame was captured, not when it was processed
             if eyes_detected:
-                focus_time += (time.time() - last_time)
-
-            for i in range(1, len(eye_positions)):
-                intensity = int(255 * (i / len(eye_positions)))
-                cv2.line(display, eye_positions[i - 1], eye_positions[i],
-                         (0, intensity, 255 - intensity), 1)
-
-            hm_norm = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX)
-            hm_color = cv2.applyColorMap(np.uint8(hm_norm), cv2.COLORMAP_JET)
-            hm_disp = cv2.addWeighted(frame, 0.6, hm_color, 0.4, 0)
-
-            elapsed = time.time() - start_time
-            pct = (focus_time / elapsed) * 100 if elapsed > 0 else 0
-            cv2.putText(display, f"Focus: {pct:.1f}%", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.imshow('Eye Tracking', display)
-            cv2.imshow('Attention Heatmap', hm_disp)
-            heatmap *= 0.99
+                focus_time += max(0.0, captured_at - last_time)
+            last_time = max(last_time, captured_at)
+            local.focus_changed(eyes_detected, captured_at)
+            elapsed = captured_at - start_time
+            # One decimal keeps /stream from sending a delta every frame
+            focus_state.update(focused=eyes_detected,
+                               focus_pct=round(100 * focus_time / elapsed, 1) if elapsed > 0 else 0.0)
+
+            if not headless:
+                for i in range(1, len(eye_positions)):
+                    intensity = int(255 * (i / len(eye_positions)))
+                    cv2.line(display, eye_positions[i - 1], eye_positions[i],
+                             (0, intensity, 255 - intensity), 1)
+
+                hm_disp = heatmap.render(frame)
+
+                elapsed = time.time() - start_time
+                pct = (focus_time / elapsed) * 100 if elapsed > 0 else 0
+                cv2.putText(display, f"Focus: {pct:.1f}%", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.imshow('Eye Tracking', display)
+                if hm_disp is not None:
+                    cv2.imshow('Attention Heatmap', hm_disp)
+            preview.publish(frame, points, heatmap, focus_state["focus_pct"])
+            heatmap.step()
+            metrics.frame_seconds.observe(time.perf_counter() - frame_start, "combined")
+            cpu_now = time.thread_time()
+            frame_cpu += cpu_now - cpu_mark
+            cpu_mark = cpu_now
+            frames += 1
 
             now = time.time()
-            delta = now - last_time
-            last_time = now
-            domain_times[current_domain] = domain_times.get(current_domain, 0) + delta
 
             if now - last_print >= print_interval:
-                print(f"Current Domain: {current_domain} ({domain_times.get(current_domain, 0):.1f}s) | Tracked Domains: {len(domain_history)}")
+                current_domain = store.current_domain
+                seconds = timeline.dwell_seconds().get(current_domain, 0)
+                print(f"Current Domain: {current_domain} ({seconds:.1f}s) | Tracked Domains: {len(store)} | CPU/frame: {1000 * frame_cpu / frames:.1f} ms")
                 last_print = now
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            wait = 0.0
+            if rate is not None:
+                rate.observe(eyes_detected != was_focused or detector.moved, captured_at)
+                wait = rate.interval - (time.time() - captured_at)
+            was_focused = eyes_detected
+            if not headless:
+                if cv2.waitKey(max(1, int(wait * 1000))) & 0xFF == ord('q'):
+                    break
+            elif wait > 0 and stop_event.wait(wait):
                 break
 
     except KeyboardInterrupt:
         print("Keyboard interrupt detected. Ending session...")
 
     finally:
+        preview.close()
+        if pipeline:
+            pipeline.stop()
         cap.release()
-        cv2.destroyAllWindows()
-
-        elapsed = time.time() - start_time
-        pct = (focus_time / elapsed) * 100 if elapsed > 0 else 0
-        print("\n--- Session Summary ---")
-        print(f"Session Duration: {elapsed:.2f} seconds")
-        print(f"Focus Time: {focus_time:.2f} seconds")
-        print(f"Focus Score: {pct:.2f}%")
-
-        print("\n--- Domain History ---")
-        if domain_history:
-            for d, info in domain_history.items():
-                print(f"{d}: count={info['count']}, first={info['first_seen'].strftime('%Y-%m-%d %H:%M:%S')}, last={info['last_seen'].strftime('%Y-%m-%d %H:%M:%S')}")
-            domain_data = {d: {"count": info["count"]} for d, info in domain_history.items()}
-        else:
-            print("No domains were tracked.")
-            domain_data = {}
-
-        prod = {"productive": 0, "unproductive": 0}
-        labels, times_list, colors = [], [], []
-        print("\n--- Analyzing Productivity ---")
-        for d in domain_data:
-            lbl = analyze_productivity(d)
-            dur = domain_times.get(d, 0)
-            prod[lbl] += dur
-            labels.append(d)
-            times_list.append(dur)
-            colors.append('#2ecc71' if lbl == 'productive' else '#e74c3c')
-            print(f"{d}: {lbl} ({dur:.1f}s)")
-
-        print("\n--- Generating Plots ---")
-        fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(18, 4), facecolor='black')  # Added ax3 for focus plot
-        plt.style.use('dark_background')
-        plt.rcParams['font.family'] = 'DejaVu Sans'
-
-        # Plot 1: Time Spent Per Website
-        ax1.barh(labels, times_list, color=colors)
-        ax1.set_title("Time Spent Per Website", color='white')
-        ax1.set_xlabel("Time (s)", color='white')
-        ax1.tick_params(axis='y', colors='white')
-        ax1.tick_params(axis='x', colors='white')
-
-        # Plot 2: Productive vs Unproductive Time
-        categories = list(prod.keys())
-        values = list(prod.values())
-        ax2.bar(categories, values, color=['#2ecc71', '#e74c3c'])
-        ax2.set_title("Productive vs Unproductive", color='white')
-        ax2.set_ylabel("Time (s)", color='white')
-        ax2.tick_params(axis='x', colors='white')
-        ax2.tick_params(axis='y', colors='white')
-
-        # Plot 3: Focus Breakdown
-        focus_labels = ['Focused', 'Not Focused']
-        focus_times = [focus_time, elapsed - focus_time]
-        focus_colors = ['#2ecc71', '#e74c3c']
-        bars = ax3.bar(focus_labels, focus_times, color=focus_colors, edgecolor='white', linewidth=1.2)
-        ax3.set_title("Focus Breakdown", color='white')
-        ax3.set_ylabel("Time (s)", color='white')
-        ax3.tick_params(axis='x', colors='white')
-        ax3.tick_params(axis='y', colors='white')
-        for bar, yval in zip(bars, focus_times):
-            ax3.text(bar.get_x() + bar.get_width()/2.0, yval / 2, f'{yval:.1f}s', 
-                     ha='center', va='center', color='black', fontsize=10, fontweight='bold',
-                     bbox=dict(facecolor='white', alpha=0.6, boxstyle='round,pad=0.3'))
-
-        fig.tight_layout()
-        plt.show(block=True)
-        print("Plots displayed. Close the plot windows to exit.")
+        if not headless:
+            cv2.destroyAllWindows()
+        local.focus_changed(False, time.time())
+        if heatmap_export:
+            heatmap.save(heatmap_export)
+        report_session(frames, frame_cpu, 'headless' if headless else 'windowed')
+
+def report_session(frames, frame_cpu, mode):
+    # Everything below reads totals kept up to date during the session;
+    # labels came in the background and the chart renders on a worker
+    local.summary.end()
+    summary = local.summary.to_json(label_of=cached_label)
+    print("\n--- Session Summary ---")
+    print(f"Session Duration: {summary['duration']:.2f} seconds")
+    print(f"Focus Time: {summary['focus_time']:.2f} seconds")
+    print(f"Focus Score: {summary['focus_pct']:.2f}%")
+    if frames:
+        print(f"CPU per Frame: {1000 * frame_cpu / frames:.2f} ms over {frames} frames ({mode})")
+
+    print("\n--- Domain History ---")
+    if not summary["domains"]:
+        print("No domains were tracked.")
+    for d, info in summary["domains"].items():
+        print(f"{d}: visits={info['visits']}, {info['dwell']:.1f}s, {info['label'] or 'not labelled yet'}")
+    print(f"Productive: {summary['productive_seconds']:.1f}s | Unproductive: {summary['unproductive_seconds']:.1f}s"
+          + (f" | Not labelled yet: {summary['unlabeled_seconds']:.1f}s" if summary["unlabeled_seconds"] else ""))
+
+    reports.report(local.id, summary, path=SUMMARY_PLOT_PATH)
+    print(f"\nRendering the session report to {SUMMARY_PLOT_PATH} (also served at /summary/report)")
+
+def run_vision_process(heatmap_export=None, headless=False, source=None):
+    # Capture and detection run in a child process (chrome/vision_process.py)
+    # and only focus flips come back, so the server never shares a GIL with
+    # the frame loop. This loop reads frames in place from shared memory for
+    # the heatmap, the preview window and /preview.
+    from vision_process import VisionProcess
+
+    start_time = time.time()
+    local.summary.reset(start_time)
+    clock = {"focus_time": 0.0, "since": None}
+
+    def on_focus(focused, t):
+        local.focus_changed(focused, t)
+        if focused:
+            clock["since"] = t
+        elif clock["since"] is not None:
+            clock["focus_time"] += max(0.0, t - clock["since"])
+            clock["since"] = None
+        focus_state["focused"] = focused
+
+    vision = VisionProcess(source, on_focus=on_focus).start()
+    import cv2
+    from heatmap import AttentionHeatmap
+    heatmap = item = None
+    last_seq = -1
+    last_print = start_time
+    try:
+        while not stop_event.is_set() and not vision.done.is_set():
+            now = time.time()
+            since = clock["since"]
+            focus_time = clock["focus_time"] + (now - since if since is not None else 0.0)
+            focus_state["focus_pct"] = round(100 * focus_time / (now - start_time), 1) if now > start_time else 0.0
+            if now - last_print >= 1.0:
+                current_domain = store.current_domain
+                seconds = timeline.dwell_seconds().get(current_domain, 0)
+                print(f"Current Domain: {current_domain} ({seconds:.1f}s) | Tracked Domains: {len(store)} | "
+                      f"Focus: {focus_state['focus_pct']:.1f}% | Vision restarts: {vision.restarts}")
+                last_print = now
+
+            latest = vision.latest()
+            if latest is not None and latest.seq != last_seq:
+                if heatmap is None or latest.seq < last_seq:
+                    # First frame, or a restarted child with a fresh ring
+                    heatmap = heatmap or AttentionHeatmap(latest.frame.shape)
+                    last_seq = latest.seq - 1
+                # Every slot still in the ring since the last pass feeds the heatmap
+                for seq in range(max(last_seq + 1, latest.seq - vision.slots + 1), latest.seq + 1):
+                    item = vision.read(seq)
+                    if item is not None:
+                        for x, y in item.eyes:
+                            heatmap.add(int(x), int(y))
+                        heatmap.step()
+                last_seq = latest.seq
+                if not headless or preview.viewers:
+                    # Copy out of the ring, then make sure the child didn't overwrite it meanwhile
+                    display = latest.frame.copy()
+                    if vision.ring.valid(latest.seq):
+                        preview.publish(display, latest.eyes, heatmap, focus_state["focus_pct"])
+                        if not headless:
+                            for x, y in latest.eyes:
+                                cv2.circle(display, (int(x), int(y)), 2, (0, 0, 255), -1)
+                            cv2.putText(display, f"Focus: {focus_state['focus_pct']:.1f}%", (10, 30),
+                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                            cv2.imshow('Eye Tracking', display)
+                            hm_disp = heatmap.render(display)
+                            if hm_disp is not None:
+                                cv2.imshow('Attention Heatmap', hm_disp)
+                latest = item = None  # don't pin the ring's memory between passes
+            if not headless:
+                if cv2.waitKey(20) & 0xFF == ord('q'):
+                    break
+            elif stop_event.wait(0.02):
+                break
+    except KeyboardInterrupt:
+        print("Keyboard interrupt detected. Ending session...")
+    finally:
+        preview.close()
+        vision.stop()
+        if not headless:
+            cv2.destroyAllWindows()
+        local.focus_changed(False, time.time())
+        if heatmap_export and heatmap is not None:
+            heatmap.save(heatmap_export)
+        report_session(vision.frames, vision.cpu, 'vision process')
 
 # --------------- Main Entry Point ---------------
 if __name__ == "__main__":
-    server_thread = threading.Thread(target=run_flask_server, daemon=True)
+    parser = argparse.ArgumentParser(description="Miza eye tracker and tab tracking server")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview windows; stop with SIGTERM, Ctrl+C or POST /vision/stop")
+    parser.add_argument("--source", help="webcam index, video file or directory of frames to replay")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="detector threads fed by a separate capture thread (0 = single-threaded loop)")
+    parser.add_argument("--heatmap-export", help="save the attention heatmap grid (.npy) at session end")
+    parser.add_argument("--asgi", action="store_true", help="serve with uvicorn instead of Flask's dev server")
+    parser.add_argument("--vision-process", action="store_true",
+                        help="run capture and detection in a separate, auto-restarted process")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    server_thread = threading.Thread(target=run_flask_server, args=(args.asgi,), daemon=True)
     server_thread.start()
-    
-    print("Waiting for server to start...", flush=True)
-    time.sleep(2)
-    
-    run_eye_tracker()
\ No newline at end of file
+    wait_for_server()
+
+    if args.vision_process:
+        run_vision_process(heatmap_export=args.heatmap_export, headless=args.headless, source=args.source)
+    else:
+        run_eye_tracker(heatmap_export=args.heatmap_export, headless=args.headless, source=args.source,
+                        workers=args.workers)
+    if not args.headless:
+        # Keep serving /summary and the report for the dashboard, as the plot
+        # windows used to keep the process up until they were closed
+        print("Session ended. Press Ctrl+C to exit.", flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
\ No newline at end of file
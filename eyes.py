@@ -1,18 +1,34 @@
 import cv2
-import numpy as np
 import time
-from datetime import datetime
-import matplotlib.pyplot as plt
-
-def main():
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)
+import os
+import sys
+import argparse
+import signal
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome"))
+from heatmap import AttentionHeatmap
+from detection import make_detector
+from frame_source import open_source
+from motion import AdaptiveRate, MOTION_GATE, gated
+from report import ReportRenderer, focus_figure
+
+FOCUS_PLOT_PATH = "focus_breakdown.png"
+reports = ReportRenderer()
+
+def main(heatmap_export=None, headless=False, stop_event=None, source=None):
+    # Initialize webcam (or a recording to replay)
+    cap = open_source(source)
     if not cap.isOpened():
         print("Error: Could not open webcam")
         return
 
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+    # Haar by default (full-frame search only on keyframes); MIZA_DETECTOR
+    # switches to a cv2.dnn backend. The motion gate skips detection on still
+    # frames and the rate samples less often while focus holds steady.
+    detector = gated(make_detector())
+    rate = AdaptiveRate(max_fps=30) if MOTION_GATE else None
+    was_focused = False
 
     eye_positions = []
     max_positions = 30
@@ -22,112 +38,120 @@ def main():
         print("Error: Failed to capture initial frame")
         return
 
-    heatmap = np.zeros((frame.shape[0], frame.shape[1]), dtype=np.float32)
+    heatmap = AttentionHeatmap(frame.shape)
 
     start_time = time.time()
     focus_time = 0  # seconds with eyes detected
-
-    print("Eye tracking started. Press 'q' to quit.")
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to capture frame")
-            break
-
-        display = frame.copy()
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        eyes_detected = False
-
-        for (x, y, w, h) in faces:
-            roi_gray = gray[y:y+h, x:x+w]
-            roi_color = display[y:y+h, x:x+w]
-            eyes = eye_cascade.detectMultiScale(roi_gray)
-
-            if len(eyes) > 0:
-                eyes_detected = True
-
-            for (ex, ey, ew, eh) in eyes:
-                eye_center_x = x + ex + ew//2
-                eye_center_y = y + ey + eh//2
-                cv2.circle(heatmap, (eye_center_x, eye_center_y), 30, 0.1, -1)
-                eye_positions.append((eye_center_x, eye_center_y))
-                if len(eye_positions) > max_positions:
-                    eye_positions.pop(0)
-                cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-                cv2.circle(display, (eye_center_x, eye_center_y), 2, (0, 0, 255), -1)
-
-        if eyes_detected:
-            focus_time += 1 / 30.0  # assuming ~30fps
-
-        for i in range(1, len(eye_positions)):
-            intensity = int(255 * (i / len(eye_positions)))
-            cv2.line(display, eye_positions[i-1], eye_positions[i], (0, intensity, 255-intensity), 1)
-
-        heatmap_normalized = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX)
-        heatmap_normalized = np.uint8(heatmap_normalized)
-        heatmap_color = cv2.applyColorMap(heatmap_normalized, cv2.COLORMAP_JET)
-        heatmap_display = cv2.addWeighted(frame, 0.6, heatmap_color, 0.4, 0)
-
-        elapsed_time = time.time() - start_time
-        focus_percentage = (focus_time / elapsed_time) * 100 if elapsed_time > 0 else 0
-
-        cv2.putText(display, f"Focus: {focus_percentage:.1f}%", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-        cv2.imshow('Eye Tracking', display)
-        cv2.imshow('Attention Heatmap', heatmap_display)
-        heatmap *= 0.99
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    elapsed_time = 0
+    focus_percentage = 0
+
+    if headless:
+        print("Eye tracking started (headless). Send SIGTERM or press Ctrl+C to stop.")
+    else:
+        print("Eye tracking started. Press 'q' to quit.")
+
+    stop_event = stop_event or threading.Event()
+    frame_cpu = 0.0  # CPU seconds spent by this thread processing frames
+    frames = 0
+    last_tick = start_time
+
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                print("Error: Failed to capture frame")
+                break
+            tick = time.time()
+
+            cpu_start = time.thread_time()
+            # Headless: no annotated copy, no drawing and no HighGUI windows
+            display = None if headless else frame.copy()
+
+            eyes_detected = False
+
+            for (x, y, w, h), eyes in detector.detect(frame):
+                if len(eyes) > 0:
+                    eyes_detected = True
+
+                for (ex, ey, ew, eh) in eyes:
+                    eye_center_x = x + ex + ew//2
+                    eye_center_y = y + ey + eh//2
+                    heatmap.add(eye_center_x, eye_center_y)
+                    if headless:
+                        continue
+                    eye_positions.append((eye_center_x, eye_center_y))
+                    if len(eye_positions) > max_positions:
+                        eye_positions.pop(0)
+                    roi_color = display[y:y+h, x:x+w]
+                    cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
+                    cv2.circle(display, (eye_center_x, eye_center_y), 2, (0, 0, 255), -1)
+
+            # Credit the real time since the last sample, which varies with the rate
+            if eyes_detected:
+                focus_time += tick - last_tick
+            last_tick = tick
+
+            elapsed_time = time.time() - start_time
+            focus_percentage = (focus_time / elapsed_time) * 100 if elapsed_time > 0 else 0
+
+            if not headless:
+                for i in range(1, len(eye_positions)):
+                    intensity = int(255 * (i / len(eye_positions)))
+                    cv2.line(display, eye_positions[i-1], eye_positions[i], (0, intensity, 255-intensity), 1)
+
+                heatmap_display = heatmap.render(frame)
+
+                cv2.putText(display, f"Focus: {focus_percentage:.1f}%", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+                cv2.imshow('Eye Tracking', display)
+                if heatmap_display is not None:
+                    cv2.imshow('Attention Heatmap', heatmap_display)
+            heatmap.step()
+            frame_cpu += time.thread_time() - cpu_start
+            frames += 1
+
+            wait = 0.0
+            if rate is not None:
+                rate.observe(eyes_detected != was_focused or detector.moved, tick)
+                wait = rate.interval - (time.time() - tick)
+            was_focused = eyes_detected
+            if not headless:
+                if cv2.waitKey(max(1, int(wait * 1000))) & 0xFF == ord('q'):
+                    break
+            elif wait > 0 and stop_event.wait(wait):
+                break
+    except KeyboardInterrupt:
+        print("Keyboard interrupt detected. Ending session...")
 
     cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
+    if heatmap_export:
+        heatmap.save(heatmap_export)
 
     # Final Report
     print("\n--- Session Summary ---")
     print(f"Session Duration: {elapsed_time:.2f} seconds")
     print(f"Focus Time (eyes on screen): {focus_time:.2f} seconds")
     print(f"Eye Focus Score: {focus_percentage:.2f}%")
+    if frames:
+        print(f"CPU per Frame: {1000 * frame_cpu / frames:.2f} ms over {frames} frames ({'headless' if headless else 'windowed'})")
 
-    # 🔥 Sexy breakdown plot
-    unfocused_time = elapsed_time - focus_time
-    labels = ['Focused', 'Not Focused']
-    times = [focus_time, unfocused_time]
-    colors = ['#2ecc71', '#e74c3c']
-
-    plt.style.use('dark_background')
-    plt.rcParams['font.family'] = 'DejaVu Sans'
-
-    fig, ax = plt.subplots(figsize=(6, 4), facecolor='black')
-
-    # Faint glow
-    glow_rect = plt.Rectangle((-0.5, -1), 2, max(times)+3, linewidth=0,
-                               edgecolor=None, facecolor='white', alpha=0.03, zorder=0)
-    ax.add_patch(glow_rect)
-
-    bars = ax.bar(labels, times, color=colors, edgecolor='white', linewidth=1.2, zorder=2)
-
-    for bar in bars:
-        yval = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width() / 2.0,
-                yval / 2,
-                f'{yval:.1f}s',
-                ha='center', va='center',
-                color='black', fontsize=12, fontweight='bold',
-                bbox=dict(facecolor='white', alpha=0.6, boxstyle='round,pad=0.3'))
-
-    ax.set_title('Focus Breakdown', fontsize=14, color='white', pad=15)
-    ax.set_ylabel('Time (seconds)', fontsize=12, color='white')
-    ax.tick_params(axis='x', colors='white')
-    ax.tick_params(axis='y', colors='white')
-    ax.set_ylim(bottom=0)
-    fig.tight_layout()
-
-    plt.show()
+    # Focus breakdown chart, drawn under Agg on the report worker so the
+    # session ends right away; the worker finishes the file before exit
+    reports.submit("eyes", frames, lambda: focus_figure(focus_time, elapsed_time), path=FOCUS_PLOT_PATH)
+    print(f"Rendering the focus breakdown to {FOCUS_PLOT_PATH}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Webcam eye tracking session")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview windows; stop with SIGTERM or Ctrl+C")
+    parser.add_argument("--source", help="webcam index, video file or directory of frames to replay")
+    parser.add_argument("--heatmap-export", help="save the attention heatmap grid (.npy) at session end")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    main(heatmap_export=args.heatmap_export, headless=args.headless, stop_event=stop,
+         source=args.source)